@@ -0,0 +1,122 @@
+"""partition records by month
+
+Revision ID: 03d6d33c6325
+Revises: 75e328e10945
+Create Date: 2026-10-19 14:05:52.661930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '03d6d33c6325'
+down_revision: Union[str, Sequence[str], None] = '75e328e10945'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created past the current month; records.partitions keeps this up
+MONTHS_AHEAD = 3
+
+COLUMNS = """
+    id uuid NOT NULL,
+    task_id uuid NOT NULL,
+    mode text,
+    place text,
+    tool text[],
+    event_type event_type NOT NULL,
+    duration_seconds integer,
+    occurred_at timestamptz NOT NULL,
+    created_at timestamptz NOT NULL,
+    updated_at timestamptz NOT NULL
+"""
+COLUMN_NAMES = "id, task_id, mode, place, tool, event_type, duration_seconds, occurred_at, created_at, updated_at"
+
+INDEXES = [
+    "CREATE INDEX ix_records_task_id ON records (task_id)",
+    "CREATE INDEX ix_records_occurred_at ON records (occurred_at)",
+    "CREATE INDEX ix_records_mode ON records (mode)",
+    "CREATE INDEX ix_records_place ON records (place)",
+    "CREATE INDEX ix_records_tool ON records USING gin (tool)",
+]
+INDEX_NAMES = ["ix_records_task_id", "ix_records_occurred_at", "ix_records_mode", "ix_records_place", "ix_records_tool"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE records RENAME TO records_unpartitioned")
+    op.execute("ALTER TABLE records_unpartitioned DROP CONSTRAINT records_id_unique")
+    op.execute("ALTER TABLE records_unpartitioned RENAME CONSTRAINT records_pkey TO records_unpartitioned_pkey")
+    for name in INDEX_NAMES:
+        op.execute(f"DROP INDEX {name}")
+
+    # The primary key of a partitioned table has to include the partition key.
+    # Rows outside every monthly partition land in records_default.
+    op.execute(f"""
+        CREATE TABLE records ({COLUMNS},
+            CONSTRAINT records_pkey PRIMARY KEY (id, occurred_at)
+        ) PARTITION BY RANGE (occurred_at)
+    """)
+    op.execute("CREATE TABLE records_default PARTITION OF records DEFAULT")
+
+    # Create the partition for the (UTC) month containing `for_month`, moving any
+    # of its rows out of records_default first. Returns false if it exists.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION records_create_partition(for_month date) RETURNS boolean AS $$
+        DECLARE
+            first_day date := make_date(extract(year FROM for_month)::int, extract(month FROM for_month)::int, 1);
+            start_at timestamptz := first_day::timestamp AT TIME ZONE 'UTC';
+            end_at timestamptz := (first_day + interval '1 month') AT TIME ZONE 'UTC';
+            part_name text := 'records_y' || to_char(first_day, 'YYYY') || 'm' || to_char(first_day, 'MM');
+        BEGIN
+            IF to_regclass(part_name) IS NOT NULL THEN
+                RETURN false;
+            END IF;
+            EXECUTE format('CREATE TABLE %I (LIKE records INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM records_default WHERE occurred_at >= %L AND occurred_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                start_at, end_at, part_name);
+            EXECUTE format('ALTER TABLE records ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part_name, start_at, end_at);
+            RETURN true;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(f"""
+        SELECT records_create_partition(m::date)
+        FROM generate_series(
+            date_trunc('month', COALESCE((SELECT min(occurred_at) FROM records_unpartitioned), now()) AT TIME ZONE 'UTC'),
+            date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months',
+            interval '1 month'
+        ) AS m
+    """)
+
+    op.execute(f"INSERT INTO records ({COLUMN_NAMES}) SELECT {COLUMN_NAMES} FROM records_unpartitioned")
+    # Indexes on the parent are created on every partition, present and future
+    for statement in INDEXES:
+        op.execute(statement)
+    op.execute("DROP TABLE records_unpartitioned")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE records RENAME TO records_partitioned")
+    op.execute("ALTER TABLE records_partitioned RENAME CONSTRAINT records_pkey TO records_partitioned_pkey")
+    for name in INDEX_NAMES:
+        op.execute(f"DROP INDEX {name}")
+
+    op.execute(f"""
+        CREATE TABLE records ({COLUMNS},
+            CONSTRAINT records_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute(f"INSERT INTO records ({COLUMN_NAMES}) SELECT {COLUMN_NAMES} FROM records_partitioned")
+    op.execute("ALTER TABLE records ADD CONSTRAINT records_id_unique UNIQUE (id)")
+    for statement in INDEXES:
+        op.execute(statement)
+
+    # drops every partition with it; detached (archived) partitions are kept
+    op.execute("DROP TABLE records_partitioned")
+    op.execute("DROP FUNCTION records_create_partition(date)")
@@ -0,0 +1,108 @@
+"""add duration stats
+
+Revision ID: 1250a99cbd88
+Revises: 71fb87846c3a
+Create Date: 2026-10-19 10:03:17.542981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1250a99cbd88'
+down_revision: Union[str, Sequence[str], None] = '71fb87846c3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('duration_stats',
+    sa.Column('scope', sa.Text(), nullable=False),
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('quit', sa.Integer(), nullable=False),
+    sa.Column('total_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('completed_tasks', sa.Integer(), nullable=False),
+    sa.Column('completed_task_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('estimated_tasks', sa.Integer(), nullable=False),
+    sa.Column('estimated_minutes_sum', sa.BigInteger(), nullable=False),
+    sa.Column('estimated_actual_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('scope', 'key', name='duration_stats_pkey')
+    )
+
+    # Backfill from closed sessions. The tag key must match
+    # records.durations.tag_key(), hence the byte-order ("C") sort.
+    op.execute("""
+        WITH per_task AS (
+            SELECT
+                task_id,
+                count(*) AS sessions,
+                count(*) FILTER (WHERE event_type = 'COMPLETE') AS completed,
+                count(*) FILTER (WHERE event_type = 'QUIT') AS quit,
+                sum(GREATEST(COALESCE(duration_seconds, 0), 0)) AS total_seconds,
+                bool_or(event_type = 'COMPLETE') AS is_completed
+            FROM records
+            WHERE event_type IN ('COMPLETE', 'QUIT')
+            GROUP BY task_id
+        ),
+        task_keys AS (
+            SELECT
+                p.*,
+                t.category,
+                t.estimated_minutes,
+                COALESCE((
+                    SELECT string_agg(g.name || ':' || tag.name, '|'
+                                      ORDER BY (g.name || ':' || tag.name) COLLATE "C")
+                    FROM task_tags tt
+                    JOIN tags tag ON tag.id = tt.tag_id
+                    JOIN tag_groups g ON g.id = tag.tag_group_id
+                    WHERE tt.task_id = t.id
+                ), '') AS tag_key
+            FROM per_task p
+            JOIN tasks t ON t.id = p.task_id
+        )
+        INSERT INTO duration_stats
+            (scope, key, sessions, completed, quit, total_seconds,
+             completed_tasks, completed_task_seconds,
+             estimated_tasks, estimated_minutes_sum, estimated_actual_seconds,
+             updated_at)
+        SELECT 'task', task_id::text, sessions, completed, quit, total_seconds,
+               0, 0, 0, 0, 0, now()
+        FROM per_task
+        UNION ALL
+        SELECT
+            s.scope,
+            s.key,
+            sum(k.sessions),
+            sum(k.completed),
+            sum(k.quit),
+            sum(k.total_seconds),
+            count(*) FILTER (WHERE k.is_completed),
+            COALESCE(sum(k.total_seconds) FILTER (WHERE k.is_completed), 0),
+            count(*) FILTER (WHERE k.is_completed AND k.estimated_minutes > 0),
+            COALESCE(sum(k.estimated_minutes) FILTER (WHERE k.is_completed AND k.estimated_minutes > 0), 0),
+            COALESCE(sum(k.total_seconds) FILTER (WHERE k.is_completed AND k.estimated_minutes > 0), 0),
+            now()
+        FROM task_keys k
+        CROSS JOIN LATERAL (VALUES ('category', k.category), ('tags', k.tag_key)) AS s(scope, key)
+        WHERE s.key IS NOT NULL
+        GROUP BY s.scope, s.key
+    """)
+
+    op.execute("""
+        UPDATE tasks t
+        SET actual_minutes = CEIL(d.total_seconds / 60.0)
+        FROM duration_stats d
+        WHERE d.scope = 'task' AND d.key = t.id::text AND d.total_seconds > 0
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('duration_stats')
@@ -0,0 +1,49 @@
+"""add task owner to active session
+
+Revision ID: 292882246683
+Revises: 2b3273942dc6
+Create Date: 2026-10-20 09:41:18.230554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '292882246683'
+down_revision: Union[str, Sequence[str], None] = '2b3273942dc6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_EVENTS = "event_type IN ('INPROGRESS', 'PAUSE_START', 'PAUSE_END')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GET /api/records/active filters on the owner of the session's task
+    op.execute(f"""
+        CREATE OR REPLACE VIEW active_session AS
+        SELECT r.id, r.task_id, r.mode, r.place, r.tool, r.event_type,
+               r.duration_seconds, r.occurred_at, r.updated_at,
+               t.title AS task_title,
+               t.user_id AS task_user_id
+        FROM records r
+        LEFT JOIN tasks t ON t.id = r.task_id
+        WHERE r.{OPEN_EVENTS}
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP VIEW active_session")
+    op.execute(f"""
+        CREATE VIEW active_session AS
+        SELECT r.id, r.task_id, r.mode, r.place, r.tool, r.event_type,
+               r.duration_seconds, r.occurred_at, r.updated_at,
+               t.title AS task_title
+        FROM records r
+        LEFT JOIN tasks t ON t.id = r.task_id
+        WHERE r.{OPEN_EVENTS}
+    """)
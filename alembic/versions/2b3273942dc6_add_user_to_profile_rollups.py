@@ -0,0 +1,131 @@
+"""add user to profile rollups
+
+Revision ID: 2b3273942dc6
+Revises: 51992ad63415
+Create Date: 2026-10-20 09:05:31.442870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b3273942dc6'
+down_revision: Union[str, Sequence[str], None] = '51992ad63415'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with models.profile.DURATION_BUCKETS_MINUTES (+1 overflow bucket)
+BUCKET_EDGES = [5, 10, 15, 20, 30, 45, 60, 90, 120, 180]
+N_BUCKETS = len(BUCKET_EDGES) + 1
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # rollups are per task owner ('' for tasks without one)
+    op.add_column('profile_rollups', sa.Column('user_id', sa.Text(), server_default=sa.text("''"), nullable=False))
+    op.drop_constraint('profile_rollups_pkey', 'profile_rollups', type_='primary')
+    op.create_primary_key(
+        'profile_rollups_pkey', 'profile_rollups', ['user_id', 'mode', 'place', 'tool', 'category']
+    )
+
+    # Rebuild from records, now split by the owner of each session's task
+    # (same aggregation as records.profile.ProfileService.backfill)
+    op.execute("DELETE FROM profile_rollups")
+    op.execute(f"""
+        WITH sessions AS (
+            SELECT
+                COALESCE(tk.user_id::text, '') AS user_id,
+                COALESCE(r.mode, '') AS mode,
+                COALESCE(r.place, '') AS place,
+                COALESCE(t.tool, '') AS tool,
+                COALESCE(tk.category, '') AS category,
+                r.event_type::text AS event_type,
+                CASE WHEN r.event_type IN ('COMPLETE', 'QUIT') AND r.duration_seconds >= 0
+                     THEN r.duration_seconds END AS seconds
+            FROM records r
+            LEFT JOIN tasks tk ON tk.id = r.task_id
+            LEFT JOIN LATERAL unnest(
+                CASE WHEN cardinality(r.tool) > 0 THEN r.tool ELSE ARRAY[NULL]::text[] END
+            ) AS t(tool) ON true
+        ),
+        bucketed AS (
+            SELECT s.*,
+                   CASE WHEN s.seconds IS NOT NULL THEN
+                       (SELECT count(*) FROM unnest(ARRAY{BUCKET_EDGES}) AS e WHERE e < s.seconds / 60.0) + 1
+                   END AS bucket
+            FROM sessions s
+        ),
+        totals AS (
+            SELECT user_id, mode, place, tool, category,
+                   count(*) AS sessions,
+                   count(*) FILTER (WHERE event_type = 'COMPLETE') AS completed,
+                   count(*) FILTER (WHERE event_type = 'QUIT') AS quit,
+                   COALESCE(sum(seconds), 0) AS total_seconds
+            FROM bucketed
+            GROUP BY user_id, mode, place, tool, category
+        ),
+        hist AS (
+            SELECT k.user_id, k.mode, k.place, k.tool, k.category,
+                   array_agg(COALESCE(c.n, 0) ORDER BY b.b) AS histogram
+            FROM totals k
+            CROSS JOIN generate_series(1, {N_BUCKETS}) AS b(b)
+            LEFT JOIN (
+                SELECT user_id, mode, place, tool, category, bucket, count(*)::int AS n
+                FROM bucketed
+                WHERE bucket IS NOT NULL
+                GROUP BY user_id, mode, place, tool, category, bucket
+            ) c ON c.user_id = k.user_id AND c.mode = k.mode AND c.place = k.place AND c.tool = k.tool
+               AND c.category = k.category AND c.bucket = b.b
+            GROUP BY k.user_id, k.mode, k.place, k.tool, k.category
+        )
+        INSERT INTO profile_rollups
+            (user_id, mode, place, tool, category, sessions, completed, quit,
+             total_seconds, duration_histogram, updated_at)
+        SELECT t.user_id, t.mode, t.place, t.tool, t.category, t.sessions, t.completed, t.quit,
+               t.total_seconds, h.histogram, now()
+        FROM totals t
+        JOIN hist h USING (user_id, mode, place, tool, category)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # merge every user's rows of a context back into one
+    op.execute("""
+        CREATE TEMP TABLE merged_profile_rollups AS
+        SELECT k.*, hist.duration_histogram
+        FROM (
+            SELECT mode, place, tool, category,
+                   sum(sessions)::int AS sessions, sum(completed)::int AS completed,
+                   sum(quit)::int AS quit, sum(total_seconds)::bigint AS total_seconds,
+                   max(updated_at) AS updated_at
+            FROM profile_rollups
+            GROUP BY mode, place, tool, category
+        ) k
+        CROSS JOIN LATERAL (
+            SELECT array_agg(b.n ORDER BY b.i) AS duration_histogram
+            FROM (
+                SELECT h.i, sum(h.n)::int AS n
+                FROM profile_rollups p
+                CROSS JOIN LATERAL unnest(p.duration_histogram) WITH ORDINALITY AS h(n, i)
+                WHERE p.mode = k.mode AND p.place = k.place AND p.tool = k.tool AND p.category = k.category
+                GROUP BY h.i
+            ) b
+        ) hist
+    """)
+    op.execute("DELETE FROM profile_rollups")
+    op.drop_constraint('profile_rollups_pkey', 'profile_rollups', type_='primary')
+    op.drop_column('profile_rollups', 'user_id')
+    op.create_primary_key('profile_rollups_pkey', 'profile_rollups', ['mode', 'place', 'tool', 'category'])
+    op.execute("""
+        INSERT INTO profile_rollups
+            (mode, place, tool, category, sessions, completed, quit,
+             total_seconds, duration_histogram, updated_at)
+        SELECT mode, place, tool, category, sessions, completed, quit,
+               total_seconds, duration_histogram, updated_at
+        FROM merged_profile_rollups
+    """)
+    op.execute("DROP TABLE merged_profile_rollups")
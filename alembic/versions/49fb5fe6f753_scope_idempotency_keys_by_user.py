@@ -0,0 +1,39 @@
+"""scope idempotency keys by user
+
+Revision ID: 49fb5fe6f753
+Revises: b1ef2db92df2
+Create Date: 2026-10-19 22:14:50.771032
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '49fb5fe6f753'
+down_revision: Union[str, Sequence[str], None] = 'b1ef2db92df2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # existing keys were sent without a user scope
+    op.add_column('idempotency_keys', sa.Column('scope', sa.Text(), server_default=sa.text("''"), nullable=False))
+    op.drop_constraint('idempotency_keys_pkey', 'idempotency_keys', type_='primary')
+    op.create_primary_key('idempotency_keys_pkey', 'idempotency_keys', ['scope', 'key'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # the same key may now exist for several users; keep one of them
+    op.execute("""
+        DELETE FROM idempotency_keys a
+        USING idempotency_keys b
+        WHERE a.key = b.key AND a.scope > b.scope
+    """)
+    op.drop_constraint('idempotency_keys_pkey', 'idempotency_keys', type_='primary')
+    op.create_primary_key('idempotency_keys_pkey', 'idempotency_keys', ['key'])
+    op.drop_column('idempotency_keys', 'scope')
@@ -0,0 +1,37 @@
+"""key active records index by occurred_at
+
+Revision ID: 51992ad63415
+Revises: 49fb5fe6f753
+Create Date: 2026-10-19 22:40:06.583117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '51992ad63415'
+down_revision: Union[str, Sequence[str], None] = '49fb5fe6f753'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_EVENTS = "event_type IN ('INPROGRESS', 'PAUSE_START', 'PAUSE_END')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # get_active_session reads ORDER BY occurred_at DESC LIMIT 1: keyed on
+    # occurred_at that is one backward index scan of the newest partition,
+    # not a scan and sort of every partition's open rows. Lookups by id
+    # (update_record) use the primary key.
+    op.drop_index('ix_records_active', table_name='records', postgresql_where=sa.text(OPEN_EVENTS))
+    op.create_index('ix_records_active', 'records', ['occurred_at'], unique=False,
+                    postgresql_where=sa.text(OPEN_EVENTS))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_records_active', table_name='records', postgresql_where=sa.text(OPEN_EVENTS))
+    op.create_index('ix_records_active', 'records', ['id'], unique=False, postgresql_where=sa.text(OPEN_EVENTS))
@@ -0,0 +1,41 @@
+"""add task delta sync
+
+Revision ID: 6b0303cef72f
+Revises: 0f4fef7e4c7e
+Create Date: 2026-10-19 19:27:53.608214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b0303cef72f'
+down_revision: Union[str, Sequence[str], None] = '0f4fef7e4c7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GET /api/tasks/changes?since=... reads tasks by updated_at
+    op.create_index(op.f('ix_tasks_updated_at'), 'tasks', ['updated_at'], unique=False)
+
+    op.create_table('task_deletions',
+    sa.Column('task_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('parent_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('task_id', name='task_deletions_pkey')
+    )
+    op.create_index(op.f('ix_task_deletions_deleted_at'), 'task_deletions', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_task_deletions_deleted_at'), table_name='task_deletions')
+    op.drop_table('task_deletions')
+    op.drop_index(op.f('ix_tasks_updated_at'), table_name='tasks')
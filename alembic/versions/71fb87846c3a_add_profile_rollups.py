@@ -0,0 +1,100 @@
+"""add profile rollups
+
+Revision ID: 71fb87846c3a
+Revises: dfd5caf8a380
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '71fb87846c3a'
+down_revision: Union[str, Sequence[str], None] = 'dfd5caf8a380'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with models.profile.DURATION_BUCKETS_MINUTES (+1 overflow bucket)
+BUCKET_EDGES = [5, 10, 15, 20, 30, 45, 60, 90, 120, 180]
+N_BUCKETS = len(BUCKET_EDGES) + 1
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('profile_rollups',
+    sa.Column('mode', sa.Text(), nullable=False),
+    sa.Column('place', sa.Text(), nullable=False),
+    sa.Column('tool', sa.Text(), nullable=False),
+    sa.Column('category', sa.Text(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('quit', sa.Integer(), nullable=False),
+    sa.Column('total_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('duration_histogram', postgresql.ARRAY(sa.Integer()), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('mode', 'place', 'tool', 'category', name='profile_rollups_pkey')
+    )
+
+    # Backfill from the sessions already stored in records
+    op.execute(f"""
+        WITH sessions AS (
+            SELECT
+                COALESCE(r.mode, '') AS mode,
+                COALESCE(r.place, '') AS place,
+                COALESCE(t.tool, '') AS tool,
+                COALESCE(tk.category, '') AS category,
+                r.event_type::text AS event_type,
+                CASE WHEN r.event_type IN ('COMPLETE', 'QUIT') AND r.duration_seconds >= 0
+                     THEN r.duration_seconds END AS seconds
+            FROM records r
+            LEFT JOIN tasks tk ON tk.id = r.task_id
+            LEFT JOIN LATERAL unnest(
+                CASE WHEN cardinality(r.tool) > 0 THEN r.tool ELSE ARRAY[NULL]::text[] END
+            ) AS t(tool) ON true
+        ),
+        bucketed AS (
+            SELECT s.*,
+                   CASE WHEN s.seconds IS NOT NULL THEN
+                       (SELECT count(*) FROM unnest(ARRAY{BUCKET_EDGES}) AS e WHERE e < s.seconds / 60.0) + 1
+                   END AS bucket
+            FROM sessions s
+        ),
+        totals AS (
+            SELECT mode, place, tool, category,
+                   count(*) AS sessions,
+                   count(*) FILTER (WHERE event_type = 'COMPLETE') AS completed,
+                   count(*) FILTER (WHERE event_type = 'QUIT') AS quit,
+                   COALESCE(sum(seconds), 0) AS total_seconds
+            FROM bucketed
+            GROUP BY mode, place, tool, category
+        ),
+        hist AS (
+            SELECT k.mode, k.place, k.tool, k.category,
+                   array_agg(COALESCE(c.n, 0) ORDER BY b.b) AS histogram
+            FROM totals k
+            CROSS JOIN generate_series(1, {N_BUCKETS}) AS b(b)
+            LEFT JOIN (
+                SELECT mode, place, tool, category, bucket, count(*)::int AS n
+                FROM bucketed
+                WHERE bucket IS NOT NULL
+                GROUP BY mode, place, tool, category, bucket
+            ) c ON c.mode = k.mode AND c.place = k.place AND c.tool = k.tool
+               AND c.category = k.category AND c.bucket = b.b
+            GROUP BY k.mode, k.place, k.tool, k.category
+        )
+        INSERT INTO profile_rollups
+            (mode, place, tool, category, sessions, completed, quit,
+             total_seconds, duration_histogram, updated_at)
+        SELECT t.mode, t.place, t.tool, t.category, t.sessions, t.completed, t.quit,
+               t.total_seconds, h.histogram, now()
+        FROM totals t
+        JOIN hist h USING (mode, place, tool, category)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('profile_rollups')
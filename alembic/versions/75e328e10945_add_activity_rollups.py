@@ -0,0 +1,42 @@
+"""add activity rollups
+
+Revision ID: 75e328e10945
+Revises: dd02b9a600a0
+Create Date: 2026-10-19 12:41:27.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '75e328e10945'
+down_revision: Union[str, Sequence[str], None] = 'dd02b9a600a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled by `python -m records.activity` (see README), not here, so the
+    # migration stays fast on large records tables
+    op.create_table('activity_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('mode', sa.Text(), nullable=False),
+    sa.Column('place', sa.Text(), nullable=False),
+    sa.Column('tool', sa.Text(), nullable=False),
+    sa.Column('category', sa.Text(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('quit', sa.Integer(), nullable=False),
+    sa.Column('total_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'mode', 'place', 'tool', 'category', name='activity_rollups_pkey')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('activity_rollups')
@@ -0,0 +1,42 @@
+"""add active session view
+
+Revision ID: 7f3c95d8862f
+Revises: 03d6d33c6325
+Create Date: 2026-10-19 15:22:48.470316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3c95d8862f'
+down_revision: Union[str, Sequence[str], None] = '03d6d33c6325'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_EVENTS = "event_type IN ('INPROGRESS', 'PAUSE_START', 'PAUSE_END')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Only running / paused sessions are indexed, so it stays a handful of rows
+    # per partition however many sessions have been recorded
+    op.create_index('ix_records_active', 'records', ['id'], unique=False, postgresql_where=sa.text(OPEN_EVENTS))
+    op.execute(f"""
+        CREATE VIEW active_session AS
+        SELECT r.id, r.task_id, r.mode, r.place, r.tool, r.event_type,
+               r.duration_seconds, r.occurred_at, r.updated_at,
+               t.title AS task_title
+        FROM records r
+        LEFT JOIN tasks t ON t.id = r.task_id
+        WHERE r.{OPEN_EVENTS}
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP VIEW active_session")
+    op.drop_index('ix_records_active', table_name='records', postgresql_where=sa.text(OPEN_EVENTS))
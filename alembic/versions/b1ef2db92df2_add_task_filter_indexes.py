@@ -0,0 +1,48 @@
+"""add task filter indexes
+
+Revision ID: b1ef2db92df2
+Revises: f3f1849473fe
+Create Date: 2026-10-19 21:08:37.215904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b1ef2db92df2'
+down_revision: Union[str, Sequence[str], None] = 'f3f1849473fe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN = sa.text("status IN ('pending', 'in_progress')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction, and keeps tasks writable
+    # while a large table is indexed. A failed build leaves an INVALID index
+    # behind; drop it before re-running.
+    with op.get_context().autocommit_block():
+        # Task.subtasks, "has no subtasks" (NOT EXISTS) and subtask replacement
+        op.create_index('ix_tasks_parent_id', 'tasks', ['parent_id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_tasks_category', 'tasks', ['category'], unique=False,
+                        postgresql_concurrently=True)
+        # open tasks only: list filters on status / is_subtask, ordered by due date
+        op.create_index('ix_tasks_open_is_subtask_due_date', 'tasks', ['is_subtask', 'due_date'], unique=False,
+                        postgresql_where=OPEN, postgresql_concurrently=True)
+        # tasks.feature_index loader order
+        op.create_index('ix_tasks_open_created_at', 'tasks', ['created_at', 'id'], unique=False,
+                        postgresql_where=OPEN, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_tasks_open_created_at', table_name='tasks', postgresql_concurrently=True)
+        op.drop_index('ix_tasks_open_is_subtask_due_date', table_name='tasks', postgresql_concurrently=True)
+        op.drop_index('ix_tasks_category', table_name='tasks', postgresql_concurrently=True)
+        op.drop_index('ix_tasks_parent_id', table_name='tasks', postgresql_concurrently=True)
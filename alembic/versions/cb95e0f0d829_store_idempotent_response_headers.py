@@ -0,0 +1,30 @@
+"""store idempotent response headers
+
+Revision ID: cb95e0f0d829
+Revises: d1d0a24298a2
+Create Date: 2026-10-20 10:58:37.902116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cb95e0f0d829'
+down_revision: Union[str, Sequence[str], None] = 'd1d0a24298a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # rows stored before this replay with their content type only
+    op.add_column('idempotency_keys', sa.Column('response_headers', postgresql.JSONB(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('idempotency_keys', 'response_headers')
@@ -0,0 +1,30 @@
+"""add idempotency key lease
+
+Revision ID: d1d0a24298a2
+Revises: 292882246683
+Create Date: 2026-10-20 10:22:03.514827
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1d0a24298a2'
+down_revision: Union[str, Sequence[str], None] = '292882246683'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('idempotency_keys', sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True))
+    # requests that were running at upgrade time may be taken over right away
+    op.execute("UPDATE idempotency_keys SET locked_until = now() WHERE status = 'in_progress'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('idempotency_keys', 'locked_until')
@@ -0,0 +1,33 @@
+"""add record filter indexes
+
+Revision ID: dd02b9a600a0
+Revises: 1250a99cbd88
+Create Date: 2026-10-19 11:20:05.318472
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dd02b9a600a0'
+down_revision: Union[str, Sequence[str], None] = '1250a99cbd88'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GIN over the tool array answers both && (any of) and @> (all of)
+    op.create_index('ix_records_tool', 'records', ['tool'], unique=False, postgresql_using='gin')
+    op.create_index(op.f('ix_records_mode'), 'records', ['mode'], unique=False)
+    op.create_index(op.f('ix_records_place'), 'records', ['place'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_records_place'), table_name='records')
+    op.drop_index(op.f('ix_records_mode'), table_name='records')
+    op.drop_index('ix_records_tool', table_name='records', postgresql_using='gin')
@@ -0,0 +1,37 @@
+"""add per user indexes
+
+Revision ID: f3f1849473fe
+Revises: 6b0303cef72f
+Create Date: 2026-10-19 20:41:12.904518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3f1849473fe'
+down_revision: Union[str, Sequence[str], None] = '6b0303cef72f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # queries scoped by X-User-Id lead with user_id
+    op.create_index('ix_tasks_user_id_status_due_date', 'tasks', ['user_id', 'status', 'due_date'], unique=False)
+    op.create_index('ix_tasks_user_id_parent_id', 'tasks', ['user_id', 'parent_id'], unique=False)
+    op.create_index('ix_tasks_user_id_category', 'tasks', ['user_id', 'category'], unique=False)
+    op.create_index(op.f('ix_tag_groups_user_id'), 'tag_groups', ['user_id'], unique=False)
+    op.create_index(op.f('ix_tags_user_id'), 'tags', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tags_user_id'), table_name='tags')
+    op.drop_index(op.f('ix_tag_groups_user_id'), table_name='tag_groups')
+    op.drop_index('ix_tasks_user_id_category', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_parent_id', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_status_due_date', table_name='tasks')
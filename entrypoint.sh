@@ -1,8 +1,36 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
+# --env dev  : single process with hot reload (default)
+# --env prod : gunicorn with uvicorn workers, configured by gunicorn.conf.py
+APP_ENV="${APP_ENV:-dev}"
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --env) APP_ENV="$2"; shift 2 ;;
+    --env=*) APP_ENV="${1#*=}"; shift ;;
+    *) echo "Unknown argument: $1" >&2; exit 2 ;;
+  esac
+done
+if [[ "$APP_ENV" != "dev" && "$APP_ENV" != "prod" ]]; then
+  echo "--env must be dev or prod, got: $APP_ENV" >&2
+  exit 2
+fi
+# main.py mounts the /debug routes only in dev
+export APP_ENV
+
 echo "Running alembic migrations..."
 alembic upgrade head
 
+echo "Seeding default tag groups..."
+(cd src && python -m tasks.seed)
+
+echo "Creating upcoming records partitions..."
+(cd src && python -m records.partitions)
+
+if [[ "$APP_ENV" == "prod" ]]; then
+  echo "Starting gunicorn (prod)"
+  exec gunicorn -c gunicorn.conf.py
+fi
+
 echo "Starting FastAPI"
 exec fastapi dev src/main.py --host 0.0.0.0 --port 80
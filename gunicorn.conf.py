@@ -0,0 +1,36 @@
+"""
+Gunicorn settings for `entrypoint.sh --env prod`: uvicorn workers serving
+src/main.py. Every setting can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "main:app"
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+worker_class = "uvicorn_worker.UvicornWorker"
+
+bind = os.getenv("BIND", "0.0.0.0:80")
+# Workers are single-threaded event loops (plus a threadpool for sync routes)
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Idle keep-alive connections are closed after this many seconds
+keepalive = int(os.getenv("KEEPALIVE_SECONDS", "5"))
+# Pending connections the kernel queues before refusing new ones
+backlog = int(os.getenv("BACKLOG", "2048"))
+# LLM-backed routes can take tens of seconds
+timeout = int(os.getenv("WORKER_TIMEOUT_SECONDS", "120"))
+# On SIGTERM workers stop accepting, finish open requests and drain LLM calls
+# (LLM_DRAIN_TIMEOUT_SECONDS) before they are killed after this long
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+# Import the app once in the master and fork it: faster worker boot and
+# shared memory, at the cost of not picking up code changes on HUP
+preload_app = os.getenv("PRELOAD_APP", "false").lower() in ("1", "true", "yes")
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # don't share the master's pooled DB connections with the children
+        from database import engine
+        engine.dispose(close=False)
@@ -1,17 +1,20 @@
 # testllm.py
 import os
-import requests
 from dotenv import load_dotenv
+from utils import inflight, instrumentation
 
 
 load_dotenv()  # 只讀 .env
 
-API_KEY = os.getenv("OPENROUTER_API_KEY")
-if not API_KEY:
-    raise RuntimeError("OPENROUTER_API_KEY not found")
-
 def call_llm(prompt: str):
-    url = "https://openrouter.ai/api/v1/chat/completions"
+    # checked per call (not at import) so the app starts without a key;
+    # requests is only imported once an LLM call is actually made
+    API_KEY = os.getenv("OPENROUTER_API_KEY")
+    if not API_KEY:
+        raise RuntimeError("OPENROUTER_API_KEY not found")
+    import requests
+
+    url = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
     headers = {
         "Authorization": f"Bearer {API_KEY}",
         "Content-Type": "application/json",
@@ -28,9 +31,13 @@ def call_llm(prompt: str):
         "temperature": 0.2,
     }
 
-    r = requests.post(url, headers=headers, json=payload, timeout=30)
+    with inflight.llm_call():
+        r = requests.post(url, headers=headers, json=payload, timeout=30)
     r.raise_for_status()
-    return r.json()["choices"][0]["message"]["content"]
+    data = r.json()
+    usage = data.get("usage") or {}
+    instrumentation.record_llm_tokens(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+    return data["choices"][0]["message"]["content"]
 
 if __name__ == "__main__":
     print(call_llm("用一句話跟我打招呼"))
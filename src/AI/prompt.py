@@ -55,7 +55,7 @@ class TaskRecommender:
 你需要對每一個任務，在以下維度上分別獨立評分
 （只能使用整數：-2、-1、0、1、或 2）：
 
-time_score：任務的 estimated_minutes 與 USER_CONTEXT.available_minutes 的匹配程度，符合的才給分。
+time_score：任務的 expected_minutes（依過去實際花費時間校正，缺少時使用 estimated_minutes）與 USER_CONTEXT.available_minutes 的匹配程度，符合的才給分。
 
 place_score：任務的地點標籤是否與 USER_CONTEXT.current_place 相符（相符分數較高；缺乏資訊則為 0 分）
 
@@ -4,10 +4,12 @@ import json
 import re
 import logging
 from typing import List, Dict, Any
-from collections import defaultdict
 
-import requests
-from sqlalchemy import text
+from models.task import TaskStatus
+from tasks import feature_index
+from records.profile import ProfileService
+from records.durations import DurationStatsService
+from utils import inflight, instrumentation
 
 logger = logging.getLogger("TaskRecommender")
 if not logging.getLogger().handlers:
@@ -64,6 +66,8 @@ def _extract_json_obj(text: str) -> Any:
 
 
 def call_ollama(prompt: str) -> str:
+    import requests  # only needed once an LLM call is made
+
     payload = {
         "model": OLLAMA_MODEL,
         "prompt": prompt,
@@ -72,9 +76,11 @@ def call_ollama(prompt: str) -> str:
             "temperature": OLLAMA_TEMPERATURE,
         },
     }
-    r = requests.post(OLLAMA_URL, json=payload, timeout=OLLAMA_TIMEOUT)
+    with inflight.llm_call():
+        r = requests.post(OLLAMA_URL, json=payload, timeout=OLLAMA_TIMEOUT)
     r.raise_for_status()
     data = r.json()
+    instrumentation.record_llm_tokens(data.get("prompt_eval_count"), data.get("eval_count"))
     # Ollama /api/generate 通常回 {"response": "..."}
     return data.get("response", "") or ""
 
@@ -90,75 +96,27 @@ class TaskRecommender:
     # =========================
     # 0) Load tasks
     # =========================
-    def load_tasks_with_tags(self) -> List[Dict[str, Any]]:
+    def load_tasks_with_tags(self, user_id=None) -> List[Dict[str, Any]]:
         """
-        盡量把 deadline（due_date）也帶出來，讓 deadline_score 有資料可用。
-        如果你 DB 沒有 due_date 欄位，會自動 fallback。
+        從記憶體中的 task feature index 取出 pending 任務（含 due_date 與 tags），
+        不再每次都對 tasks / task_tags / tags / tag_groups 做 join。
         """
-        sql_with_due = text("""
-        SELECT
-          t.id                AS task_id,
-          t.title             AS title,
-          t.estimated_minutes AS estimated_minutes,
-          t.priority          AS priority,
-          t.parent_id         AS parent_id,
-          t.is_subtask        AS is_subtask,
-          t.due_date          AS due_date,
-          tg.name             AS tag_group,
-          tag.name            AS tag_name
-        FROM tasks t
-        LEFT JOIN task_tags tt ON tt.task_id = t.id
-        LEFT JOIN tags tag ON tag.id = tt.tag_id
-        LEFT JOIN tag_groups tg ON tg.id = tag.tag_group_id
-        WHERE t.status = 'pending'
-        ORDER BY t.id;
-        """)
-
-        sql_no_due = text("""
-        SELECT
-          t.id                AS task_id,
-          t.title             AS title,
-          t.estimated_minutes AS estimated_minutes,
-          t.priority          AS priority,
-          t.parent_id         AS parent_id,
-          t.is_subtask        AS is_subtask,
-          NULL                AS due_date,
-          tg.name             AS tag_group,
-          tag.name            AS tag_name
-        FROM tasks t
-        LEFT JOIN task_tags tt ON tt.task_id = t.id
-        LEFT JOIN tags tag ON tag.id = tt.tag_id
-        LEFT JOIN tag_groups tg ON tg.id = tag.tag_group_id
-        WHERE t.status = 'pending'
-        ORDER BY t.id;
-        """)
-
-        try:
-            rows = self.db.execute(sql_with_due).fetchall()
-        except Exception:
-            rows = self.db.execute(sql_no_due).fetchall()
-
-        tasks: Dict[str, Any] = {}
-        for r in rows:
-            tid = str(r.task_id)
-            if tid not in tasks:
-                tasks[tid] = {
-                    "id": tid,
-                    "title": r.title,
-                    "estimated_minutes": r.estimated_minutes,
-                    "priority": r.priority,
-                    "parent_id": str(r.parent_id) if r.parent_id else None,
-                    "is_subtask": bool(r.is_subtask),
-                    "due_date": (str(r.due_date) if r.due_date else None),
-                    "tags": defaultdict(list),
-                }
-            if r.tag_group and r.tag_name:
-                tasks[tid]["tags"][r.tag_group].append(r.tag_name)
-
-        for t in tasks.values():
-            t["tags"] = dict(t["tags"])
-
-        return list(tasks.values())
+        rows = feature_index.get_index(self.db).rows(statuses=(TaskStatus.pending,), user_id=user_id)
+        expected = DurationStatsService.expected_minutes(self.db, rows)
+        return [
+            {
+                "id": r["id"],
+                "title": r["title"],
+                "estimated_minutes": r["estimated_minutes"],
+                "expected_minutes": expected.get(r["id"]),
+                "priority": r["priority"],
+                "parent_id": r["parent_id"],
+                "is_subtask": r["is_subtask"],
+                "due_date": r["due_date"],
+                "tags": r["tags"],
+            }
+            for r in rows
+        ]
 
     # =========================
     # 1) ONE prompt batch scoring
@@ -175,7 +133,7 @@ You are a scoring model.
 Return ONLY valid JSON. No explanation. No markdown.
 
 You will score EACH task independently on these dimensions (integer only: 0, 1, or 2):
-- time_score: how well task estimated_minutes matches USER_CONTEXT.available_minutes (closer = higher)
+- time_score: how well task expected_minutes (learned from past sessions; falls back to estimated_minutes) matches USER_CONTEXT.available_minutes (closer = higher)
 - place_score: task place tags vs USER_CONTEXT.current_place (match = higher; missing info => 0)
 - mode_score: task mode tags vs USER_CONTEXT.mode (must match to score; missing info => 0)
 - tool_score: task required tool tags vs USER_CONTEXT.tools (user must have it; missing info => 0)
@@ -248,9 +206,9 @@ Output STRICT JSON with this exact schema:
         parts = []
         avail = user_context.get("available_minutes")
         if self._clamp_0_2(s.get("time_score")) == 2:
-            parts.append(f"時間很貼合（任務約 {task.get('estimated_minutes')} 分鐘 / 你可用 {avail} 分鐘）")
+            parts.append(f"時間很貼合（任務約 {task.get('expected_minutes')} 分鐘 / 你可用 {avail} 分鐘）")
         elif self._clamp_0_2(s.get("time_score")) == 1:
-            parts.append(f"時間還算合理（任務約 {task.get('estimated_minutes')} 分鐘）")
+            parts.append(f"時間還算合理（任務約 {task.get('expected_minutes')} 分鐘）")
 
         if self._clamp_0_2(s.get("tool_score")) == 2:
             parts.append("工具符合（你現在有可用工具）")
@@ -275,9 +233,9 @@ Output STRICT JSON with this exact schema:
 
         return "；".join(parts) + "。"
 
-    def rank(self, user_context: Dict[str, Any]) -> Dict[str, Any]:
-        user_profile = user_context.get("base_profile", {})
-        tasks = self.load_tasks_with_tags()
+    def rank(self, user_context: Dict[str, Any], user_id=None) -> Dict[str, Any]:
+        user_profile = user_context.get("base_profile") or ProfileService.get_profile(self.db, user_id=user_id)
+        tasks = self.load_tasks_with_tags(user_id)
 
         logger.info("Total tasks loaded: %d", len(tasks))
         if not tasks:
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from typing import List, Optional
+from uuid import UUID
+from database import get_db, get_read_db
 from .schemas import *
 from models.task import *
 from AI import service
+from utils import admission
+from users.current import current_user_id
 
 # Prefer importing the helper that calls LLM and returns parsed JSON
 try:
@@ -29,8 +32,12 @@ except Exception:
 router = APIRouter(prefix="/api/recommend", tags=["recommend"])
 
 # ----- AI Recommend Tasks -----
-@router.post("/", response_model=RecommendResponse)
-def recommend(req: RecommendRequest, db=Depends(get_db) if get_db else None):
+@router.post("/", response_model=RecommendResponse, dependencies=[Depends(admission.llm)])
+async def recommend(
+    req: RecommendRequest,
+    db=Depends(get_read_db) if get_db else None,
+    user_id: Optional[UUID] = Depends(current_user_id),
+):
     # map frontend payload -> recommender input
     tools = [t.strip() for t in req.tool.split(",") if t.strip()] if req.tool else []
     user_current = {
@@ -47,7 +54,8 @@ def recommend(req: RecommendRequest, db=Depends(get_db) if get_db else None):
         raise HTTPException(status_code=500, detail="DB dependency not configured")
 
     try:
-        data = get_recommendation_from_db_and_llm(db, user_current)
+        # the whole sync pipeline runs on the LLM executor, not the shared threadpool
+        data = await admission.run_llm(get_recommendation_from_db_and_llm, db, user_current, user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -72,16 +80,17 @@ def recommend(req: RecommendRequest, db=Depends(get_db) if get_db else None):
     )
 
 # ----- AI Regenerate Recommendation -----
-@router.post("/regenerate-questions", response_model=QuestionsResponse)
+@router.post("/regenerate-questions", response_model=QuestionsResponse, dependencies=[Depends(admission.llm)])
 async def regenerate_questions(
     payload: RecommendResponse,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    user_id: Optional[UUID] = Depends(current_user_id),
 ):
     """
     Generate 3 questions to help improve the recommendation.
     Call this when user is unsatisfied with the recommended tasks.
     """
-    questions = await service.regenerate_questions(db, payload)
+    questions = await service.regenerate_questions(db, payload, user_id)
     if questions is None:
         raise HTTPException(404, "Failed to generate questions")
     return QuestionsResponse(
@@ -93,16 +102,17 @@ async def regenerate_questions(
     )
 
 
-@router.post("/regenerate-recommendations", response_model=RecommendResponse)
+@router.post("/regenerate-recommendations", response_model=RecommendResponse, dependencies=[Depends(admission.llm)])
 async def regenerate_recommendations(
     payload: RegenerateRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    user_id: Optional[UUID] = Depends(current_user_id),
 ):
     """
     Regenerate task recommendations based on user feedback.
     Takes the answers to refinement questions and provides improved recommendations.
     """
-    result = await service.regenerate_recommendations(db, payload)
+    result = await service.regenerate_recommendations(db, payload, user_id)
     if result is None:
         raise HTTPException(404, "Failed to regenerate recommendations")
     return result
\ No newline at end of file
@@ -1,43 +1,52 @@
 from typing import List, Optional, Dict, Any
+from uuid import UUID
 from sqlalchemy.orm import Session
 import json
 
 from AI.schemas import *
 from AI.client import call_llm
 from models.task import Task, Tag, TagGroup, TaskStatus
+from tasks import feature_index
+from records.durations import DurationStatsService
 from AI.prompts import load
 from utils.llm_utils import parse_question_response
+from utils import admission, tracing
 
 
-def _build_tasks_context(db: Session) -> str:
-    """Build a formatted string of all pending tasks for LLM context."""
-    tasks = db.query(Task).filter(
-        Task.status == TaskStatus.pending,
-        Task.is_subtask.is_(False)
-    ).all()
+def _build_tasks_context(db: Session, user_id: Optional[UUID] = None) -> str:
+    """Build a formatted string of the user's pending tasks for LLM context."""
+    tasks = feature_index.get_index(db).rows(
+        statuses=(TaskStatus.pending,),
+        is_subtask=False,
+        user_id=user_id,
+    )
     
     if not tasks:
         return "目前沒有待處理的任務。"
     
+    expected = DurationStatsService.expected_minutes(db, tasks)
     lines = ["目前可用的任務列表："]
     for idx, task in enumerate(tasks, 1):
-        # Force load tags
-        _ = task.tags
-        tag_names = ", ".join([t.name for t in task.tags]) if task.tags else "無"
+        names = [name for group in task["tags"].values() for name in group]
+        tag_names = ", ".join(names) if names else "無"
         
-        lines.append(f"{idx}. {task.title}")
-        lines.append(f"   UUID：{task.id}")
-        lines.append(f"   分類：{task.category or '無'}")
-        lines.append(f"   描述：{task.description or '無'}")
-        lines.append(f"   預估時間：{task.estimated_minutes or '無'} 分鐘")
+        lines.append(f"{idx}. {task['title']}")
+        lines.append(f"   UUID：{task['id']}")
+        lines.append(f"   分類：{task['category'] or '無'}")
+        lines.append(f"   描述：{task['description'] or '無'}")
+        lines.append(f"   預估時間：{task['estimated_minutes'] or '無'} 分鐘")
+        if expected.get(task["id"]) != task["estimated_minutes"]:
+            lines.append(f"   依過去紀錄校正的時間：{expected[task['id']]} 分鐘")
         lines.append(f"   標籤：{tag_names}")
     
     return "\n".join(lines)
 
 
+@tracing.traced("ai.regenerate_questions")
 async def regenerate_questions(
     db: Session,
     current_context: RecommendResponse,
+    user_id: Optional[UUID] = None,
 ) -> Optional[List[str]]:
     """
     Generate 3 questions to help understand why user is unsatisfied
@@ -59,24 +68,29 @@ async def regenerate_questions(
     """.strip()
     
     # 3) Build available tasks context
-    available_tasks = _build_tasks_context(db)
+    with tracing.span("db.load"):
+        available_tasks = _build_tasks_context(db, user_id)
     
     # 4) Replace placeholders in prompt
     prompt = prompt_template.replace("{{USER_CONTEXT}}", user_context)
     prompt = prompt.replace("{{AVAILABLE_TASKS}}", available_tasks)
     
     # 5) Call LLM
-    content = call_llm(prompt)
+    with tracing.span("llm.call", **{"prompt.chars": len(prompt)}):
+        content = await admission.run_llm(call_llm, prompt)
     # print("LLM raw content for regenerate recommendation questions:", content)
     
     # 6) Parse response
-    result = parse_question_response(content)
+    with tracing.span("json.parse"):
+        result = parse_question_response(content)
     return result["questions"]
 
 
+@tracing.traced("ai.regenerate_recommendations")
 async def regenerate_recommendations(
     db: Session,
     feedback: RegenerateRequest,
+    user_id: Optional[UUID] = None,
 ) -> Optional[RecommendResponse]:
     """
     Regenerate task recommendations based on user feedback.
@@ -84,22 +98,23 @@ async def regenerate_recommendations(
     
     # 1) Load previous recommendation results (if any stored in session/cache)
     # For now, we'll fetch current pending tasks as baseline
-    previous_recommendations = db.query(Task).filter(
-        Task.status == TaskStatus.pending,
-        Task.is_subtask.is_(False)
-    ).limit(4).all()
-    
-    # Force load tags
-    for task in previous_recommendations:
-        _ = task.tags
+    with tracing.span("db.load"):
+        previous_recommendations = feature_index.get_index(db).rows(
+            statuses=(TaskStatus.pending,),
+            is_subtask=False,
+            user_id=user_id,
+        )[:4]
+        # available tasks context for step 5, read together with the above
+        available_tasks = _build_tasks_context(db, user_id)
     
     # Format previous recommendations
     previous_recs_text = "上次推薦的任務：\n"
     if previous_recommendations:
         for idx, task in enumerate(previous_recommendations, 1):
-            tag_names = ", ".join([t.name for t in task.tags]) if task.tags else "無"
-            previous_recs_text += f"{idx}. {task.title}\n"
-            previous_recs_text += f"   預估時間：{task.estimated_minutes or '無'} 分鐘\n"
+            names = [name for group in task["tags"].values() for name in group]
+            tag_names = ", ".join(names) if names else "無"
+            previous_recs_text += f"{idx}. {task['title']}\n"
+            previous_recs_text += f"   預估時間：{task['estimated_minutes'] or '無'} 分鐘\n"
             previous_recs_text += f"   標籤：{tag_names}\n"
     else:
         previous_recs_text += "（尚未有推薦記錄）\n"
@@ -126,58 +141,66 @@ async def regenerate_recommendations(
     for i, (question, answer) in enumerate(zip(feedback.questions, feedback.answers), 1):
         feedback_context += f"{i}. {question}\n   回答：{answer}\n"
     
-    # 5) Build available tasks context
-    available_tasks = _build_tasks_context(db)
-    
     # 6) Replace placeholders
-    prompt = prompt_template.replace("{{USER_CONTEXT}}", user_context)
-    prompt = prompt.replace("{{PREVIOUS_RECOMMENDATIONS}}", previous_recs_text)
-    prompt = prompt.replace("{{FEEDBACK}}", feedback_context)
-    prompt = prompt.replace("{{AVAILABLE_TASKS}}", available_tasks)
+    with tracing.span("prompt.build") as span:
+        prompt = prompt_template.replace("{{USER_CONTEXT}}", user_context)
+        prompt = prompt.replace("{{PREVIOUS_RECOMMENDATIONS}}", previous_recs_text)
+        prompt = prompt.replace("{{FEEDBACK}}", feedback_context)
+        prompt = prompt.replace("{{AVAILABLE_TASKS}}", available_tasks)
+        span.set("prompt.chars", len(prompt))
     
     # 7) Call LLM
-    content = call_llm(prompt)
+    with tracing.span("llm.call"):
+        content = await admission.run_llm(call_llm, prompt)
     # print("LLM raw content for regenerate recommendations:", content)
     
     # 8) Parse JSON response
-    try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
-        cleaned = content.strip().removeprefix("```json").removesuffix("```").strip()
-        data = json.loads(cleaned)
+    with tracing.span("json.parse"):
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            cleaned = content.strip().removeprefix("```json").removesuffix("```").strip()
+            data = json.loads(cleaned)
     
     recommended_tasks = data.get("recommended_tasks", [])
     if not isinstance(recommended_tasks, list):
         return []
     
     # 9) Fetch actual tasks from DB based on LLM recommendations
-    result_tasks = []
-    for rec in recommended_tasks:
-        if not isinstance(rec, dict):
-            continue
-        task_id = rec.get("task_id")
-        if not task_id:
-            continue
-        
-        # Try to query by UUID
-        try:
-            task = db.query(Task).filter(Task.id == task_id).first()
-            if task:
-                _ = task.tags  # Force load tags
-                result_tasks.append((task, rec.get("reason", "")))
-        except Exception as e:
-            # If UUID query fails, try to find by task name as fallback
-            print(f"Failed to query task by ID {task_id}: {e}")
-            # Optionally try to match by title if LLM returned a name instead
-            task = db.query(Task).filter(
-                Task.title.ilike(f"%{task_id}%"),
-                Task.status == TaskStatus.pending,
-                Task.is_subtask.is_(False)
-            ).first()
+    with tracing.span("db.fetch"):
+        recs = [rec for rec in recommended_tasks if isinstance(rec, dict) and rec.get("task_id")]
+
+        # All UUID recommendations in one query
+        ids = []
+        for rec in recs:
+            try:
+                ids.append(UUID(str(rec["task_id"])))
+            except ValueError:
+                pass
+        # only the user's own tasks, whatever ids the LLM came up with
+        tasks = db.query(Task)
+        if user_id is not None:
+            tasks = tasks.filter(Task.user_id == user_id)
+        found = {t.id: t for t in tasks.filter(Task.id.in_(ids)).all()} if ids else {}
+
+        result_tasks = []
+        for rec in recs:
+            if len(result_tasks) == 4:
+                break
+            task_id = rec["task_id"]
+            try:
+                task = found.get(UUID(str(task_id)))
+            except ValueError:
+                # Not a UUID: the LLM may have returned the task name instead
+                task = tasks.filter(
+                    Task.title.ilike(f"%{task_id}%"),
+                    Task.status == TaskStatus.pending,
+                    Task.is_subtask.is_(False)
+                ).first()
+                if task:
+                    print(f"Found task by title match: {task.title} (ID: {task.id})")
             if task:
-                _ = task.tags
                 result_tasks.append((task, rec.get("reason", "")))
-                print(f"Found task by title match: {task.title} (ID: {task.id})")
     
     # 10) Convert Task objects to RecommendedTask format
     recommended_task_list = []
@@ -190,6 +213,7 @@ async def regenerate_recommendations(
             
         recommended_task_list.append(
             RecommendedTask(
+                task_id=str(task.id),
                 task_name=task.title,
                 reason=reason
             )
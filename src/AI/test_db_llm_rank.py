@@ -1,10 +1,14 @@
 import json
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from src.AI.recommend import TaskRecommender
+# recommend.py imports `models` / `tasks`, which live directly under src/
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from AI.recommend import TaskRecommender
 
 
 def main():
@@ -1,47 +1,34 @@
 # src/AI/testllm.py
 import json
 import re
-from sqlalchemy import text
 
 from database import get_db
+from models.task import TaskStatus
+from tasks import feature_index
+from records.profile import ProfileService
+from records.durations import DurationStatsService
 from AI.prompt import TaskRecommender
 from AI.client import call_llm
+from utils import tracing
 
 
-def load_tasks_from_db(db):
-    sql = text("""
-    SELECT
-        t.id,
-        t.title,
-        t.estimated_minutes,
-        t.due_date,
-        tg.name AS tag_group,
-        tag.name AS tag_name
-    FROM tasks t
-    LEFT JOIN task_tags tt ON tt.task_id = t.id
-    LEFT JOIN tags tag ON tag.id = tt.tag_id
-    LEFT JOIN tag_groups tg ON tg.id = tag.tag_group_id
-    WHERE t.status = 'pending' OR t.status = 'in_progress'
-    ORDER BY t.created_at;
-    """)
-
-    rows = db.execute(sql).fetchall()
-
-    tasks = {}
-    for r in rows:
-        tid = str(r.id)
-        if tid not in tasks:
-            tasks[tid] = {
-                "task_id": tid,
-                "title": r.title,
-                "estimated_minutes": r.estimated_minutes,
-                "due_date": str(r.due_date) if r.due_date else None,
-                "tags": {},
-            }
-        if r.tag_group and r.tag_name:
-            tasks[tid]["tags"].setdefault(r.tag_group, []).append(r.tag_name)
-
-    return list(tasks.values())
+def load_tasks_from_db(db, user_id=None):
+    rows = feature_index.get_index(db).rows(
+        statuses=(TaskStatus.pending, TaskStatus.in_progress),
+        user_id=user_id,
+    )
+    expected = DurationStatsService.expected_minutes(db, rows)
+    return [
+        {
+            "task_id": r["id"],
+            "title": r["title"],
+            "estimated_minutes": r["estimated_minutes"],
+            "expected_minutes": expected.get(r["id"]),
+            "due_date": r["due_date"],
+            "tags": r["tags"],
+        }
+        for r in rows
+    ]
 
 
 def _extract_json(text: str):
@@ -56,27 +43,38 @@ def _extract_json(text: str):
     return json.loads(m.group(0))
 
 
-def get_recommendation_from_db_and_llm(db, user_current: dict):
+@tracing.traced("ai.recommend")
+def get_recommendation_from_db_and_llm(db, user_current: dict, user_id=None):
     """Load pending tasks from DB, build prompt via `TaskRecommender`, call LLM and return parsed JSON.
 
     Args:
         db: SQLAlchemy connection/session
         user_current: dict with keys `available_minutes`, `current_place`, `mode`, `tools`
+        user_id: only recommend this user's tasks (None = all tasks)
 
     Returns:
         dict: parsed JSON from LLM
     """
-    tasks = load_tasks_from_db(db)
+    with tracing.span("db.load") as span:
+        tasks = load_tasks_from_db(db, user_id)
+        profile = ProfileService.get_profile(db, user_id=user_id)
+        span.set("tasks", len(tasks))
+
+    with tracing.span("prompt.build") as span:
+        payload = {
+            "user_current_input": user_current,
+            "user_long_term_profile": profile,
+            "candidate_tasks_after_sql_filtering": tasks,
+            "exclude_list": [],
+        }
 
-    payload = {
-        "user_current_input": user_current,
-        "user_long_term_profile": {},
-        "candidate_tasks_after_sql_filtering": tasks,
-        "exclude_list": [],
-    }
+        recommender = TaskRecommender()
+        prompt = recommender.build_prompt(tasks=tasks, user_context=payload)
+        span.set("prompt.chars", len(prompt))
 
-    recommender = TaskRecommender()
-    prompt = recommender.build_prompt(tasks=tasks, user_context=payload)
+    with tracing.span("llm.call"):
+        raw = call_llm(prompt)
 
-    raw = call_llm(prompt)
-    return _extract_json(raw)
+    with tracing.span("json.parse") as span:
+        span.set("response.chars", len(raw or ""))
+        return _extract_json(raw)
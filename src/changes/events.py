@@ -0,0 +1,216 @@
+"""
+Change notifications pushed to open clients (GET /api/changes/stream).
+
+Write paths call notify() inside their transaction. Postgres delivers the
+NOTIFY on commit (and drops it on rollback) to every worker LISTENing on
+CHANNEL, so a change made through any worker reaches the subscribers of all
+of them. Each worker opens one LISTEN connection with its first subscriber
+and fans events out to its subscribers' bounded queues.
+
+Events are {"type": "task" | "record", "op": "upsert" | "delete", "ids":
+[...], "user_id": ...}. A subscriber that falls CHANGES_QUEUE_SIZE events
+behind has its queue replaced by one {"type": "resync"} event, telling the
+client to catch up through GET /api/tasks/changes instead.
+
+When the server starts shutting down (SIGTERM / SIGINT) every open stream
+is ended, since the server waits for open responses before it shuts down.
+"""
+import asyncio
+import json
+import os
+import signal
+from typing import Iterable, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import engine
+
+CHANNEL = "koreji_changes"
+# Events buffered per subscriber before it is told to resync
+CHANGES_QUEUE_SIZE = int(os.getenv("CHANGES_QUEUE_SIZE", "100"))
+# Open streams per worker; more get 503
+CHANGES_MAX_SUBSCRIBERS = int(os.getenv("CHANGES_MAX_SUBSCRIBERS", "1000"))
+# Seconds between attempts to re-open a lost LISTEN connection
+CHANGES_RECONNECT_SECONDS = float(os.getenv("CHANGES_RECONNECT_SECONDS", "5"))
+
+# NOTIFY payloads are limited to 8000 bytes
+_IDS_PER_NOTIFY = 100
+RESYNC = {"type": "resync"}
+# the server is shutting down: end the stream
+CLOSED = {"type": "closed"}
+
+
+def notify(db: Session, kind: str, ids: Iterable, *, op: str = "upsert", user_id=None):
+    """Queue a change event; sent when `db` commits."""
+    ids = [str(i) for i in ids]
+    for start in range(0, len(ids), _IDS_PER_NOTIFY):
+        payload = json.dumps({
+            "type": kind,
+            "op": op,
+            "ids": ids[start:start + _IDS_PER_NOTIFY],
+            "user_id": str(user_id) if user_id else None,
+        })
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+class Subscriber:
+    def __init__(self, user_id: Optional[str]):
+        # None = every user's changes
+        self.user_id = user_id
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=CHANGES_QUEUE_SIZE)
+        self._resyncing = False
+        self._closed = False
+
+    def wants(self, event: dict) -> bool:
+        # changes to tasks without an owner are everyone's
+        return self.user_id is None or event.get("user_id") in (None, self.user_id)
+
+    def offer(self, event: dict):
+        if self._resyncing or self._closed:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # too slow to keep up: drop what's queued, have it refetch
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC)
+            self._resyncing = True
+
+    def close(self):
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(CLOSED)
+        self._closed = True
+
+    async def next(self, timeout: float) -> Optional[dict]:
+        """The next event, or None after `timeout` seconds without one."""
+        try:
+            event = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is RESYNC:
+            self._resyncing = False
+        return event
+
+
+_subscribers: Set[Subscriber] = set()
+_listener: Optional[asyncio.Task] = None
+
+
+def _connect():
+    raw = engine.raw_connection()
+    # read before detach(), which unsets it
+    conn = raw.driver_connection
+    # a dedicated connection, not returned to the pool
+    raw.detach()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    return conn
+
+
+def _dispatch(payload: str):
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        return
+    for subscriber in list(_subscribers):
+        if subscriber.wants(event):
+            subscriber.offer(event)
+
+
+async def _listen():
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            conn = await run_in_threadpool(_connect)
+        except Exception as e:
+            print("Change listener could not connect:", repr(e))
+            await asyncio.sleep(CHANGES_RECONNECT_SECONDS)
+            continue
+
+        fd = conn.fileno()
+        readable = asyncio.Event()
+        loop.add_reader(fd, readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                conn.poll()
+                while conn.notifies:
+                    _dispatch(conn.notifies.pop(0).payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("Change listener lost its connection:", repr(e))
+            # events may have been missed while reconnecting
+            for subscriber in list(_subscribers):
+                subscriber.offer(RESYNC)
+        finally:
+            loop.remove_reader(fd)
+            conn.close()
+        await asyncio.sleep(CHANGES_RECONNECT_SECONDS)
+
+
+def subscribe(user_id: Optional[str] = None) -> Optional[Subscriber]:
+    """A new subscriber, or None when this worker has too many already."""
+    global _listener
+    if len(_subscribers) >= CHANGES_MAX_SUBSCRIBERS:
+        return None
+    if _listener is None or _listener.done():
+        _listener = asyncio.get_running_loop().create_task(_listen())
+    subscriber = Subscriber(user_id)
+    _subscribers.add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber: Subscriber):
+    _subscribers.discard(subscriber)
+
+
+def close_streams():
+    """End every open stream; each one's next() returns CLOSED."""
+    for subscriber in list(_subscribers):
+        subscriber.close()
+
+
+def close_streams_on_exit():
+    """
+    Chain close_streams() in front of the server's SIGTERM / SIGINT handlers.
+    Call from the lifespan startup, after the server installed its own.
+    """
+    loop = asyncio.get_running_loop()
+
+    def install(sig):
+        previous = signal.getsignal(sig)
+
+        def handler(signum, frame):
+            loop.call_soon_threadsafe(close_streams)
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                signal.signal(signum, signal.SIG_DFL)
+                signal.raise_signal(signum)
+
+        signal.signal(sig, handler)
+
+    try:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            install(sig)
+    except ValueError:
+        pass  # not the main thread (e.g. TestClient): nothing to chain to
+
+
+async def stop():
+    global _listener
+    close_streams()
+    if _listener is not None:
+        _listener.cancel()
+        try:
+            await _listener
+        except asyncio.CancelledError:
+            pass
+        _listener = None
@@ -0,0 +1,53 @@
+import json
+import os
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from changes import events
+from users.current import current_user_id
+
+router = APIRouter(prefix="/api/changes", tags=["changes"])
+
+# Seconds between keep-alive comments on an idle stream
+CHANGES_HEARTBEAT_SECONDS = float(os.getenv("CHANGES_HEARTBEAT_SECONDS", "15"))
+
+
+@router.get("/stream")
+async def stream_changes(request: Request, user_id: Optional[UUID] = Depends(current_user_id)):
+    """
+    Server-sent events for task and record changes, instead of polling:
+    `task` / `record` events carry {"op": "upsert" | "delete", "ids": [...]},
+    a `resync` event means changes were dropped and the client should catch
+    up with GET /api/tasks/changes. With X-User-Id, only that user's changes
+    (and those of tasks without an owner) are sent.
+    """
+    subscriber = events.subscribe(str(user_id) if user_id else None)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many open streams", headers={"Retry-After": "30"})
+
+    async def stream():
+        try:
+            # EventSource reconnect delay (ms)
+            yield "retry: 5000\n\n"
+            while True:
+                event = await subscriber.next(CHANGES_HEARTBEAT_SECONDS)
+                if event is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is events.CLOSED:
+                    break
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # no caching or proxy buffering of the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,33 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from utils import admission, tracing
+
+# Each worker process keeps its own buffer; in prod (several gunicorn workers)
+# a request only sees the traces of the worker that serves it.
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+@router.get("/traces")
+async def list_traces(
+    limit: int = Query(20, ge=1, le=tracing.TRACE_BUFFER_SIZE or 1),
+    name: Optional[str] = None,
+):
+    """Recent finished traces, newest first, with their spans."""
+    return tracing.recent(limit, name)
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """One trace as OTLP/JSON (ExportTraceServiceRequest)."""
+    root = tracing.find(trace_id)
+    if root is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return tracing.to_otlp(root)
+
+
+@router.get("/admission")
+async def admission_stats():
+    """Running, queued and rejected requests per route class in this worker."""
+    return {admission.llm.name: admission.llm.stats()}
@@ -1,21 +1,84 @@
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager, contextmanager
 from fastapi import FastAPI
 from records.router import router as records_router
 from fastapi.middleware.cors import CORSMiddleware
 from users.router import router as users_router
 from tasks.router import router as tasks_router
 from AI.router import router as ai_router
-import models
+from debug.router import router as debug_router
+from changes.router import router as changes_router
+from changes import events as change_events
+from records import partitions
 
 from dotenv import load_dotenv
-from database import engine, SessionLocal
-from tasks import service as task_service
-
-app = FastAPI()
+from database import check_schema_version, engine
+from tasks import llm as tasks_llm
+from utils import admission, inflight, instrumentation, tracing
+from utils.idempotency import IdempotencyMiddleware
+from utils.read_your_writes import ReadYourWritesMiddleware
 
 # Load environment from .env before reading settings
 load_dotenv()
 
+# warn (default): log a schema mismatch; strict: refuse to start; off: skip the check
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "warn")
+# dev | prod (set by entrypoint.sh); the unauthenticated /debug routes are dev-only
+APP_ENV = os.getenv("APP_ENV", "prod")
+
+
+@contextmanager
+def _stage(timings: dict, name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup only checks, never changes, the database: tables come from
+    # Alembic and the tag group seed from entrypoint.sh (python -m tasks.seed)
+    timings = {}
+    if SCHEMA_CHECK != "off":
+        with _stage(timings, "schema check"):
+            problem = check_schema_version()
+        if problem and SCHEMA_CHECK == "strict":
+            raise RuntimeError(f"Schema check failed: {problem}")
+        if problem:
+            print("Schema check:", problem)
+    # open change streams would otherwise hold the shutdown up until killed
+    change_events.close_streams_on_exit()
+    # entrypoint.sh creates upcoming partitions at start; this keeps them
+    # coming for deployments that stay up for months
+    partition_checks = None
+    if partitions.CHECK_INTERVAL_SECONDS > 0:
+        partition_checks = asyncio.create_task(partitions.run_periodic_checks())
+    print("Startup:", ", ".join(f"{name} {ms:.1f}ms" for name, ms in timings.items()) or "nothing to do")
+
+    yield
+
+    if partition_checks is not None:
+        partition_checks.cancel()
+    # The server has already finished its open requests by now; this covers
+    # LLM calls still running in the threadpool for requests whose client
+    # went away. Keep below gunicorn's graceful_timeout.
+    timeout = float(os.getenv("LLM_DRAIN_TIMEOUT_SECONDS", "25"))
+    if inflight.in_flight():
+        print(f"Waiting up to {timeout:.0f}s for {inflight.in_flight()} LLM call(s)...")
+        left = await inflight.drain(timeout)
+        if left:
+            print(f"Shutting down with {left} LLM call(s) still running")
+    await tasks_llm.aclose()
+    await change_events.stop()
+    admission.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
 # CORS for frontend dev — parse comma-separated origins
 allow_origins_env = os.getenv("ALLOW_ORIGINS", "")
 allow_origins = [
@@ -24,12 +87,27 @@ allow_origins = [
     if origin.strip()
 ]
 
+# The last middleware added is the outermost
+
+# Pins a client to the primary for a few seconds after it writes
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Replays the stored response of a retried request with the same Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+
+# Per-request query/LLM accounting
+instrumentation.install(engine)
+app.add_middleware(instrumentation.InstrumentationMiddleware)
+
+# Outermost, so preflights are answered before anything else runs and every
+# response, replayed or not, gets the CORS headers of the request at hand
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "X-Query-Count", "Retry-After", "Idempotent-Replayed"],
 )
 
 # include users router
@@ -42,17 +120,14 @@ app.include_router(tasks_router)
 # include AI recommendation router
 app.include_router(ai_router)
 
-# Create tables for development (Alembic handles migrations for production)
-models.Base.metadata.create_all(bind=engine)
+# server-sent task / record change events
+app.include_router(changes_router)
 
-@app.on_event("startup")
-def startup_seed_tag_groups():
-    db = SessionLocal()
-    try:
-        task_service.ensure_default_tag_groups(db)
-    finally:
-        db.close()
+# in-process traces of the AI pipelines and admission counts; dev only, and
+# off with TRACING=false
+if tracing.TRACING and APP_ENV == "dev":
+    app.include_router(debug_router)
 
 @app.get("/")
 async def root():
-    return {"message": "Hello World"}
\ No newline at end of file
+    return {"message": "Hello World"}
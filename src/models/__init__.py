@@ -1,6 +1,10 @@
 from .user import User, UserContext
 from .record import Record
-from .task import Task, TagGroup, Tag, TaskTag
+from .task import Task, TaskDeletion, TagGroup, Tag, TaskTag
+from .profile import ProfileRollup
+from .duration import DurationStat
+from .activity import ActivityRollup
+from .idempotency import IdempotencyKey
 from database import Base
 
 # Export all models so Alembic can find them
@@ -10,7 +14,12 @@ __all__ = [
     "UserContext",
     "Record",
     "Task",
+    "TaskDeletion",
     "TagGroup",
     "Tag",
     "TaskTag",
+    "ProfileRollup",
+    "DurationStat",
+    "ActivityRollup",
+    "IdempotencyKey",
 ]
\ No newline at end of file
@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, Date, DateTime, Integer, Text
+from database import Base
+
+# tool value of the per-session total row. Sessions using several tools are
+# counted once per tool, so totals that are not split by tool read this row.
+ALL_TOOLS = "*"
+
+
+# Closed sessions rolled up per local day and (mode, place, tool, category).
+# Empty string stands for "not set" so the columns can be part of the key.
+class ActivityRollup(Base):
+    __tablename__ = "activity_rollups"
+
+    day = Column(Date, primary_key=True)
+    mode = Column(Text, primary_key=True)
+    place = Column(Text, primary_key=True)
+    tool = Column(Text, primary_key=True)
+    category = Column(Text, primary_key=True)
+
+    sessions = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    quit = Column(Integer, nullable=False, default=0)
+    total_seconds = Column(BigInteger, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), default=datetime.now, onupdate=datetime.now, nullable=False)
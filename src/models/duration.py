@@ -0,0 +1,31 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, DateTime, Integer, Text
+from database import Base
+
+
+# Running aggregates of session durations.
+#   scope = "task"     -> key is the task id, one row per task
+#   scope = "category" -> key is Task.category
+#   scope = "tags"     -> key is the task's sorted "Group:Tag|Group:Tag" combination
+class DurationStat(Base):
+    __tablename__ = "duration_stats"
+
+    scope = Column(Text, primary_key=True)
+    key = Column(Text, primary_key=True)
+
+    # closed sessions (COMPLETE or QUIT)
+    sessions = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    quit = Column(Integer, nullable=False, default=0)
+    total_seconds = Column(BigInteger, nullable=False, default=0)
+
+    # completed tasks (category / tags scopes): time actually spent on the task
+    completed_tasks = Column(Integer, nullable=False, default=0)
+    completed_task_seconds = Column(BigInteger, nullable=False, default=0)
+
+    # completed tasks that had an estimate, for the actual / estimated ratio
+    estimated_tasks = Column(Integer, nullable=False, default=0)
+    estimated_minutes_sum = Column(BigInteger, nullable=False, default=0)
+    estimated_actual_seconds = Column(BigInteger, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), default=datetime.now, onupdate=datetime.now, nullable=False)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
+from database import Base
+
+
+# Responses of requests sent with an Idempotency-Key header, replayed when
+# the same key comes again (see utils.idempotency).
+#   status = "in_progress" while the first request runs, then "completed";
+#   an in-progress key whose locked_until has passed is taken over by a retry
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # keys are per user: the X-User-Id the request was sent with ('' without)
+    scope = Column(Text, primary_key=True, server_default=text("''"))
+    key = Column(Text, primary_key=True)
+    # sha256 of method, path, query string and body
+    request_hash = Column(Text, nullable=False)
+    status = Column(Text, nullable=False)
+
+    response_status = Column(Integer, nullable=True)
+    content_type = Column(Text, nullable=True)
+    # [[name, value], ...] as the route sent them, less content-length
+    response_headers = Column(JSONB, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,29 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, DateTime, Integer, Text, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from database import Base
+
+# Upper bounds (minutes) of the session-duration histogram buckets.
+# The histogram has one extra trailing bucket for longer sessions.
+DURATION_BUCKETS_MINUTES = [5, 10, 15, 20, 30, 45, 60, 90, 120, 180]
+
+
+# Session outcomes rolled up per (user, mode, place, tool, category), the
+# user being the owner of the session's task.
+# Empty string stands for "not set" so the columns can be part of the key.
+class ProfileRollup(Base):
+    __tablename__ = "profile_rollups"
+
+    user_id = Column(Text, primary_key=True, server_default=text("''"))
+    mode = Column(Text, primary_key=True)
+    place = Column(Text, primary_key=True)
+    tool = Column(Text, primary_key=True)
+    category = Column(Text, primary_key=True)
+
+    sessions = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    quit = Column(Integer, nullable=False, default=0)
+    total_seconds = Column(BigInteger, nullable=False, default=0)
+    duration_histogram = Column(ARRAY(Integer), nullable=False)
+
+    updated_at = Column(DateTime(timezone=True), default=datetime.now, onupdate=datetime.now, nullable=False)
@@ -1,6 +1,6 @@
 import uuid
 from enum import Enum as PyEnum
-from sqlalchemy import ARRAY, Column, DateTime, Enum, Integer, Text, ForeignKey
+from sqlalchemy import ARRAY, Column, DateTime, Enum, Index, Integer, Text, ForeignKey, text
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 from database import Base
@@ -13,18 +13,36 @@ class EventType(PyEnum):
     QUIT = "QUIT"
     COMPLETE = "COMPLETE"
 
+# A session is open (running or paused) until its record is COMPLETE or QUIT
+OPEN_EVENT_TYPES = ("INPROGRESS", "PAUSE_START", "PAUSE_END")
+
+# Range-partitioned by month on occurred_at; the partitions themselves are
+# managed by the migration and records.partitions, not by the models.
 class Record(Base):
     __tablename__ = 'records'
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    __table_args__ = (
+        # serves both && (any tool) and @> (all tools) filters
+        Index('ix_records_tool', 'tool', postgresql_using='gin'),
+        # only open sessions, newest first: backs the active_session view
+        Index(
+            'ix_records_active',
+            'occurred_at',
+            postgresql_where=text("event_type IN ('INPROGRESS', 'PAUSE_START', 'PAUSE_END')"),
+        ),
+        {'postgresql_partition_by': 'RANGE (occurred_at)'},
+    )
+
+    # a partitioned table's primary key must include the partition key
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
     task_id = Column(UUID(as_uuid=True), nullable=False, index=True)
     # user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
 
-    mode = Column(Text, nullable=True)
-    place = Column(Text, nullable=True)
+    mode = Column(Text, nullable=True, index=True)
+    place = Column(Text, nullable=True, index=True)
     tool = Column(ARRAY(Text), nullable=True)
 
     event_type = Column(Enum(EventType, name="event_type"), nullable=False)
     duration_seconds = Column(Integer, nullable=True)
-    occurred_at = Column(DateTime(timezone=True), default=datetime.now, nullable=False, index=True)
+    occurred_at = Column(DateTime(timezone=True), primary_key=True, default=datetime.now, nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), default=datetime.now, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=datetime.now, onupdate=datetime.now, nullable=False)
\ No newline at end of file
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, Integer, Date, DateTime, Enum, ForeignKey, Boolean, func
+from sqlalchemy import Column, String, Text, Integer, Date, DateTime, Enum, ForeignKey, Boolean, Index, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -22,6 +22,31 @@ class TaskPriority(str, enum.Enum):
 # ----- Task Model -----
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # per-user reads (X-User-Id): task list filters / due-date order,
+        # subtask lookups and categories all lead with user_id
+        Index("ix_tasks_user_id_status_due_date", "user_id", "status", "due_date"),
+        Index("ix_tasks_user_id_parent_id", "user_id", "parent_id"),
+        Index("ix_tasks_user_id_category", "user_id", "category"),
+        # unscoped reads: subtask loads / "has no subtasks" (parent_id), category
+        # filters, and open-task filters; closed tasks, the bulk of the table,
+        # stay out of the partial indexes
+        Index("ix_tasks_parent_id", "parent_id"),
+        Index("ix_tasks_category", "category"),
+        Index(
+            "ix_tasks_open_is_subtask_due_date",
+            "is_subtask",
+            "due_date",
+            postgresql_where=text("status IN ('pending', 'in_progress')"),
+        ),
+        # the feature index loader streams open tasks in created_at order
+        Index(
+            "ix_tasks_open_created_at",
+            "created_at",
+            "id",
+            postgresql_where=text("status IN ('pending', 'in_progress')"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
@@ -42,7 +67,16 @@ class Task(Base):
     actual_minutes = Column(Integer, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Delta sync (GET /tasks/changes) reads this. clock_timestamp() rather than
+    # now(): a transaction that waits on the LLM would otherwise stamp its
+    # writes with its start time, long before they become visible.
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        default=func.clock_timestamp(),
+        onupdate=func.clock_timestamp(),
+        index=True,
+    )
 
     # relations
     parent = relationship("Task", remote_side=[id], back_populates="subtasks")
@@ -54,6 +88,18 @@ class Task(Base):
         back_populates="tasks",
     )
 
+# ----- Task Deletion Log -----
+# Tasks deleted outright (subtasks replaced by generate / regenerate), so
+# delta sync can tell clients to drop them.
+class TaskDeletion(Base):
+    __tablename__ = "task_deletions"
+
+    task_id = Column(UUID(as_uuid=True), primary_key=True, nullable=False)
+    parent_id = Column(UUID(as_uuid=True), nullable=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+
+    deleted_at = Column(DateTime(timezone=True), default=func.clock_timestamp(), nullable=False, index=True)
+
 # ----- Tag Group Model -----
 class TagGroup(Base):
     __tablename__ = "tag_groups"
@@ -63,7 +109,7 @@ class TagGroup(Base):
 
     type = Column(String, nullable=False, default="custom") # system / custom
 
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True, index=True)
 
     is_single_select = Column(Boolean, nullable=False, default=False)
     allow_add_tag = Column(Boolean, nullable=False, default=True)
@@ -87,7 +133,7 @@ class Tag(Base):
     name = Column(String, nullable=False)
 
     is_system = Column(Boolean, nullable=False, default=False)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True, index=True)
 
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     
@@ -0,0 +1,174 @@
+import argparse
+import os
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Date, cast, func, text
+from sqlalchemy.orm import Session
+
+from models.activity import ALL_TOOLS, ActivityRollup
+
+# Local day a session belongs to
+STATS_TIMEZONE = os.getenv("STATS_TIMEZONE", "UTC")
+
+GROUP_BY_FIELDS = ("mode", "place", "tool", "category")
+
+_BACKFILL_SQL = """
+    INSERT INTO activity_rollups
+        (day, mode, place, tool, category, sessions, completed, quit, total_seconds, updated_at)
+    SELECT s.day, s.mode, s.place, t.tool, s.category,
+           count(*),
+           count(*) FILTER (WHERE s.event_type = 'COMPLETE'),
+           count(*) FILTER (WHERE s.event_type = 'QUIT'),
+           COALESCE(sum(s.seconds), 0),
+           now()
+    FROM (
+        SELECT (r.occurred_at AT TIME ZONE :tz)::date AS day,
+               COALESCE(r.mode, '') AS mode,
+               COALESCE(r.place, '') AS place,
+               COALESCE(tk.category, '') AS category,
+               r.event_type::text AS event_type,
+               CASE WHEN r.duration_seconds >= 0 THEN r.duration_seconds END AS seconds,
+               r.tool
+        FROM records r
+        LEFT JOIN tasks tk ON tk.id = r.task_id
+        WHERE r.event_type IN ('COMPLETE', 'QUIT')
+          AND (CAST(:start AS date) IS NULL OR r.occurred_at >= CAST(:start AS date)::timestamp AT TIME ZONE :tz)
+          AND (CAST(:end AS date) IS NULL OR r.occurred_at < CAST(:end AS date)::timestamp AT TIME ZONE :tz)
+    ) s
+    CROSS JOIN LATERAL (
+        SELECT :all_tools AS tool
+        UNION ALL
+        SELECT DISTINCT x FROM unnest(s.tool) AS x WHERE x <> ''
+        UNION ALL
+        SELECT '' WHERE NOT EXISTS (SELECT 1 FROM unnest(s.tool) AS x WHERE x <> '')
+    ) t
+    GROUP BY s.day, s.mode, s.place, t.tool, s.category
+"""
+
+
+def _tools(tool: Optional[List[str]]) -> List[str]:
+    """The per-session total row plus one row per tool used ('' when none)."""
+    return [ALL_TOOLS] + (sorted({t for t in (tool or []) if t}) or [""])
+
+
+class ActivityService:
+    # ----- Incremental updates (run inside the caller's transaction) -----
+    @staticmethod
+    def on_session_closed(
+        db: Session,
+        *,
+        occurred_at: datetime,
+        mode: Optional[str],
+        place: Optional[str],
+        tool: Optional[List[str]],
+        category: Optional[str],
+        completed: bool,
+        duration_seconds: Optional[int],
+    ):
+        params: Dict[str, Any] = {
+            "occurred_at": occurred_at,
+            "tz": STATS_TIMEZONE,
+            "mode": mode or "",
+            "place": place or "",
+            "category": category or "",
+            "completed": 1 if completed else 0,
+            "quit": 0 if completed else 1,
+            "seconds": duration_seconds if duration_seconds is not None and duration_seconds >= 0 else 0,
+        }
+        rows = []
+        for i, t in enumerate(_tools(tool)):
+            rows.append(f"((CAST(:occurred_at AS timestamptz) AT TIME ZONE :tz)::date, "
+                        f":mode, :place, :tool_{i}, :category, 1, :completed, :quit, :seconds, now())")
+            params[f"tool_{i}"] = t
+
+        db.execute(text(f"""
+            INSERT INTO activity_rollups AS a
+                (day, mode, place, tool, category, sessions, completed, quit, total_seconds, updated_at)
+            VALUES {", ".join(rows)}
+            ON CONFLICT (day, mode, place, tool, category) DO UPDATE SET
+                sessions = a.sessions + 1,
+                completed = a.completed + EXCLUDED.completed,
+                quit = a.quit + EXCLUDED.quit,
+                total_seconds = a.total_seconds + EXCLUDED.total_seconds,
+                updated_at = now()
+        """), params)
+
+    # ----- Backfill -----
+    @staticmethod
+    def backfill(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """
+        Rebuild the rollup for days in [start, end) (all days when omitted)
+        from the closed sessions in records. Returns the number of rows written.
+        """
+        params = {"start": start, "end": end, "tz": STATS_TIMEZONE, "all_tools": ALL_TOOLS}
+        db.query(ActivityRollup).filter(
+            (ActivityRollup.day >= start) if start is not None else True,
+            (ActivityRollup.day < end) if end is not None else True,
+        ).delete(synchronize_session=False)
+        written = db.execute(text(_BACKFILL_SQL), params).rowcount
+        db.commit()
+        return written
+
+    # ----- Read -----
+    @staticmethod
+    def get_stats(
+        db: Session,
+        start: date,
+        end: date,
+        group_by: List[str],
+        interval: str = "day",
+    ) -> List[Dict[str, Any]]:
+        """
+        Minutes and session counts per day / week in [start, end), split by
+        the `group_by` fields. Reads only the rollup rows of the requested days.
+        """
+        period = cast(func.date_trunc(interval, ActivityRollup.day), Date).label("period")
+        columns = [getattr(ActivityRollup, field) for field in group_by]
+        query = (
+            db.query(
+                period,
+                *columns,
+                func.sum(ActivityRollup.sessions).label("sessions"),
+                func.sum(ActivityRollup.completed).label("completed"),
+                func.sum(ActivityRollup.quit).label("quit"),
+                func.sum(ActivityRollup.total_seconds).label("total_seconds"),
+            )
+            .filter(
+                ActivityRollup.day >= start,
+                ActivityRollup.day < end,
+                (ActivityRollup.tool != ALL_TOOLS) if "tool" in group_by else (ActivityRollup.tool == ALL_TOOLS),
+            )
+            .group_by(period, *columns)
+            .order_by(period, *columns)
+        )
+
+        buckets = []
+        for row in query.all():
+            bucket = {"period": row.period}
+            for field in group_by:
+                bucket[field] = getattr(row, field) or None
+            bucket.update(
+                sessions=row.sessions,
+                completed=row.completed,
+                quit=row.quit,
+                minutes=round(row.total_seconds / 60, 1),
+            )
+            buckets.append(bucket)
+        return buckets
+
+
+if __name__ == "__main__":
+    # cd src && python -m records.activity --from 2026-01-01 --to 2026-02-01
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild activity_rollups from records")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"Wrote {ActivityService.backfill(db, args.start, args.end)} activity rollup rows")
+    finally:
+        db.close()
@@ -0,0 +1,228 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+
+from models.duration import DurationStat
+from models.task import Task
+
+# Minimum completed tasks before a category / tag combination is trusted
+MIN_SAMPLES = int(os.getenv("DURATION_MIN_SAMPLES", "3"))
+
+# SQL equivalent of task_tag_key() for the task aliased as `tasks`
+# (COLLATE "C" sorts by code point, like Python's sorted())
+TAG_KEY_SQL = """COALESCE((
+    SELECT string_agg(g.name || ':' || tg.name, '|' ORDER BY g.name || ':' || tg.name COLLATE "C")
+    FROM task_tags tt
+    JOIN tags tg ON tg.id = tt.tag_id
+    JOIN tag_groups g ON g.id = tg.tag_group_id
+    WHERE tt.task_id = tasks.id
+), '')"""
+
+# Same aggregation as the duration_stats migration's backfill, from closed sessions
+_BACKFILL_SQL = f"""
+    WITH per_task AS (
+        SELECT
+            task_id,
+            count(*) AS sessions,
+            count(*) FILTER (WHERE event_type = 'COMPLETE') AS completed,
+            count(*) FILTER (WHERE event_type = 'QUIT') AS quit,
+            sum(GREATEST(COALESCE(duration_seconds, 0), 0)) AS total_seconds,
+            bool_or(event_type = 'COMPLETE') AS is_completed
+        FROM records
+        WHERE event_type IN ('COMPLETE', 'QUIT')
+        GROUP BY task_id
+    ),
+    task_keys AS (
+        SELECT p.*, tasks.category, tasks.estimated_minutes, {TAG_KEY_SQL} AS tag_key
+        FROM per_task p
+        JOIN tasks ON tasks.id = p.task_id
+    )
+    INSERT INTO duration_stats
+        (scope, key, sessions, completed, quit, total_seconds,
+         completed_tasks, completed_task_seconds,
+         estimated_tasks, estimated_minutes_sum, estimated_actual_seconds,
+         updated_at)
+    SELECT 'task', task_id::text, sessions, completed, quit, total_seconds,
+           0, 0, 0, 0, 0, now()
+    FROM per_task
+    UNION ALL
+    SELECT
+        s.scope,
+        s.key,
+        sum(k.sessions),
+        sum(k.completed),
+        sum(k.quit),
+        sum(k.total_seconds),
+        count(*) FILTER (WHERE k.is_completed),
+        COALESCE(sum(k.total_seconds) FILTER (WHERE k.is_completed), 0),
+        count(*) FILTER (WHERE k.is_completed AND k.estimated_minutes > 0),
+        COALESCE(sum(k.estimated_minutes) FILTER (WHERE k.is_completed AND k.estimated_minutes > 0), 0),
+        COALESCE(sum(k.total_seconds) FILTER (WHERE k.is_completed AND k.estimated_minutes > 0), 0),
+        now()
+    FROM task_keys k
+    CROSS JOIN LATERAL (VALUES ('category', k.category), ('tags', k.tag_key)) AS s(scope, key)
+    WHERE s.key IS NOT NULL
+    GROUP BY s.scope, s.key
+"""
+
+_COLUMNS = [
+    "sessions", "completed", "quit", "total_seconds",
+    "completed_tasks", "completed_task_seconds",
+    "estimated_tasks", "estimated_minutes_sum", "estimated_actual_seconds",
+]
+
+
+def tag_key(tags: Dict[str, List[str]]) -> str:
+    """Stable key for a tag combination, e.g. "Mode:Focus|Tools:Computer"."""
+    return "|".join(sorted(f"{group}:{name}" for group, names in tags.items() for name in names))
+
+
+def task_tag_key(task: Task) -> str:
+    tags: Dict[str, List[str]] = {}
+    for tag in task.tags:
+        tags.setdefault(tag.group_name, []).append(tag.name)
+    return tag_key(tags)
+
+
+def _upsert_sql(rows: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """INSERT .. ON CONFLICT adding `rows` onto the running aggregates; fills `params`."""
+    values = []
+    for i, row in enumerate(rows):
+        names = ["scope", "key", *_COLUMNS]
+        values.append("(" + ", ".join(f":{n}_{i}" for n in names) + ", now())")
+        for n in names:
+            params[f"{n}_{i}"] = row.get(n, 0)
+
+    return f"""
+        INSERT INTO duration_stats AS d (scope, key, {", ".join(_COLUMNS)}, updated_at)
+        VALUES {", ".join(values)}
+        ON CONFLICT (scope, key) DO UPDATE SET
+            {", ".join(f"{c} = d.{c} + EXCLUDED.{c}" for c in _COLUMNS)},
+            updated_at = now()
+        RETURNING scope, key, total_seconds
+    """
+
+
+class DurationStatsService:
+    # ----- Incremental updates (run inside the caller's transaction) -----
+    @staticmethod
+    def on_session_closed(
+        db: Session,
+        *,
+        task_id,
+        category: Optional[str],
+        estimated_minutes: Optional[int],
+        tags_key: str,
+        completed: bool,
+        duration_seconds: Optional[int],
+    ) -> int:
+        """
+        Roll a finished session into the task / category / tag aggregates and
+        refresh tasks.actual_minutes from the task's accumulated time, in two
+        statements. Takes plain values so callers can pass what their own
+        UPDATE .. RETURNING gave back instead of loading the Task.
+        Returns the task's accumulated seconds.
+        """
+        seconds = max(duration_seconds or 0, 0)
+        session = {
+            "sessions": 1,
+            "completed": 1 if completed else 0,
+            "quit": 0 if completed else 1,
+            "total_seconds": seconds,
+        }
+
+        params: Dict[str, Any] = {"task_id": task_id}
+        upsert = _upsert_sql([{"scope": "task", "key": str(task_id), **session}], params)
+        spent = db.execute(text(f"""
+            WITH stat AS ({upsert}),
+            spent AS (
+                UPDATE tasks SET actual_minutes = CEIL(stat.total_seconds / 60.0), updated_at = clock_timestamp()
+                FROM stat
+                WHERE tasks.id = :task_id AND stat.total_seconds > 0
+            )
+            SELECT total_seconds FROM stat
+        """), params).scalar()
+
+        group_row = dict(session)
+        if completed:
+            group_row["completed_tasks"] = 1
+            group_row["completed_task_seconds"] = spent
+            if estimated_minutes:
+                group_row["estimated_tasks"] = 1
+                group_row["estimated_minutes_sum"] = estimated_minutes
+                group_row["estimated_actual_seconds"] = spent
+
+        rows = [{"scope": "tags", "key": tags_key, **group_row}]
+        if category:
+            rows.append({"scope": "category", "key": category, **group_row})
+        params = {}
+        db.execute(text(_upsert_sql(rows, params)), params)
+        return spent
+
+    # ----- Backfill -----
+    @staticmethod
+    def backfill(db: Session) -> int:
+        """
+        Rebuild duration_stats and tasks.actual_minutes from all closed
+        sessions in records. Returns the number of stat rows written.
+        """
+        db.execute(text("DELETE FROM duration_stats"))
+        written = db.execute(text(_BACKFILL_SQL)).rowcount
+        db.execute(text("""
+            UPDATE tasks t
+            SET actual_minutes = CEIL(d.total_seconds / 60.0), updated_at = clock_timestamp()
+            FROM duration_stats d
+            WHERE d.scope = 'task' AND d.key = t.id::text AND d.total_seconds > 0
+              AND t.actual_minutes IS DISTINCT FROM CEIL(d.total_seconds / 60.0)
+        """))
+        db.commit()
+        return written
+
+    # ----- Read -----
+    @staticmethod
+    def expected_minutes(db: Session, tasks: Iterable[Dict[str, Any]]) -> Dict[str, Optional[int]]:
+        """
+        Corrected time estimate per task id, for recommender candidate rows
+        (dicts with id, category, estimated_minutes and grouped tags).
+
+        The estimate is scaled by the actual/estimated ratio learned for the
+        task's tag combination, falling back to its category. Tasks without an
+        estimate get the mean actual time of that group. Groups with fewer
+        than MIN_SAMPLES completed tasks are ignored.
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return {}
+        categories = {t["category"] for t in tasks if t.get("category")}
+        tag_keys = {tag_key(t.get("tags") or {}) for t in tasks}
+
+        conds = [and_(DurationStat.scope == "tags", DurationStat.key.in_(tag_keys))]
+        if categories:
+            conds.append(and_(DurationStat.scope == "category", DurationStat.key.in_(categories)))
+        stats = {
+            (s.scope, s.key): s
+            for s in db.query(DurationStat).filter(or_(*conds)).all()
+        }
+
+        out: Dict[str, Optional[int]] = {}
+        for t in tasks:
+            est = t.get("estimated_minutes")
+            candidates = [stats.get(("tags", tag_key(t.get("tags") or {})))]
+            if t.get("category"):
+                candidates.append(stats.get(("category", t["category"])))
+
+            expected = est
+            for s in candidates:
+                if s is None:
+                    continue
+                if est and s.estimated_tasks >= MIN_SAMPLES and s.estimated_minutes_sum:
+                    ratio = s.estimated_actual_seconds / 60 / s.estimated_minutes_sum
+                    expected = max(1, round(est * ratio))
+                    break
+                if not est and s.completed_tasks >= MIN_SAMPLES:
+                    expected = max(1, round(s.completed_task_seconds / 60 / s.completed_tasks))
+                    break
+            out[str(t["id"])] = expected
+        return out
@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import os
+import re
+from datetime import date
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+# records is range-partitioned by UTC month on occurred_at (see the
+# "partition records by month" migration). Partitions are named records_yYYYYmMM;
+# rows outside every partition land in records_default.
+
+# Monthly partitions kept ready past the current month
+MONTHS_AHEAD = int(os.getenv("RECORDS_PARTITION_MONTHS_AHEAD", "3"))
+# Months of records kept attached, including the current one (0 = keep all)
+RETENTION_MONTHS = int(os.getenv("RECORDS_RETENTION_MONTHS", "0"))
+# Schema detached partitions are moved to
+ARCHIVE_SCHEMA = os.getenv("RECORDS_ARCHIVE_SCHEMA", "records_archive")
+# Seconds between the running app's partition checks (0 = container start only)
+CHECK_INTERVAL_SECONDS = float(os.getenv("RECORDS_PARTITION_CHECK_SECONDS", "21600"))
+
+_PARTITION_NAME = re.compile(r"^records_y(\d{4})m(\d{2})$")
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class PartitionService:
+    @staticmethod
+    def list_partitions(db: Session) -> List[str]:
+        rows = db.execute(text("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'records'::regclass
+            ORDER BY c.relname
+        """))
+        return [r.relname for r in rows if _PARTITION_NAME.match(r.relname)]
+
+    @staticmethod
+    def ensure_partitions(db: Session, months_ahead: int = MONTHS_AHEAD, today: date = None) -> List[str]:
+        """
+        Create the monthly partitions from the current month up to
+        `months_ahead` months later. Rows already sitting in records_default
+        for those months are moved into the new partition. Returns the names
+        of the partitions that were created.
+        """
+        first = (today or date.today()).replace(day=1)
+        created = []
+        for offset in range(months_ahead + 1):
+            month = _add_months(first, offset)
+            if db.execute(text("SELECT records_create_partition(:month)"), {"month": month}).scalar():
+                created.append(f"records_y{month:%Y}m{month:%m}")
+        db.commit()
+        return created
+
+    @staticmethod
+    def archive_partitions(
+        db: Session,
+        retention_months: int = RETENTION_MONTHS,
+        drop: bool = False,
+        today: date = None,
+    ) -> List[str]:
+        """
+        Detach the partitions older than the last `retention_months` months.
+        They are moved to ARCHIVE_SCHEMA (or dropped with drop=True). The
+        stats, profile and duration rollups keep their aggregated history.
+        Returns the names of the detached partitions.
+        """
+        if retention_months <= 0:
+            return []
+        cutoff = _add_months((today or date.today()).replace(day=1), -(retention_months - 1))
+
+        detached = []
+        for name in PartitionService.list_partitions(db):
+            year, month = map(int, _PARTITION_NAME.match(name).groups())
+            if date(year, month, 1) >= cutoff:
+                continue
+            db.execute(text(f'ALTER TABLE records DETACH PARTITION "{name}"'))
+            if drop:
+                db.execute(text(f'DROP TABLE "{name}"'))
+            else:
+                db.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{ARCHIVE_SCHEMA}"'))
+                db.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{ARCHIVE_SCHEMA}"'))
+            detached.append(name)
+        db.commit()
+        return detached
+
+
+def _scheduled_check() -> List[str]:
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        # every worker runs the check; one at a time is enough
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('records_partitions'))")).scalar():
+            return []
+        return PartitionService.ensure_partitions(db)
+    finally:
+        db.close()
+
+
+async def run_periodic_checks(interval: float = CHECK_INTERVAL_SECONDS):
+    """
+    Create upcoming partitions every `interval` seconds for as long as the
+    app runs (started by main's lifespan), so a deployment that stays up
+    past RECORDS_PARTITION_MONTHS_AHEAD months never writes into
+    records_default. Archiving stays a manual / cron job.
+    """
+    while True:
+        try:
+            for name in await run_in_threadpool(_scheduled_check):
+                print("Created partition", name)
+        except Exception as e:
+            print("Partition check failed:", repr(e))
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    # cd src && python -m records.partitions [--archive [--drop]]
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of records")
+    parser.add_argument("--archive", action="store_true", help=f"detach partitions older than RECORDS_RETENTION_MONTHS ({RETENTION_MONTHS})")
+    parser.add_argument("--drop", action="store_true", help="drop detached partitions instead of archiving them")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for name in PartitionService.ensure_partitions(db):
+            print("Created partition", name)
+        if args.archive:
+            for name in PartitionService.archive_partitions(db, drop=args.drop):
+                print("Dropped partition" if args.drop else f"Archived partition to {ARCHIVE_SCHEMA}:", name)
+    finally:
+        db.close()
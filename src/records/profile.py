@@ -0,0 +1,241 @@
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models.profile import DURATION_BUCKETS_MINUTES
+
+_N_BUCKETS = len(DURATION_BUCKETS_MINUTES) + 1
+
+# Same aggregation as the profile_rollups migration's backfill: every record
+# counts as a session, closed ones add their outcome and duration bucket
+_BACKFILL_SQL = f"""
+    WITH sessions AS (
+        SELECT
+            COALESCE(tk.user_id::text, '') AS user_id,
+            COALESCE(r.mode, '') AS mode,
+            COALESCE(r.place, '') AS place,
+            COALESCE(t.tool, '') AS tool,
+            COALESCE(tk.category, '') AS category,
+            r.event_type::text AS event_type,
+            CASE WHEN r.event_type IN ('COMPLETE', 'QUIT') AND r.duration_seconds >= 0
+                 THEN r.duration_seconds END AS seconds
+        FROM records r
+        LEFT JOIN tasks tk ON tk.id = r.task_id
+        LEFT JOIN LATERAL unnest(
+            CASE WHEN cardinality(r.tool) > 0 THEN r.tool ELSE ARRAY[NULL]::text[] END
+        ) AS t(tool) ON true
+    ),
+    bucketed AS (
+        SELECT s.*,
+               CASE WHEN s.seconds IS NOT NULL THEN
+                   (SELECT count(*) FROM unnest(ARRAY{DURATION_BUCKETS_MINUTES}) AS e WHERE e < s.seconds / 60.0) + 1
+               END AS bucket
+        FROM sessions s
+    ),
+    totals AS (
+        SELECT user_id, mode, place, tool, category,
+               count(*) AS sessions,
+               count(*) FILTER (WHERE event_type = 'COMPLETE') AS completed,
+               count(*) FILTER (WHERE event_type = 'QUIT') AS quit,
+               COALESCE(sum(seconds), 0) AS total_seconds
+        FROM bucketed
+        GROUP BY user_id, mode, place, tool, category
+    ),
+    hist AS (
+        SELECT k.user_id, k.mode, k.place, k.tool, k.category,
+               array_agg(COALESCE(c.n, 0) ORDER BY b.b) AS histogram
+        FROM totals k
+        CROSS JOIN generate_series(1, {_N_BUCKETS}) AS b(b)
+        LEFT JOIN (
+            SELECT user_id, mode, place, tool, category, bucket, count(*)::int AS n
+            FROM bucketed
+            WHERE bucket IS NOT NULL
+            GROUP BY user_id, mode, place, tool, category, bucket
+        ) c ON c.user_id = k.user_id AND c.mode = k.mode AND c.place = k.place AND c.tool = k.tool
+           AND c.category = k.category AND c.bucket = b.b
+        GROUP BY k.user_id, k.mode, k.place, k.tool, k.category
+    )
+    INSERT INTO profile_rollups
+        (user_id, mode, place, tool, category, sessions, completed, quit,
+         total_seconds, duration_histogram, updated_at)
+    SELECT t.user_id, t.mode, t.place, t.tool, t.category, t.sessions, t.completed, t.quit,
+           t.total_seconds, h.histogram, now()
+    FROM totals t
+    JOIN hist h USING (user_id, mode, place, tool, category)
+"""
+
+# The most used contexts with their outcomes, summed over users unless
+# :user_id is given (then served by the primary key's user_id prefix)
+_PROFILE_SQL = text("""
+    WITH picked AS (
+        SELECT mode, place, tool, category,
+               sum(sessions)::int AS sessions,
+               sum(completed)::int AS completed,
+               sum(quit)::int AS quit
+        FROM profile_rollups
+        WHERE CAST(:user_id AS text) IS NULL OR user_id = CAST(:user_id AS text)
+        GROUP BY mode, place, tool, category
+        HAVING sum(sessions) > 0
+        ORDER BY sum(sessions) DESC
+        LIMIT :limit
+    )
+    SELECT k.*, hist.duration_histogram
+    FROM picked k
+    CROSS JOIN LATERAL (
+        SELECT array_agg(b.n ORDER BY b.i) AS duration_histogram
+        FROM (
+            SELECT h.i, sum(h.n)::int AS n
+            FROM profile_rollups p
+            CROSS JOIN LATERAL unnest(p.duration_histogram) WITH ORDINALITY AS h(n, i)
+            WHERE p.mode = k.mode AND p.place = k.place AND p.tool = k.tool AND p.category = k.category
+              AND (CAST(:user_id AS text) IS NULL OR p.user_id = CAST(:user_id AS text))
+            GROUP BY h.i
+        ) b
+    ) hist
+    ORDER BY k.sessions DESC
+""")
+
+
+def _keys(
+    user_id, mode: Optional[str], place: Optional[str], tool: Optional[List[str]], category: Optional[str]
+) -> List[Dict[str, str]]:
+    """One rollup key per tool used in the session ('' when none)."""
+    tools = sorted({t for t in (tool or []) if t}) or [""]
+    return [
+        {"user_id": str(user_id) if user_id else "", "mode": mode or "", "place": place or "", "tool": t,
+         "category": category or ""}
+        for t in tools
+    ]
+
+
+def _bucket(duration_seconds: int) -> int:
+    """1-based histogram position for a session length."""
+    return bisect_left(DURATION_BUCKETS_MINUTES, duration_seconds / 60) + 1
+
+
+def _upsert(db: Session, keys: List[Dict[str, str]], values: Dict[str, Any], on_conflict: str):
+    params: Dict[str, Any] = dict(values)
+    rows = []
+    for i, key in enumerate(keys):
+        rows.append(f"(:user_id_{i}, :mode_{i}, :place_{i}, :tool_{i}, :category_{i}, "
+                    ":sessions, :completed, :quit, :seconds, :histogram, now())")
+        for name, value in key.items():
+            params[f"{name}_{i}"] = value
+
+    db.execute(text(f"""
+        INSERT INTO profile_rollups AS p
+            (user_id, mode, place, tool, category, sessions, completed, quit,
+             total_seconds, duration_histogram, updated_at)
+        VALUES {", ".join(rows)}
+        ON CONFLICT (user_id, mode, place, tool, category) DO UPDATE SET
+            {on_conflict},
+            updated_at = now()
+    """), params)
+
+
+def _median_minutes(histogram: List[int]) -> Optional[float]:
+    total = sum(histogram)
+    if total == 0:
+        return None
+    half = total / 2
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= half:
+            lower = DURATION_BUCKETS_MINUTES[i - 1] if i > 0 else 0
+            if i >= len(DURATION_BUCKETS_MINUTES):
+                return float(lower)
+            upper = DURATION_BUCKETS_MINUTES[i]
+            return round(lower + (upper - lower) * (half - seen) / count, 1)
+        seen += count
+    return None
+
+
+class ProfileService:
+    # ----- Incremental updates (run inside the caller's transaction) -----
+    @staticmethod
+    def on_session_started(
+        db: Session,
+        *,
+        mode: Optional[str],
+        place: Optional[str],
+        tool: Optional[List[str]],
+        category: Optional[str],
+        user_id=None,
+    ):
+        _upsert(
+            db,
+            _keys(user_id, mode, place, tool, category),
+            {"sessions": 1, "completed": 0, "quit": 0, "seconds": 0, "histogram": [0] * _N_BUCKETS},
+            "sessions = p.sessions + 1",
+        )
+
+    @staticmethod
+    def on_session_closed(
+        db: Session,
+        *,
+        mode: Optional[str],
+        place: Optional[str],
+        tool: Optional[List[str]],
+        category: Optional[str],
+        completed: bool,
+        duration_seconds: Optional[int],
+        user_id=None,
+    ):
+        histogram = [0] * _N_BUCKETS
+        on_conflict = [
+            "completed = p.completed + EXCLUDED.completed",
+            "quit = p.quit + EXCLUDED.quit",
+        ]
+        values: Dict[str, Any] = {
+            "sessions": 0,
+            "completed": 1 if completed else 0,
+            "quit": 0 if completed else 1,
+            "seconds": 0,
+        }
+        if duration_seconds is not None and duration_seconds >= 0:
+            bucket = _bucket(duration_seconds)
+            histogram[bucket - 1] = 1
+            values["seconds"] = duration_seconds
+            values["bucket"] = bucket
+            on_conflict += [
+                "total_seconds = p.total_seconds + EXCLUDED.total_seconds",
+                "duration_histogram[:bucket] = p.duration_histogram[:bucket] + 1",
+            ]
+        values["histogram"] = histogram
+        _upsert(db, _keys(user_id, mode, place, tool, category), values, ",\n            ".join(on_conflict))
+
+    # ----- Backfill -----
+    @staticmethod
+    def backfill(db: Session) -> int:
+        """Rebuild profile_rollups from all records. Returns the number of rows written."""
+        db.execute(text("DELETE FROM profile_rollups"))
+        written = db.execute(text(_BACKFILL_SQL)).rowcount
+        db.commit()
+        return written
+
+    # ----- Read -----
+    @staticmethod
+    def get_profile(db: Session, limit: int = 20, user_id=None) -> Dict[str, Any]:
+        """
+        Long-term preference profile for the recommenders: the most used
+        (mode, place, tool, category) contexts with their outcome rates, from
+        `user_id`'s sessions (None = everyone's).
+        """
+        rows = db.execute(
+            _PROFILE_SQL, {"user_id": str(user_id) if user_id else None, "limit": limit}
+        ).all()
+        contexts = []
+        for r in rows:
+            contexts.append({
+                "mode": r.mode or None,
+                "place": r.place or None,
+                "tool": r.tool or None,
+                "category": r.category or None,
+                "sessions": r.sessions,
+                "completion_rate": round(r.completed / r.sessions, 2),
+                "quit_rate": round(r.quit / r.sessions, 2),
+                "median_minutes": _median_minutes(r.duration_histogram or []),
+            })
+        return {"contexts": contexts}
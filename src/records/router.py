@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import date, datetime
+from typing import List, Literal
 from .schema import *
 import uuid
-from .service import RecordService
-from database import get_db
+from .service import BulkEventError, RecordService, SessionClosedError
+from .activity import GROUP_BY_FIELDS, ActivityService
+from database import get_db, get_read_db, reads_from_primary
+from users.current import current_user_id
 
 router = APIRouter(prefix="/api/records", tags=["records"])
 
@@ -15,10 +19,68 @@ allow_fields = [
 ]
 
 @router.get("/")
-def get_records_endpoint(mode: Optional[str] = None, place: Optional[str] = None, tool: Optional[List[str]] = None, db: Session = Depends(get_db)):
-    records = RecordService.get_records(db, mode=mode, place=place, tool=tool)
+def get_records_endpoint(
+    request: Request,
+    response: Response,
+    mode: Optional[str] = None,
+    place: Optional[str] = None,
+    tool: Optional[List[str]] = Query(None),
+    tool_match: Literal["any", "all"] = "any",
+    task_id: Optional[uuid.UUID] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    db: Session = Depends(get_read_db),
+):
+    """
+    Records ordered by occurred_at, filtered by [from, to).
+    - json: one page of `limit` records; the next page's cursor is returned
+      in the X-Next-Cursor header (absent on the last page)
+    - ndjson: every matching record streamed one per line (limit is ignored)
+    tool_match="any" returns records using at least one `tool`, "all" every `tool`.
+    """
+    filters = dict(mode=mode, place=place, tool=tool, tool_match=tool_match, task_id=task_id, start=start, end=end, cursor=cursor)
+    try:
+        if format == "ndjson":
+            return StreamingResponse(RecordService.stream_records(**filters, primary=reads_from_primary(request)), media_type="application/x-ndjson")
+        records, next_cursor = RecordService.get_records(db, limit=limit, **filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return records
 
+@router.get("/stats", response_model=List[RecordStatsBucket], response_model_exclude_unset=True)
+def get_record_stats_endpoint(
+    start: date = Query(..., alias="from"),
+    end: date = Query(..., alias="to"),
+    group_by: List[Literal["mode", "place", "tool", "category"]] = Query([]),
+    interval: Literal["day", "week"] = "day",
+    db: Session = Depends(get_db),
+):
+    """
+    Session minutes per day (or ISO week) in [from, to), split by any of
+    mode / place / tool / category. Served from the activity rollup.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    fields = [f for f in GROUP_BY_FIELDS if f in group_by]
+    return ActivityService.get_stats(db, start, end, fields, interval)
+
+@router.get("/active", response_model=ActiveSessionResponse)
+def get_active_session_endpoint(
+    db: Session = Depends(get_db),
+    user_id: Optional[uuid.UUID] = Depends(current_user_id),
+):
+    """The latest session of the user's tasks that is still running or paused."""
+    session = RecordService.get_active_session(db, user_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="No active session")
+    return session
+
 @router.get("/{id}")
 def get_record_endpoint(id: uuid.UUID, db: Session = Depends(get_db)):
     records = RecordService.get_record_by_ID(db, id=id)
@@ -36,9 +98,30 @@ def create_record_endpoint(record: RecordCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Record creation failed")
     return new_record
 
+@router.post(":bulk", response_model=RecordBulkResponse)
+def bulk_records_endpoint(batch: RecordBulkCreate, db: Session = Depends(get_db)):
+    """
+    Apply an ordered batch of events (e.g. replayed after being offline) in one
+    transaction. If any event is invalid nothing is written and a 422 lists
+    the index and reason of each bad event.
+    """
+    try:
+        records, created = RecordService.apply_events(db, batch.events)
+    except BulkEventError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors)
+    return RecordBulkResponse(
+        events=len(batch.events),
+        created=created,
+        updated=len(records) - created,
+        records=records,
+    )
+
 @router.put("/{id}", response_model=RecordResponse)
 def update_record_endpoint(id: uuid.UUID, record: RecordUpdate, db: Session = Depends(get_db)):
-    updated_record = RecordService.update_record(db, id, record)
+    try:
+        updated_record = RecordService.update_record(db, id, record)
+    except SessionClosedError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
     if not updated_record:
         raise HTTPException(status_code=404, detail="Record not found")
     return updated_record
\ No newline at end of file
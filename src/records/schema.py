@@ -38,3 +38,42 @@ class RecordResponse(RecordBase):
 class RecordUpdate(RecordBase):
     event_type : EventType
     updated_at: datetime
+
+
+# One event of an offline batch. record_id is generated by the client when the
+# event starts a new session (INPROGRESS) and reused by that session's later events.
+class RecordEvent(BaseModel):
+    record_id: UUID
+    event_type: EventType
+    occurred_at: datetime
+    # required when the event starts a new session
+    task_id: Optional[UUID] = None
+    mode: Optional[str] = None
+    place: Optional[str] = None
+    tool: Optional[List[str]] = None
+
+class RecordBulkCreate(BaseModel):
+    events: List[RecordEvent] = Field(..., min_length=1, max_length=1000)
+
+# The session shown on the home screen, from the active_session view
+class ActiveSessionResponse(RecordResponse):
+    task_title: Optional[str] = None
+    updated_at: datetime
+
+# One day / week of /api/records/stats; only the grouped fields are present
+class RecordStatsBucket(BaseModel):
+    period: date
+    mode: Optional[str] = None
+    place: Optional[str] = None
+    tool: Optional[str] = None
+    category: Optional[str] = None
+    sessions: int
+    completed: int
+    quit: int
+    minutes: float
+
+class RecordBulkResponse(BaseModel):
+    events: int
+    created: int
+    updated: int
+    records: List[RecordResponse]
@@ -1,20 +1,156 @@
 from datetime import datetime, timezone
+import base64
 import uuid
 from .schema import *
-from models.record import Record
-from sqlalchemy.orm import Session
-from typing import List
+from models.record import OPEN_EVENT_TYPES, Record
+from sqlalchemy import insert, text, tuple_
+from sqlalchemy.orm import Session, selectinload
+from typing import Any, Dict, Iterator, List, Tuple
+from database import read_session
 from tasks.service import *
+from tasks import feature_index
+from changes import events
+from .profile import ProfileService
+from .durations import TAG_KEY_SQL, DurationStatsService, task_tag_key
+from .activity import ActivityService
+
+# Rows fetched per round-trip when streaming records
+STREAM_BATCH_SIZE = 1000
+
+_CLOSED_EVENTS = (EventType.COMPLETE, EventType.QUIT)
+_OPEN_EVENTS_SQL = ", ".join(f"'{e}'" for e in OPEN_EVENT_TYPES)
+
+
+class SessionClosedError(ValueError):
+    """The record's session already ended with COMPLETE or QUIT."""
+
+
+class BulkEventError(ValueError):
+    """A batch failed validation; `errors` has one {"index", "error"} per bad event."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} invalid event(s)")
+        self.errors = errors
+
+
+def _seconds_between(start: datetime, end: datetime) -> Optional[int]:
+    try:
+        return int((end - start).total_seconds())
+    except Exception as exc:
+        print("Failed to compute duration seconds:", exc)
+        return None
+
+
+def _out_of_order(previous: datetime, current: datetime) -> bool:
+    try:
+        return current < previous
+    except TypeError:
+        # naive vs aware timestamps can't be ordered; accept as sent
+        return False
+
+
+def encode_cursor(record: Record) -> str:
+    raw = f"{record.occurred_at.isoformat()}|{record.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        occurred_at, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(occurred_at), uuid.UUID(record_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
 
 class RecordService:
     @staticmethod
-    def get_records(db: Session, mode: str = None, place: str = None, tool: List[str] = None) -> List: 
-        results = db.query(Record).filter(
+    def _filtered(
+        db: Session,
+        mode: str = None,
+        place: str = None,
+        tool: List[str] = None,
+        task_id: uuid.UUID = None,
+        start: datetime = None,
+        end: datetime = None,
+        cursor: str = None,
+        tool_match: str = "any",
+    ):
+        """
+        tool_match="any": records that used at least one of `tool` (&&)
+        tool_match="all": records that used every tool in `tool` (@>)
+        """
+        if tool is None:
+            tool_filter = True
+        elif tool_match == "all":
+            tool_filter = Record.tool.contains(tool)
+        else:
+            tool_filter = Record.tool.overlap(tool)
+
+        query = db.query(Record).filter(
             (Record.mode == mode) if mode is not None else True,
             (Record.place == place) if place is not None else True,
-            (Record.tool.overlap(tool)) if tool is not None else True
-        ).all()  
-        return results
+            tool_filter,
+            (Record.task_id == task_id) if task_id is not None else True,
+            (Record.occurred_at >= start) if start is not None else True,
+            (Record.occurred_at < end) if end is not None else True,
+        )
+        if cursor is not None:
+            after = decode_cursor(cursor)
+            query = query.filter(tuple_(Record.occurred_at, Record.id) > tuple_(*after))
+        return query.order_by(Record.occurred_at, Record.id)
+
+    @staticmethod
+    def get_records(
+        db: Session,
+        mode: str = None,
+        place: str = None,
+        tool: List[str] = None,
+        task_id: uuid.UUID = None,
+        start: datetime = None,
+        end: datetime = None,
+        limit: int = 100,
+        cursor: str = None,
+        tool_match: str = "any",
+    ) -> Tuple[List[Record], Optional[str]]:
+        """
+        One page of records ordered by (occurred_at, id).
+        Returns the page and the cursor for the next one (None on the last page).
+        """
+        query = RecordService._filtered(db, mode, place, tool, task_id, start, end, cursor, tool_match)
+        results = query.limit(limit + 1).all()
+        if len(results) > limit:
+            return results[:limit], encode_cursor(results[limit - 1])
+        return results, None
+
+    @staticmethod
+    def stream_records(
+        mode: str = None,
+        place: str = None,
+        tool: List[str] = None,
+        task_id: uuid.UUID = None,
+        start: datetime = None,
+        end: datetime = None,
+        cursor: str = None,
+        tool_match: str = "any",
+        primary: bool = False,
+    ) -> Iterator[str]:
+        """
+        NDJSON export through a server-side cursor, so memory stays flat no
+        matter how many records match. Owns its (read) session because the
+        response body is produced after the request's session is closed.
+        """
+        # validate the cursor before the response starts
+        if cursor is not None:
+            decode_cursor(cursor)
+
+        def lines():
+            with read_session(primary) as db:
+                query = RecordService._filtered(db, mode, place, tool, task_id, start, end, cursor, tool_match)
+                for record in query.yield_per(STREAM_BATCH_SIZE):
+                    yield RecordResponse.model_validate(record).model_dump_json() + "\n"
+
+        return lines()
     
     @staticmethod
     def get_record_by_ID(db: Session, id: uuid.UUID) -> List: 
@@ -32,47 +168,337 @@ class RecordService:
     #     return results
     
     @staticmethod
-    def create_record(db: Session, record_data: RecordCreate) -> Record:
-        new_record = Record(
-            id=uuid.uuid4(),
-            task_id=record_data.task_id,
-            mode=record_data.mode,
-            place=record_data.place,
-            tool=record_data.tool,
-            occurred_at=record_data.occurred_at,
-            event_type=EventType.INPROGRESS
+    def create_record(db: Session, record_data: RecordCreate) -> RecordResponse:
+        """
+        Start a session: the record INSERT and the task's move to in_progress
+        run as one statement, committed together with the profile rollup.
+        """
+        row = db.execute(text("""
+            WITH task AS (
+                UPDATE tasks SET status = 'in_progress', updated_at = clock_timestamp()
+                WHERE id = :task_id
+                RETURNING id, category, user_id
+            )
+            INSERT INTO records AS r
+                (id, task_id, mode, place, tool, event_type, occurred_at, created_at, updated_at)
+            VALUES
+                (:id, :task_id, :mode, :place, :tool, 'INPROGRESS', :occurred_at, now(), now())
+            RETURNING r.*,
+                      (SELECT category FROM task) AS category,
+                      (SELECT user_id FROM task) AS task_user_id,
+                      EXISTS (SELECT 1 FROM task) AS task_found
+        """), {
+            "id": uuid.uuid4(),
+            "task_id": record_data.task_id,
+            "mode": record_data.mode,
+            "place": record_data.place,
+            "tool": record_data.tool,
+            "occurred_at": record_data.occurred_at,
+        }).mappings().one()
+
+        ProfileService.on_session_started(
+            db,
+            mode=row["mode"],
+            place=row["place"],
+            tool=row["tool"],
+            category=row["category"],
+            user_id=row["task_user_id"],
         )
-        db.add(new_record)
+        events.notify(db, "record", [row["id"]], user_id=row["task_user_id"])
+        if row["task_found"]:
+            events.notify(db, "task", [row["task_id"]], user_id=row["task_user_id"])
         db.commit()
-        db.refresh(new_record)
 
-        update_task(db, record_data.task_id, TaskUpdate(status=TaskStatus.in_progress))
-        return new_record
+        if row["task_found"]:
+            feature_index.on_task_status_changed(row["task_id"], TaskStatus.in_progress)
+        return RecordResponse.model_validate(dict(row))
     
     @staticmethod
-    def update_record(db: Session, record_id: uuid.UUID, new_record: RecordUpdate) -> Record:
-        record = db.query(Record).filter(Record.id == record_id).first()
-        
-        if new_record.event_type == EventType.COMPLETE:
-            update_task(db, record.task_id, TaskUpdate(status=TaskStatus.completed))
-            
-        if record:
-            record.event_type = new_record.event_type
-            record.updated_at = new_record.updated_at
-            print("New event type:", new_record.event_type, "Same:", new_record.event_type in (EventType.COMPLETE, EventType.QUIT))
-            if new_record.event_type in (EventType.COMPLETE, EventType.QUIT):
-                # compute duration in seconds treating datetimes as local wall-clock times
-                try:
-                    delta = new_record.updated_at - record.occurred_at
-                    record.duration_seconds = int(delta.total_seconds())
-                except Exception as exc:
-                    record.duration_seconds = None
-                    print("Failed to compute duration seconds:", exc)
-
-            db.commit()
-            db.refresh(record)        
-            return record
-        else:
+    def update_record(db: Session, record_id: uuid.UUID, new_record: RecordUpdate) -> Optional[RecordResponse]:
+        """
+        Move a session to a new event. The record UPDATE (with the duration on
+        COMPLETE / QUIT) and, for COMPLETE, the task's move to completed run as
+        one statement; closing a session also updates the rollups.
+        Only open sessions can change: raises SessionClosedError for a record
+        that is already COMPLETE / QUIT, returns None for an unknown one.
+        """
+        closing = new_record.event_type in _CLOSED_EVENTS
+        row = db.execute(text(f"""
+            WITH rec AS (
+                UPDATE records r
+                SET event_type = :event_type,
+                    updated_at = :updated_at,
+                    duration_seconds = CASE WHEN :closing
+                        -- naive timestamps are read in the session time zone
+                        THEN EXTRACT(EPOCH FROM (CAST(:updated_at AS timestamptz) - r.occurred_at))::int
+                        ELSE r.duration_seconds END
+                WHERE r.id = :id AND r.event_type IN ({_OPEN_EVENTS_SQL})
+                RETURNING r.*
+            ),
+            task AS (
+                UPDATE tasks SET status = 'completed', updated_at = clock_timestamp()
+                FROM rec
+                WHERE tasks.id = rec.task_id AND :complete
+                RETURNING tasks.id
+            )
+            SELECT rec.*,
+                   tasks.id IS NOT NULL AS task_found,
+                   tasks.user_id AS task_user_id,
+                   tasks.category,
+                   tasks.estimated_minutes,
+                   {TAG_KEY_SQL if closing else "''"} AS tags_key,
+                   EXISTS (SELECT 1 FROM task) AS task_completed
+            FROM rec
+            LEFT JOIN tasks ON tasks.id = rec.task_id
+        """), {
+            "id": record_id,
+            "event_type": new_record.event_type.value,
+            "updated_at": new_record.updated_at,
+            "closing": closing,
+            "complete": new_record.event_type == EventType.COMPLETE,
+        }).mappings().first()
+
+        if row is None:
+            exists = db.query(Record.id).filter(Record.id == record_id).first() is not None
+            db.rollback()
+            if exists:
+                raise SessionClosedError("Session is already closed")
             return None
+
+        if closing:
+            completed = new_record.event_type == EventType.COMPLETE
+            ProfileService.on_session_closed(
+                db,
+                mode=row["mode"],
+                place=row["place"],
+                tool=row["tool"],
+                category=row["category"],
+                completed=completed,
+                duration_seconds=row["duration_seconds"],
+                user_id=row["task_user_id"],
+            )
+            ActivityService.on_session_closed(
+                db,
+                occurred_at=row["occurred_at"],
+                mode=row["mode"],
+                place=row["place"],
+                tool=row["tool"],
+                category=row["category"],
+                completed=completed,
+                duration_seconds=row["duration_seconds"],
+            )
+            if row["task_found"]:
+                DurationStatsService.on_session_closed(
+                    db,
+                    task_id=row["task_id"],
+                    category=row["category"],
+                    estimated_minutes=row["estimated_minutes"],
+                    tags_key=row["tags_key"],
+                    completed=completed,
+                    duration_seconds=row["duration_seconds"],
+                )
+        events.notify(db, "record", [row["id"]], user_id=row["task_user_id"])
+        if row["task_completed"] or (closing and row["task_found"]):
+            # status, or actual_minutes from the closed session
+            events.notify(db, "task", [row["task_id"]], user_id=row["task_user_id"])
+        db.commit()
+
+        if row["task_completed"]:
+            feature_index.on_task_status_changed(row["task_id"], TaskStatus.completed)
+        return RecordResponse.model_validate(dict(row))
+
+    @staticmethod
+    def get_active_session(db: Session, user_id: uuid.UUID = None) -> Optional[Dict[str, Any]]:
+        """
+        The most recently started session that is still running or paused,
+        of a task of `user_id` (None = any user's), read from the
+        active_session view (an ordered scan of the ix_records_active partial
+        index, so only open sessions are read).
+        """
+        owner = "WHERE task_user_id = :user_id" if user_id is not None else ""
+        row = db.execute(text(f"""
+            SELECT * FROM active_session
+            {owner}
+            ORDER BY occurred_at DESC
+            LIMIT 1
+        """), {"user_id": user_id}).mappings().first()
+        return dict(row) if row else None
+
+    @staticmethod
+    def apply_events(db: Session, events: List[RecordEvent]) -> Tuple[List[RecordResponse], int]:
+        """
+        Apply an ordered batch of record events (e.g. replayed by a client that
+        was offline) in a single transaction, with the same effects as the
+        matching POST / PUT calls one by one:
+        - new sessions are written with one multi-row INSERT in their final state
+        - each touched task's status is set once, from its last INPROGRESS / COMPLETE
+        - profile and duration rollups are updated once per started / closed session
+        The whole batch is validated first; BulkEventError is raised, and
+        nothing is written, if any event is invalid.
+        Returns the touched records and how many of them were created.
+        """
+        record_ids = {e.record_id for e in events}
+        existing = {r.id: r for r in db.query(Record).filter(Record.id.in_(record_ids)).all()}
+        task_ids = {r.task_id for r in existing.values()} | {e.task_id for e in events if e.task_id}
+        tasks = {
+            t.id: t
+            for t in db.query(Task)
+            .options(selectinload(Task.tags).selectinload(Tag.group))
+            .filter(Task.id.in_(task_ids))
+            .all()
+        }
+
+        # ----- Validate and fold the events into per-session state -----
+        sessions: Dict[uuid.UUID, Dict[str, Any]] = {
+            r.id: {
+                "record": r,
+                "task_id": r.task_id,
+                "event_type": EventType(getattr(r.event_type, "value", r.event_type)),
+                "started_at": r.occurred_at,
+                "last_at": r.occurred_at,
+                "touched": False,
+            }
+            for r in existing.values()
+        }
+        task_status: Dict[uuid.UUID, TaskStatus] = {}
+        errors = []
+        for i, event in enumerate(events):
+            session = sessions.get(event.record_id)
+            if session is None:
+                if event.event_type != EventType.INPROGRESS:
+                    errors.append({"index": i, "error": "Unknown record; a session must start with INPROGRESS"})
+                    continue
+                missing = [f for f in ("task_id", "mode", "place", "tool") if getattr(event, f) is None]
+                if missing:
+                    errors.append({"index": i, "error": f"Missing {', '.join(missing)} for a new session"})
+                    continue
+                if event.task_id not in tasks:
+                    errors.append({"index": i, "error": "Task not found"})
+                    continue
+                sessions[event.record_id] = {
+                    "record": None,
+                    "start": event,
+                    "task_id": event.task_id,
+                    "event_type": event.event_type,
+                    "started_at": event.occurred_at,
+                    "last_at": event.occurred_at,
+                    "touched": True,
+                }
+                task_status[event.task_id] = TaskStatus.in_progress
+                continue
+
+            if session["event_type"] in _CLOSED_EVENTS:
+                errors.append({"index": i, "error": "Session is already closed"})
+                continue
+            if _out_of_order(session["last_at"], event.occurred_at):
+                errors.append({"index": i, "error": "Event is earlier than the previous event of its session"})
+                continue
+            session["event_type"] = event.event_type
+            session["last_at"] = event.occurred_at
+            session["touched"] = True
+            if event.event_type in _CLOSED_EVENTS:
+                session["closed"] = True
+            if event.event_type == EventType.COMPLETE:
+                task_status[session["task_id"]] = TaskStatus.completed
+        if errors:
+            raise BulkEventError(errors)
+
+        # ----- Write -----
+        now = datetime.now()
+        new_rows = []
+        results = []
+        for record_id, session in sessions.items():
+            if not session["touched"]:
+                continue
+            duration = None
+            if session["event_type"] in _CLOSED_EVENTS:
+                duration = _seconds_between(session["started_at"], session["last_at"])
+
+            record = session["record"]
+            if record is None:
+                start = session["start"]
+                row = {
+                    "id": record_id,
+                    "task_id": start.task_id,
+                    "mode": start.mode,
+                    "place": start.place,
+                    "tool": start.tool,
+                    "event_type": session["event_type"],
+                    "duration_seconds": duration,
+                    "occurred_at": start.occurred_at,
+                    "created_at": now,
+                    "updated_at": session["last_at"],
+                }
+                new_rows.append(row)
+                results.append(RecordResponse.model_validate(row))
+            else:
+                record.event_type = session["event_type"]
+                record.updated_at = session["last_at"]
+                if duration is not None:
+                    record.duration_seconds = duration
+                row = {"mode": record.mode, "place": record.place, "tool": record.tool}
+                results.append(RecordResponse.model_validate(record))
+
+            task = tasks.get(session["task_id"])
+            category = task.category if task else None
+            owner = task.user_id if task else None
+            mode, place, tool = row["mode"], row["place"], row["tool"]
+            if record is None:
+                ProfileService.on_session_started(
+                    db, mode=mode, place=place, tool=tool, category=category, user_id=owner
+                )
+            if session.get("closed"):
+                completed = session["event_type"] == EventType.COMPLETE
+                ProfileService.on_session_closed(
+                    db,
+                    mode=mode,
+                    place=place,
+                    tool=tool,
+                    category=category,
+                    completed=completed,
+                    duration_seconds=duration,
+                    user_id=owner,
+                )
+                ActivityService.on_session_closed(
+                    db,
+                    occurred_at=session["started_at"],
+                    mode=mode,
+                    place=place,
+                    tool=tool,
+                    category=category,
+                    completed=completed,
+                    duration_seconds=duration,
+                )
+                if task:
+                    DurationStatsService.on_session_closed(
+                        db,
+                        task_id=task.id,
+                        category=task.category,
+                        estimated_minutes=task.estimated_minutes,
+                        tags_key=task_tag_key(task),
+                        completed=completed,
+                        duration_seconds=duration,
+                    )
+
+        if new_rows:
+            db.execute(insert(Record), new_rows)
+        for task_id, status in task_status.items():
+            if task_id in tasks:
+                tasks[task_id].status = status
+
+        # one notification per (kind, owner) however big the batch
+        changed: Dict[Tuple[str, Any], List[uuid.UUID]] = {}
+        for r in results:
+            task = tasks.get(r.task_id)
+            changed.setdefault(("record", task.user_id if task else None), []).append(r.id)
+        for task in tasks.values():
+            changed.setdefault(("task", task.user_id), []).append(task.id)
+        for (kind, user_id), ids in changed.items():
+            events.notify(db, kind, ids, user_id=user_id)
+        db.commit()
+
+        for task_id, status in task_status.items():
+            feature_index.on_task_status_changed(task_id, status)
+        return results, len(new_rows)
         
     
\ No newline at end of file
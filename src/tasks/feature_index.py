@@ -0,0 +1,485 @@
+"""
+In-memory feature index of open tasks, used as the candidate source for
+every recommender strategy.
+
+Each task occupies one slot, and its features live in parallel arrays
+(minutes, due-day offsets, one tag bitset per system tag group), so a
+recommendation never has to re-run the tasks/task_tags/tags/tag_groups
+join. The index is built once per process and then kept up to date by
+the hooks called from tasks.service after each commit.
+
+A rebuild loads a fresh TaskFeatureIndex off to the side and then swaps it
+in, so readers keep using the current copy while the rows stream in. Hook
+calls made during a rebuild are replayed on the fresh copy before the swap.
+
+The hooks only see this process's writes. Before serving, get_index()
+compares the newest tasks.updated_at / task_deletions.deleted_at with the
+point the index is synced to, and applies the tasks other workers changed
+or deleted since (the same change log GET /api/tasks/changes reads).
+"""
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from database import on_replica, read_session
+from models.task import Tag, Task, TaskStatus
+
+# Only open tasks are candidates for recommendation
+INDEXED_STATUSES = (TaskStatus.pending, TaskStatus.in_progress)
+
+# System tag groups stored as bitsets (see tasks.service.DEFAULT_SYSTEM_GROUPS)
+BITSET_GROUPS = ("Tools", "Mode", "Location", "Interruptibility")
+_MAX_BITS = 64  # array("Q") holds 64 tags per group, extra tags spill into a dict
+
+_NO_MINUTES = -1
+_NO_DUE = -(2 ** 31)
+_EPOCH = date(1970, 1, 1).toordinal()
+
+# Every worker process keeps its own copy, kept in step with the others'
+# writes through the change log; it is still rebuilt after this many seconds.
+MAX_AGE_SECONDS = float(os.getenv("TASK_INDEX_MAX_AGE_SECONDS", "300"))
+# Writes can commit a moment after they are stamped, so each catch-up reaches
+# back this far (the same setting as GET /api/tasks/changes)
+SYNC_OVERLAP_SECONDS = float(os.getenv("TASK_SYNC_OVERLAP_SECONDS", "5"))
+
+
+def _enum_value(v):
+    return v.value if hasattr(v, "value") else v
+
+
+class TaskFeatureIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        # database time the index has caught up to (see _catch_up)
+        self.synced_to = None
+        self._clear()
+
+    def _clear(self):
+        self._slot: Dict[str, int] = {}
+        # owner -> task ids, so one user's candidates don't need a full scan
+        self._by_user: Dict[Optional[str], Set[str]] = defaultdict(set)
+
+        # object columns
+        self.ids: List[str] = []
+        self.titles: List[str] = []
+        self.descriptions: List[Optional[str]] = []
+        self.categories: List[Optional[str]] = []
+        self.priorities: List[Optional[str]] = []
+        self.parent_ids: List[Optional[str]] = []
+        self.user_ids: List[Optional[str]] = []
+        self.extra_tags: List[Dict[str, List[str]]] = []
+
+        # array-backed columns
+        self.is_subtask = array("b")
+        self.status = array("b")  # position in INDEXED_STATUSES
+        self.minutes = array("i")  # _NO_MINUTES when unknown
+        self.due_days = array("i")  # days since 1970-01-01, _NO_DUE when unknown
+        self.tag_bits: Dict[str, array] = {g: array("Q") for g in BITSET_GROUPS}
+
+        # bit position <-> tag name, per group
+        self._bit_of: Dict[str, Dict[str, int]] = {g: {} for g in BITSET_GROUPS}
+        self._bit_names: Dict[str, List[str]] = {g: [] for g in BITSET_GROUPS}
+
+    # ----- Tag bitsets -----
+    def _encode_tags(self, tags: Dict[str, List[str]]):
+        bits = {g: 0 for g in BITSET_GROUPS}
+        extra: Dict[str, List[str]] = {}
+        for group, names in tags.items():
+            for name in names:
+                if group in self._bit_of:
+                    bit = self._bit_of[group].get(name)
+                    if bit is None and len(self._bit_names[group]) < _MAX_BITS:
+                        bit = len(self._bit_names[group])
+                        self._bit_of[group][name] = bit
+                        self._bit_names[group].append(name)
+                    if bit is not None:
+                        bits[group] |= 1 << bit
+                        continue
+                extra.setdefault(group, []).append(name)
+        return bits, extra
+
+    def _decode_tags(self, slot: int) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {}
+        for group in BITSET_GROUPS:
+            value = self.tag_bits[group][slot]
+            if not value:
+                continue
+            names = self._bit_names[group]
+            out[group] = [names[i] for i in range(len(names)) if value >> i & 1]
+        for group, names in self.extra_tags[slot].items():
+            out.setdefault(group, []).extend(names)
+        return out
+
+    # ----- Slot maintenance -----
+    def upsert(self, row: Dict[str, Any]):
+        """Insert or overwrite one task. `row` uses the loader column names."""
+        status = TaskStatus(_enum_value(row["status"]))
+        if status not in INDEXED_STATUSES:
+            self.remove(row["id"])
+            return
+
+        tid = str(row["id"])
+        due = row.get("due_date")
+        minutes = row.get("estimated_minutes")
+
+        with self._lock:
+            bits, extra = self._encode_tags(row.get("tags") or {})
+            values = {
+                "titles": row["title"],
+                "descriptions": row.get("description"),
+                "categories": row.get("category"),
+                "priorities": _enum_value(row.get("priority")),
+                "parent_ids": str(row["parent_id"]) if row.get("parent_id") else None,
+                "user_ids": str(row["user_id"]) if row.get("user_id") else None,
+                "extra_tags": extra,
+                "is_subtask": 1 if row.get("is_subtask") else 0,
+                "status": INDEXED_STATUSES.index(status),
+                "minutes": minutes if minutes is not None else _NO_MINUTES,
+                "due_days": due.toordinal() - _EPOCH if due else _NO_DUE,
+            }
+
+            slot = self._slot.get(tid)
+            if slot is not None and self.user_ids[slot] != values["user_ids"]:
+                self._by_user[self.user_ids[slot]].discard(tid)
+            self._by_user[values["user_ids"]].add(tid)
+            if slot is None:
+                self._slot[tid] = len(self.ids)
+                self.ids.append(tid)
+                for name, value in values.items():
+                    getattr(self, name).append(value)
+                for group in BITSET_GROUPS:
+                    self.tag_bits[group].append(bits[group])
+            else:
+                for name, value in values.items():
+                    getattr(self, name)[slot] = value
+                for group in BITSET_GROUPS:
+                    self.tag_bits[group][slot] = bits[group]
+
+    def remove(self, task_id):
+        """Drop a task by moving the last slot into its place."""
+        tid = str(task_id)
+        with self._lock:
+            slot = self._slot.pop(tid, None)
+            if slot is None:
+                return
+            self._by_user[self.user_ids[slot]].discard(tid)
+            last = len(self.ids) - 1
+            columns = [
+                self.ids, self.titles, self.descriptions, self.categories,
+                self.priorities, self.parent_ids, self.user_ids, self.extra_tags,
+                self.is_subtask, self.status, self.minutes, self.due_days,
+                *self.tag_bits.values(),
+            ]
+            if slot != last:
+                for col in columns:
+                    col[slot] = col[last]
+                self._slot[self.ids[slot]] = slot
+            for col in columns:
+                col.pop()
+
+    def set_status(self, task_id, status: TaskStatus):
+        tid = str(task_id)
+        if status not in INDEXED_STATUSES:
+            self.remove(tid)
+            return
+        with self._lock:
+            slot = self._slot.get(tid)
+            if slot is not None:
+                self.status[slot] = INDEXED_STATUSES.index(status)
+
+    # ----- Build -----
+    def build(self, db: Session):
+        """Load every open task. Readers are held up meanwhile: build a fresh
+        index and publish it instead (see rebuild())."""
+        with self._lock:
+            self._clear()
+            synced_to = _db_now(db) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+            for row in _load_open_task_rows(db):
+                self.upsert(row)
+            self.synced_to = synced_to
+            self._built_at = time.monotonic()
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    def is_stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return MAX_AGE_SECONDS > 0 and time.monotonic() - self._built_at > MAX_AGE_SECONDS
+
+    # ----- Read -----
+    def rows(
+        self,
+        statuses: Iterable[TaskStatus] = INDEXED_STATUSES,
+        *,
+        is_subtask: Optional[bool] = None,
+        user_id=None,
+    ) -> List[Dict[str, Any]]:
+        """Open tasks as loader-style rows; `user_id` limits them to that user's tasks."""
+        wanted = {INDEXED_STATUSES.index(s) for s in statuses}
+        out = []
+        with self._lock:
+            if user_id is None:
+                slots = range(len(self.ids))
+            else:
+                slots = sorted(self._slot[tid] for tid in self._by_user.get(str(user_id), ()))
+            for slot in slots:
+                if self.status[slot] not in wanted:
+                    continue
+                if is_subtask is not None and bool(self.is_subtask[slot]) != is_subtask:
+                    continue
+                minutes = self.minutes[slot]
+                due = self.due_days[slot]
+                out.append({
+                    "id": self.ids[slot],
+                    "title": self.titles[slot],
+                    "description": self.descriptions[slot],
+                    "category": self.categories[slot],
+                    "priority": self.priorities[slot],
+                    "parent_id": self.parent_ids[slot],
+                    "user_id": self.user_ids[slot],
+                    "is_subtask": bool(self.is_subtask[slot]),
+                    "status": INDEXED_STATUSES[self.status[slot]].value,
+                    "estimated_minutes": None if minutes == _NO_MINUTES else minutes,
+                    "due_date": None if due == _NO_DUE else str(date.fromordinal(due + _EPOCH)),
+                    "tags": self._decode_tags(slot),
+                })
+        return out
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+# One row per task; tags come back pre-grouped as {"group": ["tag", ...]}
+_TASK_ROWS = """
+SELECT
+  t.id                AS id,
+  t.title             AS title,
+  t.description       AS description,
+  t.category          AS category,
+  t.estimated_minutes AS estimated_minutes,
+  t.priority          AS priority,
+  t.parent_id         AS parent_id,
+  t.user_id           AS user_id,
+  t.is_subtask        AS is_subtask,
+  t.status            AS status,
+  t.due_date          AS due_date,
+  COALESCE(agg.tags, '{}'::json) AS tags
+FROM tasks t
+LEFT JOIN LATERAL (
+  SELECT json_object_agg(g.group_name, g.tag_names) AS tags
+  FROM (
+    SELECT tg.name AS group_name, array_agg(tag.name ORDER BY tag.created_at) AS tag_names
+    FROM task_tags tt
+    JOIN tags tag ON tag.id = tt.tag_id
+    JOIN tag_groups tg ON tg.id = tag.tag_group_id
+    WHERE tt.task_id = t.id
+    GROUP BY tg.name
+  ) g
+) agg ON true
+"""
+
+_OPEN_TASKS_SQL = text(_TASK_ROWS + """WHERE t.status IN ('pending', 'in_progress')
+ORDER BY t.created_at, t.id
+""")
+
+# Tasks written since :since, whatever their status (upsert() drops closed ones)
+_CHANGED_TASKS_SQL = text(_TASK_ROWS + "WHERE t.updated_at > :since\n")
+
+_DELETED_TASKS_SQL = text("SELECT task_id FROM task_deletions WHERE deleted_at > :since")
+
+# Both maxima are read from the end of their indexes
+_LAST_CHANGE_SQL = text("""
+SELECT clock_timestamp() AS now,
+       GREATEST((SELECT max(updated_at) FROM tasks),
+                (SELECT max(deleted_at) FROM task_deletions)) AS last_change
+""")
+
+YIELD_PER = int(os.getenv("TASK_INDEX_YIELD_PER", "1000"))
+
+
+def _db_now(db: Session):
+    return db.execute(text("SELECT clock_timestamp()")).scalar()
+
+
+def _load_open_task_rows(db: Session) -> Iterator[Dict[str, Any]]:
+    """Stream open tasks through a server-side cursor, one mapping per task."""
+    result = db.execute(_OPEN_TASKS_SQL.execution_options(yield_per=YIELD_PER))
+    for r in result.mappings():
+        yield r
+
+
+def _row_from_task(task: Task) -> Dict[str, Any]:
+    tags: Dict[str, List[str]] = defaultdict(list)
+    for tag in task.tags:
+        tags[tag.group_name].append(tag.name)
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "category": task.category,
+        "estimated_minutes": task.estimated_minutes,
+        "priority": task.priority,
+        "parent_id": task.parent_id,
+        "user_id": task.user_id,
+        "is_subtask": task.is_subtask,
+        "status": task.status,
+        "due_date": task.due_date,
+        "tags": tags,
+    }
+
+
+# ----- Process-wide index -----
+_index = TaskFeatureIndex()
+
+# One rebuild at a time; the others keep serving the current copy
+_build_lock = threading.Lock()
+# One catch-up at a time, likewise
+_sync_lock = threading.Lock()
+# Guards swapping _index, and _pending: the hook changes made while a
+# rebuild runs (None when none is running), replayed on the fresh copy
+_swap_lock = threading.Lock()
+_pending: Optional[List[Callable[[TaskFeatureIndex], None]]] = None
+
+
+@contextmanager
+def _primary(db: Session):
+    """`db`, or a primary session in its place when `db` is on a replica.
+
+    The index is shared by every request of the worker and moves forward
+    from the point it was synced to: loaded from a lagging replica it would
+    miss, for good, the writes the replica hadn't applied yet.
+    """
+    if not on_replica(db):
+        yield db
+        return
+    with read_session(primary=True) as primary:
+        yield primary
+
+
+def get_index(db: Session) -> TaskFeatureIndex:
+    """Return the shared index, (re)building or catching it up when needed.
+
+    Always from the primary, even when `db` reads from a replica.
+    """
+    index = _index
+    if not index.is_stale():
+        with _primary(db) as primary:
+            _catch_up(primary, index)
+        return index
+    # while another caller rebuilds, a stale copy is better than waiting;
+    # with no copy yet there is nothing to serve
+    if not _build_lock.acquire(blocking=not index.is_built):
+        return index
+    try:
+        if _index.is_stale():  # unless it was rebuilt while we waited
+            with _primary(db) as primary:
+                _rebuild(primary)
+        return _index
+    finally:
+        _build_lock.release()
+
+
+def rebuild(db: Session) -> TaskFeatureIndex:
+    """Rebuild the shared index now, e.g. after loading tasks with SQL."""
+    with _build_lock, _primary(db) as primary:
+        _rebuild(primary)
+    return _index
+
+
+def _rebuild(db: Session):
+    """Build a fresh index and swap it in. Call with _build_lock held."""
+    global _index, _pending
+    with _swap_lock:
+        _pending = []
+    fresh = TaskFeatureIndex()
+    try:
+        fresh.build(db)
+    except BaseException:
+        with _swap_lock:
+            _pending = None
+        raise
+    with _swap_lock:
+        # writes committed after the build's snapshot; replaying ones it
+        # already saw is harmless, as every change is idempotent
+        for change in _pending:
+            change(fresh)
+        _index, _pending = fresh, None
+
+
+def _catch_up(db: Session, index: TaskFeatureIndex):
+    """Apply the tasks written or deleted (by any worker) since the index was synced."""
+    if not _sync_lock.acquire(blocking=False):
+        return  # another request is catching up
+    try:
+        since = index.synced_to
+        now, last_change = db.execute(_LAST_CHANGE_SQL).one()
+        if since is None or last_change is None or last_change <= since:
+            return
+        rows = db.execute(_CHANGED_TASKS_SQL, {"since": since}).mappings().all()
+        deleted = db.execute(_DELETED_TASKS_SQL, {"since": since}).scalars().all()
+
+        def apply(target: TaskFeatureIndex):
+            for row in rows:
+                target.upsert(row)
+            for task_id in deleted:
+                target.remove(task_id)
+
+        _apply(apply)
+        index.synced_to = max(since, now - timedelta(seconds=SYNC_OVERLAP_SECONDS))
+    finally:
+        _sync_lock.release()
+
+
+def _apply(change: Callable[[TaskFeatureIndex], None]):
+    """Apply a hook's change to the shared index, and to the one being built."""
+    with _swap_lock:
+        index = _index
+        if _pending is not None:
+            _pending.append(change)
+        elif not index.is_built:
+            return  # the first get_index() call will load it
+    change(index)
+
+
+# ----- Hooks (called by tasks.service after commit) -----
+def on_task_saved(task: Task):
+    row = _row_from_task(task)
+    _apply(lambda index: index.upsert(row))
+
+
+def on_task_status_changed(task_id, status: TaskStatus):
+    _apply(lambda index: index.set_status(task_id, status))
+
+
+def on_task_removed(task_id):
+    _apply(lambda index: index.remove(task_id))
+
+
+def on_tags_renamed(db: Session, task_ids):
+    """A tag or tag group was renamed: re-read the tags of the tasks carrying it."""
+    if not task_ids or (not _index.is_built and _pending is None):
+        return
+    tasks = (
+        db.query(Task)
+        .options(selectinload(Task.tags).joinedload(Tag.group))
+        .filter(Task.id.in_(task_ids), Task.status.in_(INDEXED_STATUSES))
+        .all()
+    )
+    rows = [_row_from_task(task) for task in tasks]
+
+    def upsert_all(index: TaskFeatureIndex):
+        for row in rows:
+            index.upsert(row)
+
+    _apply(upsert_all)
@@ -1,8 +1,28 @@
 import os
 import json
-import httpx
+from utils import inflight, instrumentation
+
+# overridable so benchmarks can point the app at a fake provider
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Shared client (and its connection pool), created on the first call
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        import httpx
+        _client = httpx.AsyncClient(timeout=60)
+    return _client
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 
 async def openrouter_chat(messages: list[dict], *, model: str | None = None) -> str:
     api_key = os.getenv("OPENROUTER_API_KEY")
@@ -25,13 +45,15 @@ async def openrouter_chat(messages: list[dict], *, model: str | None = None) ->
         "temperature": 0.2,
     }
 
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.post(OPENROUTER_URL, headers=headers, json=payload)
+    with inflight.llm_call():
+        r = await _get_client().post(OPENROUTER_URL, headers=headers, json=payload)
 
         if r.status_code >= 400:
             print("OpenRouter error:", r.status_code, r.text)
             
         r.raise_for_status()
         data = r.json()
-    
+
+    usage = data.get("usage") or {}
+    instrumentation.record_llm_tokens(usage.get("prompt_tokens"), usage.get("completion_tokens"))
     return data["choices"][0]["message"]["content"]
\ No newline at end of file
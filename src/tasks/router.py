@@ -2,11 +2,13 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from database import get_db
+from database import get_db, get_read_db
 from tasks.schemas import *
 
 from models.task import TaskStatus, TaskPriority
 from tasks import service
+from utils import admission
+from users.current import current_user_id
 
 from typing import Annotated, Literal
 
@@ -15,8 +17,8 @@ router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 # ----- Task CRUD -----
 
 @router.post("/", response_model=TaskResponse)
-def create_task(payload: TaskCreate, db: Session = Depends(get_db)):
-    return service.create_task(db, payload)
+def create_task(payload: TaskCreate, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    return service.create_task(db, payload, user_id=user_id)
 
 
 # @router.get("/{task_id}", response_model=TaskResponse)
@@ -43,7 +45,8 @@ def list_tasks(
     category: str | None = None,
     tag_ids: Annotated[list[UUID] | None, Query()] = None,
     match: Literal["any", "all"] = "any",
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
+    user_id: UUID | None = Depends(current_user_id),
 ):
     """
     Use case:
@@ -62,102 +65,131 @@ def list_tasks(
         category=category,
         tag_ids=tag_ids,
         match=match,
+        user_id=user_id,
     )
 
+# ----- Delta Sync -----
+@router.get("/changes", response_model=TaskChangesResponse)
+def list_task_changes(
+    since: str | None = None,
+    db: Session = Depends(get_db),
+    user_id: UUID | None = Depends(current_user_id),
+):
+    """
+    Tasks and subtasks created or updated, and ids of tasks deleted, since
+    `since` (the cursor returned by the previous call). Without `since`
+    every task is returned, to start syncing from.
+    """
+    try:
+        return service.list_task_changes(db, since, user_id=user_id)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+
 @router.get("/{task_id}/subtasks", response_model=list[TaskResponse])
-def list_subtasks(task_id: UUID, db: Session = Depends(get_db)):
-    subtasks = service.list_subtasks_for_task(db, task_id)
+def list_subtasks(task_id: UUID, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    subtasks = service.list_subtasks_for_task(db, task_id, user_id=user_id)
     if subtasks is None:
         raise HTTPException(404, "Task not found")
     return subtasks
 
 @router.get("/categories", response_model=list[str])
-def list_task_categories(db: Session = Depends(get_db)):
-    return service.list_task_categories(db)
+def list_task_categories(db: Session = Depends(get_read_db), user_id: UUID | None = Depends(current_user_id)):
+    return service.list_task_categories(db, user_id=user_id)
 
 # ----- Subtasks (Create/Update) -----
 @router.post("/subtasks", response_model=TaskResponse)
-def create_subtask(payload: SubtaskCreate, db: Session = Depends(get_db)):
-    subtask = service.create_subtask(db, payload)
+def create_subtask(payload: SubtaskCreate, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    subtask = service.create_subtask(db, payload, user_id=user_id)
     if not subtask:
         raise HTTPException(404, "Parent task not found")
     return subtask
 
 
 @router.patch("/subtasks/{subtask_id}", response_model=TaskResponse)
-def update_subtask(subtask_id: UUID, payload: SubtaskUpdate, db: Session = Depends(get_db)):
-    subtask = service.update_subtask(db, subtask_id, payload)
+def update_subtask(
+    subtask_id: UUID, payload: SubtaskUpdate, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)
+):
+    subtask = service.update_subtask(db, subtask_id, payload, user_id=user_id)
     if not subtask:
         raise HTTPException(404, "Subtask not found")
     return subtask
 
 # ----- Task <-> Tags -----
 @router.put("/{task_id}/tags", response_model=TaskResponse)
-def update_task_tags(task_id: UUID, payload: UpdateTaskTagsRequest, db: Session = Depends(get_db)):
-    task = service.update_task_tags(db, task_id, payload)
+def update_task_tags(
+    task_id: UUID, payload: UpdateTaskTagsRequest, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)
+):
+    task = service.update_task_tags(db, task_id, payload, user_id=user_id)
     if not task:
         raise HTTPException(404, "Task not found")
     return task
 
 # ----- Tag Groups -----
 @router.post("/tag-groups", response_model=TagGroupResponse)
-def create_tag_group(payload: TagGroupCreate, db: Session = Depends(get_db)):
-    return service.create_tag_group(db, payload)
+def create_tag_group(payload: TagGroupCreate, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    return service.create_tag_group(db, payload, user_id=user_id)
 
 
 @router.get("/tag-groups", response_model=list[TagGroupResponse])
-def list_tag_groups(db: Session = Depends(get_db)):
-    return service.list_tag_groups(db)
+def list_tag_groups(db: Session = Depends(get_read_db), user_id: UUID | None = Depends(current_user_id)):
+    return service.list_tag_groups(db, user_id=user_id)
 
 # ----- Tags -----
 @router.post("/tags", response_model=TagResponse)
-def create_tag(payload: TagCreate, db: Session = Depends(get_db)):
-    return service.create_tag(db, payload)
+def create_tag(payload: TagCreate, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    tag = service.create_tag(db, payload, user_id=user_id)
+    if not tag:
+        raise HTTPException(404, "Tag group not found")
+    return tag
 
 
 @router.get("/tag-groups/{group_id}/tags", response_model=list[TagResponse])
-def list_tags(group_id: UUID, db: Session = Depends(get_db)):
-    return service.list_tags_by_group(db, group_id)
+def list_tags(group_id: UUID, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    return service.list_tags_by_group(db, group_id, user_id=user_id)
 
 # ----- AI Generate Subtasks -----
-@router.post("/{task_id}/generate-subtasks", response_model=TaskResponse)
-async def generate_subtasks(task_id: UUID, db: Session = Depends(get_db)):
-    result = await service.generate_subtasks(db, task_id)
+@router.post("/{task_id}/generate-subtasks", response_model=TaskResponse, dependencies=[Depends(admission.llm)])
+async def generate_subtasks(task_id: UUID, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    result = await service.generate_subtasks(db, task_id, user_id=user_id)
     if result is None:
         raise HTTPException(404, "Task not found")
     return result
 
 # ----- AI Regenerate Subtasks -----
-@router.post("/{task_id}/regenerate-questions", response_model=QuestionsResponse)
-async def regenerate_questions(task_id: UUID, payload: QuestionsRequest, db: Session = Depends(get_db)):
+@router.post("/{task_id}/regenerate-questions", response_model=QuestionsResponse, dependencies=[Depends(admission.llm)])
+async def regenerate_questions(
+    task_id: UUID, payload: QuestionsRequest, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)
+):
     """
     Generate 3 questions to help improve the next subtask generation.
     Call this when user is unsatisfied with the generated subtasks.
     """
-    result = await service.regenerate_questions(db, task_id, payload.subtasks)
+    result = await service.regenerate_questions(db, task_id, payload.subtasks, user_id=user_id)
     if result is None:
         raise HTTPException(404, "Question not found")
     return result
 
-@router.post("/{task_id}/regenerate-subtasks", response_model=TaskResponse)
-async def regenerate_subtasks(task_id: UUID, payload: RegenerateSubtasksRequest, db: Session = Depends(get_db)):
-    result = await service.regenerate_subtasks(db, task_id, payload)
+@router.post("/{task_id}/regenerate-subtasks", response_model=TaskResponse, dependencies=[Depends(admission.llm)])
+async def regenerate_subtasks(
+    task_id: UUID, payload: RegenerateSubtasksRequest, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)
+):
+    result = await service.regenerate_subtasks(db, task_id, payload, user_id=user_id)
     if result is None:
         raise HTTPException(404, "Task not found")
     return result
 
 # ----- Single Task CRUD -----
 @router.get("/{task_id}", response_model=TaskResponse)
-def get_task(task_id: UUID, db: Session = Depends(get_db)):
-    task = service.get_task(db, task_id)
+def get_task(task_id: UUID, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    task = service.get_task(db, task_id, user_id=user_id)
     if not task:
         raise HTTPException(404, "Task not found")
     return task
 
 
 @router.patch("/{task_id}", response_model=TaskResponse)
-def update_task(task_id: UUID, payload: TaskUpdate, db: Session = Depends(get_db)):
-    task = service.update_task(db, task_id, payload)
+def update_task(task_id: UUID, payload: TaskUpdate, db: Session = Depends(get_db), user_id: UUID | None = Depends(current_user_id)):
+    task = service.update_task(db, task_id, payload, user_id=user_id)
     if not task:
         raise HTTPException(404, "Task not found")
     return task
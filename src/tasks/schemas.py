@@ -140,6 +140,16 @@ class TaskResponse(TaskBase):
 class SubtaskResponse(TaskResponse):
     pass
 
+# ----- delta sync -----
+class TaskChangesResponse(BaseModel):
+    changed: List[TaskResponse]
+    deleted: List[UUID]
+    # pass as ?since= on the next call
+    cursor: str
+    # the cursor was older than the deletion log: `changed` is every task,
+    # replace the local copy with it
+    resync: bool = False
+
 # ----- update task tags -----
 class UpdateTaskTagsRequest(BaseModel):
     tag_ids: List[UUID]
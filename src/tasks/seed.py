@@ -0,0 +1,13 @@
+"""
+Seed the default system tag groups; safe to run repeatedly.
+Run by entrypoint.sh after migrations: cd src && python -m tasks.seed
+"""
+from database import SessionLocal
+from tasks.service import ensure_default_tag_groups
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        ensure_default_tag_groups(db)
+    finally:
+        db.close()
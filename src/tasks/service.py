@@ -1,22 +1,31 @@
 from uuid import UUID
+from datetime import datetime, timedelta
 from typing import List, Optional, Literal
+import base64
+import os
+import time
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func, distinct, select, update
 
 from models.task import (
     Task,
+    TaskDeletion,
     TagGroup,
     Tag,
+    TaskTag,
     TaskStatus,
 )
 from tasks.schemas import *
 
 from tasks.llm import openrouter_chat
 from tasks.prompts import load
+from tasks import feature_index
+from changes import events
 import json
 from fastapi import HTTPException
 from utils.llm_utils import parse_question_response
+from utils import tracing
 
 # ----- Calculus Task progress -----
 DONE_STATUSES = {TaskStatus.completed, TaskStatus.archived}
@@ -41,13 +50,43 @@ def _attach_progress(task: Task) -> Task:
 
 
 # ----- Task -----
-def _attach_tags(db: Session, task: Task, tag_ids: list[UUID]):
+# Everything TaskResponse serializes (tags with their group name, subtasks
+# and their tags), loaded with a fixed number of queries however many tasks
+_TASK_TREE = (
+    selectinload(Task.tags).joinedload(Tag.group),
+    selectinload(Task.subtasks).options(
+        selectinload(Task.tags).joinedload(Tag.group),
+        selectinload(Task.subtasks),
+    ),
+)
+
+
+def _scoped(query, model, user_id: Optional[UUID]):
+    """Restrict `query` to `user_id`'s rows of `model`; None leaves it unscoped."""
+    if user_id is None:
+        return query
+    return query.filter(model.user_id == user_id)
+
+
+def _shared_or_own(query, model, user_id: Optional[UUID]):
+    """Like _scoped, but also keeps rows without an owner (system tag groups / tags)."""
+    if user_id is None:
+        return query
+    return query.filter((model.user_id == user_id) | model.user_id.is_(None))
+
+
+def _load_task_tree(db: Session, task_id, user_id: Optional[UUID] = None) -> Optional[Task]:
+    query = db.query(Task).options(*_TASK_TREE).populate_existing().filter(Task.id == task_id)
+    return _scoped(query, Task, user_id).first()
+
+def _attach_tags(db: Session, task: Task, tag_ids: list[UUID], user_id: Optional[UUID] = None):
     if not tag_ids:
         return
-    tags = db.query(Tag).filter(Tag.id.in_(tag_ids)).all()
+    # another user's private tags are skipped like unknown ids
+    tags = _shared_or_own(db.query(Tag), Tag, user_id).filter(Tag.id.in_(tag_ids)).all()
     task.tags.extend(tags)
 
-def create_task(db: Session, payload: TaskCreate) -> Task:
+def create_task(db: Session, payload: TaskCreate, user_id: Optional[UUID] = None) -> Task:
     task = Task(
         title=payload.title,
         description=payload.description,
@@ -59,32 +98,34 @@ def create_task(db: Session, payload: TaskCreate) -> Task:
         actual_minutes=payload.actual_minutes,
         is_subtask=False,
         parent_id=None,
-        user_id=None,
+        user_id=user_id,
     )
     db.add(task)
     db.flush()  
-    _attach_tags(db, task, payload.tag_ids)
+    _attach_tags(db, task, payload.tag_ids, user_id)
+    events.notify(db, "task", [task.id], user_id=task.user_id)
 
     db.commit()
     db.refresh(task)
+    feature_index.on_task_saved(task)
     return _attach_progress(task)
 
 
-def get_task(db: Session, task_id: str) -> Optional[Task]:
-    task = db.query(Task).filter(Task.id == task_id).first()
+def get_task(db: Session, task_id: str, user_id: Optional[UUID] = None) -> Optional[Task]:
+    # 一次載入 subtasks/tags
+    task = _load_task_tree(db, task_id, user_id)
     if not task:
         return None
-    # 觸發載入 subtasks/tags
-    _ = task.subtasks
-    _ = task.tags
     return _attach_progress(task)
 
-def _replace_tags(db: Session, task: Task, tag_ids: list[UUID]):
+def _replace_tags(db: Session, task: Task, tag_ids: list[UUID], user_id: Optional[UUID] = None):
     task.tags.clear()
-    _attach_tags(db, task, tag_ids)
+    _attach_tags(db, task, tag_ids, user_id)
+    # tags live in task_tags; mark the task changed for delta sync
+    task.updated_at = func.clock_timestamp()
 
-def update_task(db: Session, task_id: str, payload: TaskUpdate) -> Optional[Task]:
-    task = db.query(Task).filter(Task.id == task_id).first()
+def update_task(db: Session, task_id: str, payload: TaskUpdate, user_id: Optional[UUID] = None) -> Optional[Task]:
+    task = _scoped(db.query(Task), Task, user_id).filter(Task.id == task_id).first()
     if not task:
         return None
 
@@ -92,7 +133,7 @@ def update_task(db: Session, task_id: str, payload: TaskUpdate) -> Optional[Task
 
     tag_ids = data.pop("tag_ids", None)
     if tag_ids is not None:
-        _replace_tags(db, task, tag_ids)
+        _replace_tags(db, task, tag_ids, user_id)
 
     for key, value in data.items():
         setattr(task, key, value)
@@ -106,13 +147,19 @@ def update_task(db: Session, task_id: str, payload: TaskUpdate) -> Optional[Task
             {Task.priority: task.priority},
             synchronize_session=False,
         )
+        events.notify(db, "task", [st.id for st in task.subtasks], user_id=task.user_id)
 
+    events.notify(db, "task", [task.id], user_id=task.user_id)
     db.commit()
     db.refresh(task)
+    feature_index.on_task_saved(task)
+    if (not task.is_subtask) and ("priority" in data):
+        for st in task.subtasks:
+            feature_index.on_task_saved(st)
     return _attach_progress(task)
 
 # ----- Task List / Subtask List -----
-def list_tasks(
+def _task_query(
     db: Session,
     *,
     is_subtask: Optional[bool] = None,
@@ -121,8 +168,10 @@ def list_tasks(
     category: Optional[str] = None,
     tag_ids: Optional[List[UUID]] = None,
     match: Literal["any", "all"] = "any",
-) -> List[Task]:
-    query = db.query(Task)
+    user_id: Optional[UUID] = None,
+):
+    """The ordered list_tasks query (also EXPLAINed by benchmarks/explain_tasks.py)."""
+    query = _scoped(db.query(Task).options(*_TASK_TREE), Task, user_id)
 
     if is_subtask is not None:
         if is_subtask:
@@ -169,7 +218,30 @@ def list_tasks(
                 .distinct()
             )
 
-    tasks = query.order_by(Task.due_date, Task.created_at).all()
+    return query.order_by(Task.due_date, Task.created_at)
+
+
+def list_tasks(
+    db: Session,
+    *,
+    is_subtask: Optional[bool] = None,
+    parent_id: Optional[UUID] = None,
+    status: Optional[TaskStatus] = None,
+    category: Optional[str] = None,
+    tag_ids: Optional[List[UUID]] = None,
+    match: Literal["any", "all"] = "any",
+    user_id: Optional[UUID] = None,
+) -> List[Task]:
+    tasks = _task_query(
+        db,
+        is_subtask=is_subtask,
+        parent_id=parent_id,
+        status=status,
+        category=category,
+        tag_ids=tag_ids,
+        match=match,
+        user_id=user_id,
+    ).all()
 
     for t in tasks:
         if not t.is_subtask:
@@ -177,16 +249,107 @@ def list_tasks(
     return tasks
 
 
-def list_subtasks_for_task(db: Session, task_id: UUID) -> Optional[List[Task]]:
-    parent = db.query(Task).filter(Task.id == task_id, Task.is_subtask.is_(False)).first()
+# ----- Delta Sync -----
+# A change can commit a moment after it was stamped (clock_timestamp() in the
+# write), so each cursor reaches back this far; clients apply changes as
+# upserts, so seeing one twice is harmless.
+SYNC_OVERLAP_SECONDS = float(os.getenv("TASK_SYNC_OVERLAP_SECONDS", "5"))
+# The deletion log is kept this long, so it is the oldest cursor accepted;
+# an older one gets every task back with resync=true. Each worker purges
+# older rows every TASK_DELETIONS_PURGE_INTERVAL_SECONDS.
+TASK_DELETIONS_RETENTION_SECONDS = float(os.getenv("TASK_DELETIONS_RETENTION_SECONDS", "2592000"))
+TASK_DELETIONS_PURGE_INTERVAL_SECONDS = float(os.getenv("TASK_DELETIONS_PURGE_INTERVAL_SECONDS", "3600"))
+_next_deletions_purge = 0.0
+
+
+def encode_sync_cursor(at: datetime) -> str:
+    return base64.urlsafe_b64encode(at.isoformat().encode()).decode()
+
+
+def decode_sync_cursor(cursor: str) -> datetime:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        return datetime.fromisoformat(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def list_task_changes(db: Session, since: Optional[str] = None, user_id: Optional[UUID] = None) -> dict:
+    """
+    Tasks (and subtasks) created or updated since the cursor, ids of tasks
+    deleted since then, and the cursor for the next call. Without a cursor
+    every task is returned. Parents of changed or deleted subtasks are
+    included, since their progress follows the subtasks.
+
+    A cursor older than TASK_DELETIONS_RETENTION_SECONDS may have missed
+    purged deletions: every task is returned with resync=True, and the
+    client replaces its copy instead of merging.
+    """
+    _purge_deletions_if_due(db)
+    since_at = decode_sync_cursor(since) if since is not None else None
+    now = db.query(func.clock_timestamp()).scalar()
+    resync = since_at is not None and since_at < now - timedelta(seconds=TASK_DELETIONS_RETENTION_SECONDS)
+    if resync:
+        since_at = None
+    query = _scoped(db.query(Task).options(*_TASK_TREE), Task, user_id)
+
+    if since_at is None:
+        changed, deleted = query.order_by(Task.updated_at).all(), []
+    else:
+        changed = query.filter(Task.updated_at > since_at).order_by(Task.updated_at).all()
+        deleted = _scoped(db.query(TaskDeletion.task_id, TaskDeletion.parent_id), TaskDeletion, user_id).filter(
+            TaskDeletion.deleted_at > since_at
+        ).all()
+        parent_ids = {t.parent_id for t in changed if t.parent_id} | {d.parent_id for d in deleted if d.parent_id}
+        missing = parent_ids - {t.id for t in changed}
+        if missing:
+            changed += query.filter(Task.id.in_(missing)).all()
+
+    for t in changed:
+        if not t.is_subtask:
+            _attach_progress(t)
+    return {
+        "changed": changed,
+        "deleted": [d.task_id for d in deleted],
+        "cursor": encode_sync_cursor(now - timedelta(seconds=SYNC_OVERLAP_SECONDS)),
+        "resync": resync,
+    }
+
+
+def _log_deletions(db: Session, tasks: List[Task]):
+    db.add_all(TaskDeletion(task_id=t.id, parent_id=t.parent_id, user_id=t.user_id) for t in tasks)
+
+
+def purge_task_deletions(db: Session) -> int:
+    """Delete deletion log rows past TASK_DELETIONS_RETENTION_SECONDS; returns how many."""
+    cutoff = func.clock_timestamp() - timedelta(seconds=TASK_DELETIONS_RETENTION_SECONDS)
+    purged = db.query(TaskDeletion).filter(TaskDeletion.deleted_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return purged
+
+
+def _purge_deletions_if_due(db: Session):
+    global _next_deletions_purge
+    if time.monotonic() >= _next_deletions_purge:
+        _next_deletions_purge = time.monotonic() + TASK_DELETIONS_PURGE_INTERVAL_SECONDS
+        purge_task_deletions(db)
+
+
+def list_subtasks_for_task(db: Session, task_id: UUID, user_id: Optional[UUID] = None) -> Optional[List[Task]]:
+    parent = (
+        _scoped(db.query(Task), Task, user_id)
+        .options(selectinload(Task.subtasks).options(*_TASK_TREE))
+        .filter(Task.id == task_id, Task.is_subtask.is_(False))
+        .first()
+    )
     if not parent:
         return None
     return list(parent.subtasks)
 
 
 # ----- Subtask -----
-def create_subtask(db: Session, payload: SubtaskCreate) -> Task:
-    parent = db.query(Task).filter(
+def create_subtask(db: Session, payload: SubtaskCreate, user_id: Optional[UUID] = None) -> Task:
+    parent = _scoped(db.query(Task), Task, user_id).filter(
         Task.id == payload.task_id,
         Task.is_subtask.is_(False),
     ).first()
@@ -208,9 +371,11 @@ def create_subtask(db: Session, payload: SubtaskCreate) -> Task:
     )
     db.add(subtask)
     db.flush()
-    _attach_tags(db, subtask, payload.tag_ids)
+    _attach_tags(db, subtask, payload.tag_ids, user_id)
+    events.notify(db, "task", [subtask.id, parent.id], user_id=parent.user_id)
     db.commit()
     db.refresh(subtask)
+    feature_index.on_task_saved(subtask)
     return subtask
 
 
@@ -222,8 +387,9 @@ def update_subtask(
     db: Session,
     subtask_id: str,
     payload: SubtaskUpdate,
+    user_id: Optional[UUID] = None,
 ) -> Optional[Task]:
-    subtask = db.query(Task).filter(
+    subtask = _scoped(db.query(Task), Task, user_id).filter(
         Task.id == subtask_id,
         Task.is_subtask.is_(True),
     ).first()
@@ -234,22 +400,45 @@ def update_subtask(
 
     tag_ids = data.pop("tag_ids", None)
     if tag_ids is not None:
-        _replace_tags(db, subtask, tag_ids)
+        _replace_tags(db, subtask, tag_ids, user_id)
         
     for key, value in data.items():
         setattr(subtask, key, value)
 
+    events.notify(db, "task", [subtask.id, subtask.parent_id], user_id=subtask.user_id)
     db.commit()
     db.refresh(subtask)
+    feature_index.on_task_saved(subtask)
     return subtask
 
 
 # ----- Tag Group & Tag -----
-def create_tag_group(db: Session, payload: TagGroupCreate) -> TagGroup:
+def _touch_tasks_with_tags(db: Session, tag_ids) -> list:
+    """
+    After a tag or tag group rename: bump updated_at of the tasks carrying
+    any of `tag_ids` (delta sync) and queue their change events. Returns
+    their ids, for feature_index.on_tags_renamed() after the commit.
+    """
+    rows = db.execute(
+        update(Task)
+        .where(Task.id.in_(select(TaskTag.task_id).where(TaskTag.tag_id.in_(tag_ids))))
+        .values(updated_at=func.clock_timestamp())
+        .returning(Task.id, Task.user_id),
+        execution_options={"synchronize_session": False},
+    ).all()
+    by_user: dict = {}
+    for task_id, owner in rows:
+        by_user.setdefault(owner, []).append(task_id)
+    for owner, ids in by_user.items():
+        events.notify(db, "task", ids, user_id=owner)
+    return [task_id for task_id, _ in rows]
+
+
+def create_tag_group(db: Session, payload: TagGroupCreate, user_id: Optional[UUID] = None) -> TagGroup:
     group = TagGroup(
         name=payload.name,
         type="custom",     # system we use seed build
-        user_id=None,
+        user_id=user_id,
         is_single_select=payload.is_single_select,
         allow_add_tag=payload.allow_add_tag,
     )
@@ -259,28 +448,40 @@ def create_tag_group(db: Session, payload: TagGroupCreate) -> TagGroup:
     return group
 
 
-def list_tag_groups(db: Session) -> List[TagGroup]:
-    return db.query(TagGroup).order_by(TagGroup.created_at.asc()).all()
+def list_tag_groups(db: Session, user_id: Optional[UUID] = None) -> List[TagGroup]:
+    return _shared_or_own(db.query(TagGroup), TagGroup, user_id).order_by(TagGroup.created_at.asc()).all()
 
-def update_tag_group(db: Session, group_id: UUID, payload: TagGroupUpdate) -> Optional[TagGroup]:
-    group = db.query(TagGroup).filter(TagGroup.id == group_id).first()
+def update_tag_group(
+    db: Session, group_id: UUID, payload: TagGroupUpdate, user_id: Optional[UUID] = None
+) -> Optional[TagGroup]:
+    # a user edits only their own groups, not the shared system ones
+    group = _scoped(db.query(TagGroup), TagGroup, user_id).filter(TagGroup.id == group_id).first()
     if not group:
         return None
 
     data = payload.dict(exclude_unset=True)
+    renamed = "name" in data and data["name"] != group.name
     for key, value in data.items():
         setattr(group, key, value)
 
+    touched = _touch_tasks_with_tags(db, select(Tag.id).where(Tag.tag_group_id == group.id)) if renamed else []
     db.commit()
     db.refresh(group)
+    feature_index.on_tags_renamed(db, touched)
     return group
 
 
-def create_tag(db: Session, payload: TagCreate) -> Tag:
+def create_tag(db: Session, payload: TagCreate, user_id: Optional[UUID] = None) -> Optional[Tag]:
+    # only into the user's own groups or the shared system ones
+    group = _shared_or_own(db.query(TagGroup), TagGroup, user_id).filter(TagGroup.id == payload.tag_group_id).first()
+    if not group:
+        return None
+
     tag = Tag(
         name=payload.name,
         tag_group_id=payload.tag_group_id,
         is_system=False,
+        user_id=user_id,
     )
     db.add(tag)
     db.commit()
@@ -288,57 +489,72 @@ def create_tag(db: Session, payload: TagCreate) -> Tag:
     return tag
 
 
-def update_tag(db: Session, tag_id: UUID, payload: TagUpdate) -> Optional[Tag]:
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
+def update_tag(db: Session, tag_id: UUID, payload: TagUpdate, user_id: Optional[UUID] = None) -> Optional[Tag]:
+    tag = _scoped(db.query(Tag), Tag, user_id).filter(Tag.id == tag_id).first()
     if not tag:
         return None
 
     data = payload.dict(exclude_unset=True)
+    renamed = "name" in data and data["name"] != tag.name
     for key, value in data.items():
         setattr(tag, key, value)
 
+    touched = _touch_tasks_with_tags(db, [tag.id]) if renamed else []
     db.commit()
     db.refresh(tag)
+    feature_index.on_tags_renamed(db, touched)
     return tag
 
 
-def list_tags_by_group(db: Session, group_id: UUID) -> List[Tag]:
+def list_tags_by_group(db: Session, group_id: UUID, user_id: Optional[UUID] = None) -> List[Tag]:
     return (
-        db.query(Tag)
+        _shared_or_own(db.query(Tag), Tag, user_id)
         .filter(Tag.tag_group_id == group_id)
         .order_by(Tag.created_at.asc())
         .all()
     )
 
 # ----- task <-> tags -----
-def update_task_tags(db: Session, task_id: UUID, payload: UpdateTaskTagsRequest) -> Optional[Task]:
-    task = db.query(Task).filter(Task.id == task_id).first()
+def update_task_tags(
+    db: Session, task_id: UUID, payload: UpdateTaskTagsRequest, user_id: Optional[UUID] = None
+) -> Optional[Task]:
+    task = _scoped(db.query(Task), Task, user_id).filter(Task.id == task_id).first()
     if not task:
         return None
 
     task.tags.clear()
 
     if payload.tag_ids:
-        tags = db.query(Tag).filter(Tag.id.in_(payload.tag_ids)).all()
+        tags = _shared_or_own(db.query(Tag), Tag, user_id).filter(Tag.id.in_(payload.tag_ids)).all()
         task.tags.extend(tags)
+    task.updated_at = func.clock_timestamp()
+    events.notify(db, "task", [task.id], user_id=task.user_id)
 
     db.commit()
     db.refresh(task)
+    feature_index.on_task_saved(task)
     return _attach_progress(task)
 
 # ----- Task Categories -----
-def list_task_categories(db: Session) -> List[str]:
-    categories = db.query(Task.category).distinct().order_by(Task.category.asc()).all()
+def list_task_categories(db: Session, user_id: Optional[UUID] = None) -> List[str]:
+    categories = _scoped(db.query(Task.category), Task, user_id).distinct().order_by(Task.category.asc()).all()
     return [c[0] for c in categories if c[0] is not None]
 
 # ----- AI Generate Subtasks -----
 
-def _build_allowed_tags_snapshot(db: Session) -> dict:
-    groups = db.query(TagGroup).order_by(TagGroup.created_at.asc()).all()
-    out: dict[str, list[str]] = {}
-    for group in groups:
-        tags = [tag.name for tag in group.tags]
-        out[group.name] = tags
+def _build_allowed_tags_snapshot(db: Session, user_id: Optional[UUID] = None) -> dict:
+    groups = _shared_or_own(db.query(TagGroup), TagGroup, user_id).order_by(TagGroup.created_at.asc()).all()
+    out: dict[str, list[str]] = {group.name: [] for group in groups}
+    # all the user's tags in one query, instead of one lazy load per group
+    tags = (
+        _shared_or_own(db.query(TagGroup.name, Tag.name).select_from(Tag), Tag, user_id)
+        .join(TagGroup, Tag.tag_group_id == TagGroup.id)
+        .filter(TagGroup.id.in_([group.id for group in groups]))
+        .order_by(Tag.created_at.asc())
+        .all()
+    )
+    for group_name, tag_name in tags:
+        out[group_name].append(tag_name)
     return out
 
 def _system_prompt_for_subtasks(*, allowed: dict) -> str:
@@ -373,9 +589,11 @@ def _normalize_subtask_proposal(raw: dict) -> dict:
         "tags": cleaned_tags,
     }
 
+@tracing.traced("ai.generate_subtasks")
 async def generate_subtasks(
     db: Session,
     task_id: UUID,
+    user_id: Optional[UUID] = None,
 )-> list[Task]:
     """
     Will do:
@@ -385,16 +603,18 @@ async def generate_subtasks(
     For now, just a safe stub to avoid /docs import failure.
     """
 
-    task = db.query(Task).filter(Task.id == task_id, Task.is_subtask.is_(False)).first()
-    if not task:
-        return None
+    with tracing.span("db.load"):
+        task = _scoped(db.query(Task), Task, user_id).filter(Task.id == task_id, Task.is_subtask.is_(False)).first()
+        if not task:
+            return None
     
-    # 1) LLM call + parse
-    allowed = _build_allowed_tags_snapshot(db)\
+        # 1) LLM call + parse
+        allowed = _build_allowed_tags_snapshot(db, user_id)
     
-    system = _system_prompt_for_subtasks(allowed=allowed)
+    with tracing.span("prompt.build"):
+        system = _system_prompt_for_subtasks(allowed=allowed)
 
-    user = f"""
+        user = f"""
         使用者的大任務標題：{task.title}
         使用者的大任務描述：{task.description or ""}
         使用者規劃的大任務預計時間：{task.estimated_minutes or "無"}
@@ -405,91 +625,101 @@ async def generate_subtasks(
     #         {"role": "user", "content": user},
     #     ])
 
-    content = await openrouter_chat([
-        {"role": "user", "content": system + "\n\n" + user},
-    ])
+    with tracing.span("llm.call"):
+        content = await openrouter_chat([
+            {"role": "user", "content": system + "\n\n" + user},
+        ])
 
     print("LLM raw content:", content)
     
     # Parse JSON
-    try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
-        cleaned = content.strip().removeprefix("```json").removesuffix("```").strip()
-        data = json.loads(cleaned)
+    with tracing.span("json.parse"):
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            cleaned = content.strip().removeprefix("```json").removesuffix("```").strip()
+            data = json.loads(cleaned)
     
-    raw_subtasks = data.get("subtasks", [])
-    if not isinstance(raw_subtasks, list):
-        raw_subtasks = []
-
-    subtasks_data = [
-        _normalize_subtask_proposal(s)
-        for s in raw_subtasks
-        if isinstance(s, dict)
-    ]
+        raw_subtasks = data.get("subtasks", [])
+        if not isinstance(raw_subtasks, list):
+            raw_subtasks = []
+
+        subtasks_data = [
+            _normalize_subtask_proposal(s)
+            for s in raw_subtasks
+            if isinstance(s, dict)
+        ]
 
     print("Parsed subtasks tags:", [s.get("tags") for s in subtasks_data])
 
     # 2) DB transaction: delete old, Create new Subtasks
-    all_tags = db.query(Tag).join(TagGroup).all()
-    tag_index: dict[tuple[str, str], Tag] = {
-        (t.group.name, t.name): t for t in all_tags
-    }
+    with tracing.span("db.write", subtasks=len(subtasks_data)):
+        all_tags = _shared_or_own(db.query(Tag), Tag, user_id).join(TagGroup).all()
+        tag_index: dict[tuple[str, str], Tag] = {
+            (t.group.name, t.name): t for t in all_tags
+        }
 
-    created: list[Task] = []
+        created: list[Task] = []
 
-    try:
-        # delete old subtasks
-        old_subtasks = db.query(Task).filter(
-            Task.parent_id == task.id,
-            Task.is_subtask.is_(True),
-        ).all()
+        try:
+            # delete old subtasks
+            old_subtasks = db.query(Task).filter(
+                Task.parent_id == task.id,
+                Task.is_subtask.is_(True),
+            ).all()
 
-        for st in old_subtasks:
-            st.tags.clear() # clear association first
-            db.delete(st)   
+            removed_ids = [st.id for st in old_subtasks]
+            _log_deletions(db, old_subtasks)
+            for st in old_subtasks:
+                st.tags.clear() # clear association first
+                db.delete(st)   
 
-        db.flush() 
+            db.flush() 
 
         
-        # create new subtasks
+            # create new subtasks
             
-        for s in subtasks_data:
-            subtask = Task(
-                title=s["title"],
-                description=s["description"],
-                due_date=task.due_date,
-                status=TaskStatus.pending,
-                priority=task.priority,
-                estimated_minutes=s["estimated_minutes"],
-                actual_minutes=None,
-                category=task.category,
-                is_subtask=True,
-                parent_id=task.id,
-                user_id=task.user_id,
-            )
+            for s in subtasks_data:
+                subtask = Task(
+                    title=s["title"],
+                    description=s["description"],
+                    due_date=task.due_date,
+                    status=TaskStatus.pending,
+                    priority=task.priority,
+                    estimated_minutes=s["estimated_minutes"],
+                    actual_minutes=None,
+                    category=task.category,
+                    is_subtask=True,
+                    parent_id=task.id,
+                    user_id=task.user_id,
+                )
             
-            # attach tags
-            req_tags = s["tags"]
-            for item in req_tags:
-                tag_obj = tag_index.get((item["group"], item["name"]))
-                if tag_obj:
-                    subtask.tags.append(tag_obj)
+                # attach tags
+                req_tags = s["tags"]
+                for item in req_tags:
+                    tag_obj = tag_index.get((item["group"], item["name"]))
+                    if tag_obj:
+                        subtask.tags.append(tag_obj)
             
-            db.add(subtask)
-            created.append(subtask)
-        
-        db.commit()
+                db.add(subtask)
+                created.append(subtask)
 
-    except Exception as e:
-        db.rollback()
-        print("Error during generate_subtasks DB transaction:", repr(e))
-        raise
+            db.flush()
+            events.notify(db, "task", removed_ids, op="delete", user_id=task.user_id)
+            events.notify(db, "task", [task.id, *(st.id for st in created)], user_id=task.user_id)
+            db.commit()
 
-    db.refresh(task)
-    _ = task.subtasks
+        except Exception as e:
+            db.rollback()
+            print("Error during generate_subtasks DB transaction:", repr(e))
+            raise
+
+    task = _load_task_tree(db, task_id)
+
+    for removed_id in removed_ids:
+        feature_index.on_task_removed(removed_id)
     for st in task.subtasks:
-        _ = st.tags
+        feature_index.on_task_saved(st)
 
     return _attach_progress(task)
 
@@ -498,13 +728,14 @@ async def regenerate_questions(
     db: Session,
     task_id: UUID,
     generated_subtasks: QuestionsRequest,
+    user_id: Optional[UUID] = None,
 ) -> Optional[QuestionsResponse]:
     """
     Generate 3 questions to help improve the next subtask generation
     based on the previous unsatisfactory result.
     """
     # Get task and verify it exists and is not a subtask
-    task = db.query(Task).filter(Task.id == task_id, Task.is_subtask.is_(False)).first()
+    task = _scoped(db.query(Task), Task, user_id).filter(Task.id == task_id, Task.is_subtask.is_(False)).first()
     if not task:
         return None
 
@@ -536,10 +767,12 @@ async def regenerate_questions(
 
     return parse_question_response(content)
 
+@tracing.traced("ai.regenerate_subtasks")
 async def regenerate_subtasks(
     db: Session,
     task_id: UUID,
     feedback: RegenerateSubtasksRequest,
+    user_id: Optional[UUID] = None,
 ) -> Optional[Task]:
     """
     Regenerate subtasks based on user feedback from questions.
@@ -548,19 +781,23 @@ async def regenerate_subtasks(
     improved subtasks that better match their requirements.
     """
     # Get task and verify it exists and is not a subtask
-    task = db.query(Task).filter(Task.id == task_id, Task.is_subtask.is_(False)).first()
+    task = _scoped(db.query(Task), Task, user_id).filter(Task.id == task_id, Task.is_subtask.is_(False)).first()
     if not task:
         return None
 
     # 1) Fetch existing subtasks from DB for LLM reference
-    existing_subtasks = db.query(Task).filter(
-        Task.parent_id == task.id,
-        Task.is_subtask.is_(True),
-    ).all()
+    with tracing.span("db.load"):
+        existing_subtasks = db.query(Task).filter(
+            Task.parent_id == task.id,
+            Task.is_subtask.is_(True),
+        ).all()
     
-    # Force load tags for each subtask
-    for st in existing_subtasks:
-        _ = st.tags
+        # Force load tags for each subtask
+        for st in existing_subtasks:
+            _ = st.tags
+
+        # 2) Build allowed tags snapshot
+        allowed = _build_allowed_tags_snapshot(db, user_id)
     
     # Format existing subtasks for LLM
     previous_subtasks_text = "上次生成的子任務列表：\n"
@@ -574,11 +811,9 @@ async def regenerate_subtasks(
     else:
         previous_subtasks_text += "（尚未生成任何子任務）\n"
 
-    # 2) Build allowed tags snapshot
-    allowed = _build_allowed_tags_snapshot(db)
-    
     # 3) Prepare the regeneration prompt with feedback
-    system_prompt = _system_prompt_for_subtasks(allowed=allowed)
+    with tracing.span("prompt.build"):
+        system_prompt = _system_prompt_for_subtasks(allowed=allowed)
     
     # 4) Build feedback context from Q&A pairs
     feedback_context = "\n使用者對上次生成結果的反饋：\n"
@@ -598,87 +833,99 @@ async def regenerate_subtasks(
     """.strip()
 
     # 5) Call LLM
-    content = await openrouter_chat([
-        {"role": "user", "content": system_prompt + "\n\n" + user_message},
-    ])
+    with tracing.span("llm.call"):
+        content = await openrouter_chat([
+            {"role": "user", "content": system_prompt + "\n\n" + user_message},
+        ])
 
     print("LLM raw content for regenerate_subtasks:", content)
     
     # 6) Parse JSON response
-    try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
-        cleaned = content.strip().removeprefix("```json").removesuffix("```").strip()
-        data = json.loads(cleaned)
+    with tracing.span("json.parse"):
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            cleaned = content.strip().removeprefix("```json").removesuffix("```").strip()
+            data = json.loads(cleaned)
     
-    raw_subtasks = data.get("subtasks", [])
-    if not isinstance(raw_subtasks, list):
-        raw_subtasks = []
-
-    subtasks_data = [
-        _normalize_subtask_proposal(s)
-        for s in raw_subtasks
-        if isinstance(s, dict)
-    ]
+        raw_subtasks = data.get("subtasks", [])
+        if not isinstance(raw_subtasks, list):
+            raw_subtasks = []
+
+        subtasks_data = [
+            _normalize_subtask_proposal(s)
+            for s in raw_subtasks
+            if isinstance(s, dict)
+        ]
 
     print("Parsed regenerated subtasks tags:", [s.get("tags") for s in subtasks_data])
 
     # 7) DB transaction: delete old subtasks and create new ones
-    all_tags = db.query(Tag).join(TagGroup).all()
-    tag_index: dict[tuple[str, str], Tag] = {
-        (t.group.name, t.name): t for t in all_tags
-    }
+    with tracing.span("db.write", subtasks=len(subtasks_data)):
+        all_tags = _shared_or_own(db.query(Tag), Tag, user_id).join(TagGroup).all()
+        tag_index: dict[tuple[str, str], Tag] = {
+            (t.group.name, t.name): t for t in all_tags
+        }
+
+        try:
+            # Delete old subtasks
+            old_subtasks = db.query(Task).filter(
+                Task.parent_id == task.id,
+                Task.is_subtask.is_(True),
+            ).all()
+
+            removed_ids = [st.id for st in old_subtasks]
+            _log_deletions(db, old_subtasks)
+            for st in old_subtasks:
+                st.tags.clear()
+                db.delete(st)
 
-    try:
-        # Delete old subtasks
-        old_subtasks = db.query(Task).filter(
-            Task.parent_id == task.id,
-            Task.is_subtask.is_(True),
-        ).all()
+            db.flush()
 
-        for st in old_subtasks:
-            st.tags.clear()
-            db.delete(st)
-
-        db.flush()
-
-        # Create new subtasks based on regenerated data
-        for s in subtasks_data:
-            subtask = Task(
-                title=s["title"],
-                description=s["description"],
-                due_date=task.due_date,
-                status=TaskStatus.pending,
-                priority=task.priority,
-                estimated_minutes=s["estimated_minutes"],
-                actual_minutes=None,
-                category=task.category,
-                is_subtask=True,
-                parent_id=task.id,
-                user_id=task.user_id,
-            )
+            # Create new subtasks based on regenerated data
+            created: list[Task] = []
+            for s in subtasks_data:
+                subtask = Task(
+                    title=s["title"],
+                    description=s["description"],
+                    due_date=task.due_date,
+                    status=TaskStatus.pending,
+                    priority=task.priority,
+                    estimated_minutes=s["estimated_minutes"],
+                    actual_minutes=None,
+                    category=task.category,
+                    is_subtask=True,
+                    parent_id=task.id,
+                    user_id=task.user_id,
+                )
             
-            # Attach tags
-            req_tags = s["tags"]
-            for item in req_tags:
-                tag_obj = tag_index.get((item["group"], item["name"]))
-                if tag_obj:
-                    subtask.tags.append(tag_obj)
+                # Attach tags
+                req_tags = s["tags"]
+                for item in req_tags:
+                    tag_obj = tag_index.get((item["group"], item["name"]))
+                    if tag_obj:
+                        subtask.tags.append(tag_obj)
             
-            db.add(subtask)
-        
-        db.commit()
+                db.add(subtask)
+                created.append(subtask)
 
-    except Exception as e:
-        db.rollback()
-        print("Error during regenerate_subtasks DB transaction:", repr(e))
-        raise
+            db.flush()
+            events.notify(db, "task", removed_ids, op="delete", user_id=task.user_id)
+            events.notify(db, "task", [task.id, *(st.id for st in created)], user_id=task.user_id)
+            db.commit()
+
+        except Exception as e:
+            db.rollback()
+            print("Error during regenerate_subtasks DB transaction:", repr(e))
+            raise
 
     # 8) Refresh and return the updated task with new subtasks
-    db.refresh(task)
-    _ = task.subtasks
+    task = _load_task_tree(db, task_id)
+
+    for removed_id in removed_ids:
+        feature_index.on_task_removed(removed_id)
     for st in task.subtasks:
-        _ = st.tags
+        feature_index.on_task_saved(st)
 
     return _attach_progress(task)
 
@@ -742,3 +989,13 @@ def ensure_default_tag_groups(db: Session):
 
     db.commit()
 
+
+if __name__ == "__main__":
+    # cd src && python -m tasks.service: purge the task deletion log now
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Purged {purge_task_deletions(db)} task deletion(s) older than the sync retention")
+    finally:
+        db.close()
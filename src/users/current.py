@@ -0,0 +1,13 @@
+from typing import Optional
+from uuid import UUID
+
+from fastapi import Header
+
+
+def current_user_id(x_user_id: Optional[UUID] = Header(None)) -> Optional[UUID]:
+    """
+    The user a request acts for, from the X-User-Id header (there is no
+    authentication yet). Services scope their queries to this user; without
+    the header they see every user's data, as before.
+    """
+    return x_user_id
@@ -0,0 +1,99 @@
+"""
+Admission control for expensive routes, so a burst of them can't starve the
+cheap CRUD endpoints.
+
+Each route class admits at most `concurrency` requests at a time per worker
+process; up to `queue_size` more wait (for at most `queue_timeout` seconds)
+and anything beyond that is answered at once with 503 and Retry-After:
+
+    @router.post("/", dependencies=[Depends(admission.llm)])
+    async def recommend(...):
+        data = await admission.run_llm(get_recommendation, db, ...)
+
+Blocking LLM work runs on its own executor (run_llm) instead of the shared
+threadpool that serves the sync CRUD routes.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+# LLM-backed routes (recommend, regenerate, generate subtasks), per worker
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "8"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_RETRY_AFTER_SECONDS = int(os.getenv("LLM_RETRY_AFTER_SECONDS", "5"))
+
+
+class RouteClass:
+    """A concurrency limit with a bounded wait queue, used as a route dependency."""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._slots = asyncio.Semaphore(concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _busy(self) -> HTTPException:
+        self.rejected += 1
+        return HTTPException(
+            status_code=503,
+            detail=f"Too many {self.name} requests, try again later",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def __call__(self):
+        if self._slots.locked():
+            if self.waiting >= self.queue_size:
+                raise self._busy()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._busy()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+llm = RouteClass("LLM", LLM_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT_SECONDS, LLM_RETRY_AFTER_SECONDS)
+
+# One thread per admitted LLM request
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="llm")
+
+
+async def run_llm(fn, *args, **kwargs):
+    """
+    Run blocking LLM work (sync HTTP call, or a whole sync pipeline) on the
+    LLM executor without blocking the event loop. The request's context
+    (instrumentation stats, current trace span) goes along with it.
+    """
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_llm_executor, call)
+
+
+def shutdown():
+    _llm_executor.shutdown(wait=False)
@@ -0,0 +1,242 @@
+"""
+Idempotency-Key support for mutating requests (POST / PUT / PATCH / DELETE).
+
+The first request with a given key runs normally and its response is stored
+in idempotency_keys; a retry with the same key gets the stored response back
+with its original headers (plus `Idempotent-Replayed: true`) without
+running again, so a retried POST /api/tasks/{id}/generate-subtasks neither
+adds rows nor calls the LLM twice. A key reused for a different request is rejected with 422, and a
+retry that arrives while the first request is still running gets 409.
+A running request holds its key for IDEMPOTENCY_LOCK_SECONDS only: if its
+worker dies mid-request, a retry after that takes the key over instead of
+getting 409 until the key expires.
+Keys are scoped to the acting user (X-User-Id), so another user sending the
+same key gets a run of their own, never the first user's response.
+Server errors (5xx) are not stored, so those can be retried.
+
+Keys expire after IDEMPOTENCY_TTL_SECONDS; each worker purges expired rows
+every IDEMPOTENCY_PURGE_INTERVAL_SECONDS, and `python -m utils.idempotency`
+does it on demand.
+"""
+import hashlib
+import json
+import os
+import time
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+
+from database import engine
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "600"))
+# a little longer than the worker timeout (WORKER_TIMEOUT_SECONDS, 120)
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "150"))
+
+_HEADER = b"idempotency-key"
+_USER_HEADER = b"x-user-id"
+_MAX_KEY_LENGTH = 255
+_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+# Takes the key unless a live request already holds it; an expired row, or
+# one whose request stopped holding its lease, is taken over as if it were
+# new. created_at identifies this claim in _store / _release, so a request
+# that lost its key can't overwrite or delete the one that took it over.
+_CLAIM_SQL = text("""
+    INSERT INTO idempotency_keys (scope, key, request_hash, status, created_at, locked_until, expires_at)
+    VALUES (:scope, :key, :hash, 'in_progress', clock_timestamp(),
+            now() + make_interval(secs => :lock), now() + make_interval(secs => :ttl))
+    ON CONFLICT (scope, key) DO UPDATE SET
+        request_hash = EXCLUDED.request_hash,
+        status = 'in_progress',
+        response_status = NULL,
+        content_type = NULL,
+        response_headers = NULL,
+        response_body = NULL,
+        created_at = EXCLUDED.created_at,
+        locked_until = EXCLUDED.locked_until,
+        expires_at = EXCLUDED.expires_at
+    WHERE idempotency_keys.expires_at < now()
+       OR (idempotency_keys.status = 'in_progress' AND idempotency_keys.locked_until < now())
+    RETURNING created_at
+""")
+
+
+def _claim(scope: str, key: str, request_hash: str):
+    """(True, claim) when this request owns the key, else (False, stored row)."""
+    with engine.begin() as conn:
+        params = {"scope": scope, "key": key}
+        claimed_at = conn.execute(
+            _CLAIM_SQL,
+            {**params, "hash": request_hash, "lock": IDEMPOTENCY_LOCK_SECONDS, "ttl": IDEMPOTENCY_TTL_SECONDS},
+        ).scalar()
+        if claimed_at is not None:
+            return True, claimed_at
+        row = conn.execute(
+            text("""
+                SELECT request_hash, status, response_status, content_type, response_headers, response_body
+                FROM idempotency_keys WHERE scope = :scope AND key = :key
+            """),
+            params,
+        ).first()
+    # purged between the two statements: run the request unrecorded
+    return row is None, row
+
+
+def _store(scope: str, key: str, claimed_at, status: int, raw_headers, body: bytes):
+    headers = [
+        [name.decode("latin-1"), value.decode("latin-1")]
+        for name, value in raw_headers
+        if name.lower() != b"content-length"
+    ]
+    content_type = next((value for name, value in headers if name.lower() == "content-type"), None)
+    with engine.begin() as conn:
+        conn.execute(
+            text("""
+                UPDATE idempotency_keys
+                SET status = 'completed', locked_until = NULL, response_status = :status,
+                    content_type = :content_type, response_headers = CAST(:headers AS jsonb),
+                    response_body = :body
+                WHERE scope = :scope AND key = :key AND created_at = :claimed_at
+            """),
+            {
+                "scope": scope, "key": key, "claimed_at": claimed_at, "status": status,
+                "content_type": content_type, "headers": json.dumps(headers), "body": body,
+            },
+        )
+
+
+def _replay(row) -> Response:
+    if row.response_headers is None:
+        return Response(
+            row.response_body,
+            status_code=row.response_status,
+            media_type=row.content_type,
+            headers={"Idempotent-Replayed": "true"},
+        )
+    response = Response(row.response_body, status_code=row.response_status, headers={"Idempotent-Replayed": "true"})
+    # content-length and the marker come from the new response
+    response.raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1")) for name, value in row.response_headers
+    ] + response.raw_headers
+    return response
+
+
+def _release(scope: str, key: str, claimed_at):
+    with engine.begin() as conn:
+        conn.execute(
+            text("DELETE FROM idempotency_keys WHERE scope = :scope AND key = :key AND created_at = :claimed_at"),
+            {"scope": scope, "key": key, "claimed_at": claimed_at},
+        )
+
+
+def purge_expired() -> int:
+    """Delete expired keys; returns how many."""
+    with engine.begin() as conn:
+        return conn.execute(text("DELETE FROM idempotency_keys WHERE expires_at < now()")).rowcount
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._next_purge = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in _METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        raw_key = headers.get(_HEADER)
+        if raw_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = raw_key.decode("latin-1").strip()
+        if not key or len(key) > _MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"detail": f"Idempotency-Key must be 1-{_MAX_KEY_LENGTH} characters"}, status_code=400
+            )
+            await response(scope, receive, send)
+            return
+
+        owner = headers.get(_USER_HEADER, b"").decode("latin-1").strip().lower()
+        body = await _read_body(receive)
+        request_hash = hashlib.sha256(
+            b"\n".join([scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body])
+        ).hexdigest()
+
+        claimed, row = await run_in_threadpool(_claim, owner, key, request_hash)
+        claimed_at = row if claimed else None
+        if not claimed:
+            if row.request_hash != request_hash:
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used for a different request"}, status_code=422
+                )
+            elif row.status != "completed":
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still in progress"},
+                    status_code=409,
+                    headers={"Retry-After": "1"},
+                )
+            else:
+                response = _replay(row)
+            await response(scope, receive, send)
+            return
+
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + IDEMPOTENCY_PURGE_INTERVAL_SECONDS
+            await run_in_threadpool(purge_expired)
+
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        # Held back until stored, so a retry can't arrive before the row is complete
+        messages = []
+
+        async def capture(message):
+            messages.append(message)
+
+        try:
+            await self.app(scope, receive_body, capture)
+        except BaseException:
+            await run_in_threadpool(_release, owner, key, claimed_at)
+            raise
+
+        start = next(m for m in messages if m["type"] == "http.response.start")
+        if start["status"] >= 500:
+            await run_in_threadpool(_release, owner, key, claimed_at)
+        else:
+            await run_in_threadpool(
+                _store,
+                owner,
+                key,
+                claimed_at,
+                start["status"],
+                start.get("headers", []),
+                b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body"),
+            )
+        for message in messages:
+            await send(message)
+
+
+if __name__ == "__main__":
+    print(f"Purged {purge_expired()} expired idempotency key(s)")
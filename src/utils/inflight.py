@@ -0,0 +1,49 @@
+"""Bookkeeping of in-flight LLM calls, so shutdown can wait for them."""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+from utils import instrumentation
+
+_lock = threading.Lock()
+_in_flight = 0
+
+
+@contextmanager
+def llm_call():
+    """
+    Wrap one outgoing LLM request. Usable from sync code running in the
+    threadpool and from async code alike, e.g.
+
+        with inflight.llm_call():
+            r = requests.post(...)
+
+    The call's duration is also added to the current request's stats.
+    """
+    global _in_flight
+    with _lock:
+        _in_flight += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        instrumentation.record_llm_call((time.perf_counter() - start) * 1000)
+        with _lock:
+            _in_flight -= 1
+
+
+def in_flight() -> int:
+    return _in_flight
+
+
+async def drain(timeout: float) -> int:
+    """
+    Wait up to `timeout` seconds for in-flight LLM calls to finish, without
+    blocking the event loop (async calls may be running on it).
+    Returns how many calls were still running when it gave up.
+    """
+    deadline = time.monotonic() + timeout
+    while _in_flight and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    return _in_flight
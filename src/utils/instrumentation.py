@@ -0,0 +1,169 @@
+"""
+Per-request SQL and LLM accounting.
+
+InstrumentationMiddleware opens a RequestStats for every HTTP request;
+SQLAlchemy cursor events and the LLM client wrappers add to it through a
+context variable (which follows the request into the threadpool). When the
+response starts it gets `Server-Timing` and `X-Query-Count` headers, and when
+it ends one JSON line is printed. Requests slower than SLOW_REQUEST_MS also
+log their most expensive statements, grouped by SQL text, so an N+1 shows up
+as one statement executed N times.
+"""
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+# Statements listed in the log line of a slow request
+SLOW_REQUEST_STATEMENTS = int(os.getenv("SLOW_REQUEST_STATEMENTS", "10"))
+REQUEST_LOG = os.getenv("REQUEST_LOG", "true").lower() in ("1", "true", "yes")
+
+
+class RequestStats:
+    __slots__ = (
+        "queries", "db_ms", "slowest_ms", "slowest_sql", "statements",
+        "llm_calls", "llm_ms", "prompt_tokens", "completion_tokens",
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+        # SQL text -> [executions, total ms]
+        self.statements: Dict[str, list] = {}
+        self.llm_calls = 0
+        self.llm_ms = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# ----- SQLAlchemy -----
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_ms += elapsed
+    if elapsed > stats.slowest_ms:
+        stats.slowest_ms = elapsed
+        stats.slowest_sql = statement
+    entry = stats.statements.setdefault(statement, [0, 0.0])
+    entry[0] += 1
+    entry[1] += elapsed
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute doesn't run for a failed statement
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def install(engine):
+    """Attach the cursor hooks to `engine` (once per process)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+# ----- LLM -----
+def record_llm_call(elapsed_ms: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.llm_calls += 1
+        stats.llm_ms += elapsed_ms
+
+
+def record_llm_tokens(prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    stats = _current.get()
+    if stats is not None:
+        stats.prompt_tokens += prompt_tokens or 0
+        stats.completion_tokens += completion_tokens or 0
+
+
+# ----- Middleware -----
+def _server_timing(stats: RequestStats, total_ms: float) -> str:
+    parts = [f'db;dur={stats.db_ms:.1f};desc="{stats.queries} queries"']
+    if stats.llm_calls:
+        parts.append(f'llm;dur={stats.llm_ms:.1f};desc="{stats.llm_calls} calls"')
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+def _log_line(scope, status: int, stats: RequestStats, total_ms: float) -> Dict[str, Any]:
+    line: Dict[str, Any] = {
+        "event": "request",
+        "method": scope["method"],
+        "path": scope["path"],
+        "status": status,
+        "duration_ms": round(total_ms, 1),
+        "queries": stats.queries,
+        "db_ms": round(stats.db_ms, 1),
+        "slowest_query_ms": round(stats.slowest_ms, 1),
+        "llm_calls": stats.llm_calls,
+        "llm_ms": round(stats.llm_ms, 1),
+        "llm_prompt_tokens": stats.prompt_tokens,
+        "llm_completion_tokens": stats.completion_tokens,
+    }
+    if total_ms >= SLOW_REQUEST_MS:
+        line["slow"] = True
+        line["slowest_query"] = stats.slowest_sql
+        top = sorted(stats.statements.items(), key=lambda item: -item[1][1])[:SLOW_REQUEST_STATEMENTS]
+        line["statements"] = [
+            {"sql": sql, "count": count, "total_ms": round(ms, 1)} for sql, (count, ms) in top
+        ]
+    return line
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI, so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(stats, total_ms).encode()))
+                headers.append((b"x-query-count", str(stats.queries).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            if REQUEST_LOG:
+                total_ms = (time.perf_counter() - start) * 1000
+                print(json.dumps(_log_line(scope, status, stats, total_ms), ensure_ascii=False))
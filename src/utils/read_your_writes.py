@@ -0,0 +1,39 @@
+"""
+Read-your-writes for replica routing: a successful write (any method but
+GET / HEAD / OPTIONS) sets a short-lived cookie, and while the client sends
+it back database.get_read_db() reads from the primary instead of a replica
+that may not have the write yet.
+"""
+from database import READ_YOUR_WRITES_COOKIE, READ_YOUR_WRITES_SECONDS, replica_engines
+
+_READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# POST routes that only read (the recommendation requests carry a body)
+_READ_ONLY_PREFIXES = ("/api/recommend",)
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.cookie = (
+            f"{READ_YOUR_WRITES_COOKIE}=1; Max-Age={READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+        ).encode()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] in _READ_METHODS
+            or scope["path"].startswith(_READ_ONLY_PREFIXES)
+            or not replica_engines
+            or READ_YOUR_WRITES_SECONDS <= 0
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = list(message.get("headers", []))
+                headers.append((b"set-cookie", self.cookie))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
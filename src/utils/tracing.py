@@ -0,0 +1,217 @@
+"""
+In-process span tracing for the AI pipelines.
+
+    @tracing.traced("ai.recommend")
+    def pipeline(db):
+        with tracing.span("db.load"):
+            ...
+        with tracing.span("llm.call") as s:
+            s.set("llm.prompt_chars", len(prompt))
+
+A span opened with no span around it starts a new trace. When that root span
+ends, the finished trace goes into an in-memory ring buffer (served by
+GET /debug/traces, per worker process) and, with TRACE_EXPORT_DIR set, is
+written there as an OTLP/JSON file (one ExportTraceServiceRequest per trace).
+Each span also records the SQL queries, DB time and LLM tokens the current
+request spent while it was open (see utils.instrumentation).
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from utils import instrumentation
+
+TRACING = os.getenv("TRACING", "false").lower() in ("1", "true", "yes")
+# Finished traces kept per worker for /debug/traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+# Directory for OTLP/JSON trace files (unset = don't write files)
+TRACE_EXPORT_DIR = os.getenv("TRACE_EXPORT_DIR", "")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "koreji-backend")
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error", "spans")
+
+    def __init__(self, name: str, parent: Optional["Span"]):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        # finished spans of the whole trace, shared with the root
+        self.spans: List["Span"] = parent.spans if parent else []
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes: Dict[str, Any] = {}
+        self.error = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    def set(self, key: str, value: Any):
+        pass
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+_lock = threading.Lock()
+_finished: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+def _usage_snapshot(stats):
+    return (stats.queries, stats.db_ms, stats.llm_ms, stats.prompt_tokens, stats.completion_tokens)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the enclosed block as a child of the current span (or a new trace)."""
+    if not TRACING:
+        yield _NoopSpan()
+        return
+
+    parent = _current.get()
+    s = Span(name, parent)
+    s.attributes.update(attributes)
+    stats = instrumentation.current()
+    before = _usage_snapshot(stats) if stats else None
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+        if before is not None:
+            queries, db_ms, llm_ms, prompt_tokens, completion_tokens = (
+                now - then for now, then in zip(_usage_snapshot(stats), before)
+            )
+            if queries:
+                s.attributes["db.queries"] = queries
+                s.attributes["db.ms"] = round(db_ms, 1)
+            if llm_ms:
+                s.attributes["llm.ms"] = round(llm_ms, 1)
+            if prompt_tokens or completion_tokens:
+                s.attributes["llm.prompt_tokens"] = prompt_tokens
+                s.attributes["llm.completion_tokens"] = completion_tokens
+        s.spans.append(s)
+        if parent is None:
+            _export(s)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole pipelines, sync or async."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ----- Export -----
+def _export(root: Span):
+    with _lock:
+        _finished.append(root)
+    if TRACE_EXPORT_DIR:
+        try:
+            os.makedirs(TRACE_EXPORT_DIR, exist_ok=True)
+            path = os.path.join(TRACE_EXPORT_DIR, f"{root.start_ns}-{root.trace_id}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(to_otlp(root), f, ensure_ascii=False)
+        except OSError as e:
+            print("Trace export failed:", repr(e))
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(root: Span) -> Dict[str, Any]:
+    """The trace as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in sorted(root.spans, key=lambda s: s.start_ns):
+        out = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            # STATUS_CODE_ERROR / STATUS_CODE_OK
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            out["parentSpanId"] = s.parent_id
+        spans.append(out)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "koreji.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+def _summary(root: Span) -> Dict[str, Any]:
+    return {
+        "trace_id": root.trace_id,
+        "name": root.name,
+        "started_at": datetime.fromtimestamp(root.start_ns / 1e9, timezone.utc).isoformat(),
+        "duration_ms": round(root.duration_ms, 1),
+        "error": root.error,
+        "spans": [
+            {
+                "name": s.name,
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "offset_ms": round((s.start_ns - root.start_ns) / 1e6, 1),
+                "duration_ms": round(s.duration_ms, 1),
+                "attributes": s.attributes,
+                "error": s.error,
+            }
+            for s in sorted(root.spans, key=lambda s: s.start_ns)
+        ],
+    }
+
+
+def recent(limit: int = 20, name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Finished traces of this process, newest first."""
+    with _lock:
+        roots = list(_finished)
+    roots.reverse()
+    if name:
+        roots = [r for r in roots if r.name == name]
+    return [_summary(r) for r in roots[:limit]]
+
+
+def find(trace_id: str) -> Optional[Span]:
+    with _lock:
+        return next((r for r in _finished if r.trace_id == trace_id), None)
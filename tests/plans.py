@@ -0,0 +1,21 @@
+"""Helpers for asserting on EXPLAIN (FORMAT JSON) output."""
+from sqlalchemy import text
+
+
+def plan_indexes(node) -> set:
+    """Names of the indexes a plan node and its children scan."""
+    found = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", []):
+        found |= plan_indexes(child)
+    return found
+
+
+def index_family(db, name: str) -> set:
+    """An index on the partitioned records table and its copies on the partitions."""
+    return {name} | set(db.execute(
+        text("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:name AS regclass)
+        """),
+        {"name": name},
+    ).scalars())
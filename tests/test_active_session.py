@@ -0,0 +1,66 @@
+"""RecordService.get_active_session: scoped to the task owner, served by ix_records_active."""
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from plans import index_family, plan_indexes
+from records.service import RecordService
+
+
+def _seed(db):
+    """Two users with an open session each; the other user's is the newer one."""
+    users = [uuid.uuid4(), uuid.uuid4()]
+    now = datetime.now(timezone.utc)
+    sessions = {}
+    for n, (user, started) in enumerate(zip(users, (now - timedelta(minutes=10), now - timedelta(minutes=1)))):
+        db.execute(
+            text("INSERT INTO users (id, name, email, created_at) VALUES (:id, :name, :email, now())"),
+            {"id": user, "name": f"active-{n}", "email": f"active-{user}@test.example"},
+        )
+        task = uuid.uuid4()
+        db.execute(
+            text("""
+                INSERT INTO tasks (id, user_id, is_subtask, title, status, created_at)
+                VALUES (:id, :user, false, :title, 'in_progress', now())
+            """),
+            {"id": task, "user": user, "title": f"active-task-{n}"},
+        )
+        sessions[user] = uuid.uuid4()
+        db.execute(
+            text("""
+                INSERT INTO records (id, task_id, mode, place, tool, event_type, occurred_at, created_at, updated_at)
+                VALUES (:id, :task, 'focus', 'home', ARRAY['computer'], 'INPROGRESS', :at, now(), now())
+            """),
+            {"id": sessions[user], "task": task, "at": started},
+        )
+    return users, sessions
+
+
+def test_active_session_is_the_callers_own(db):
+    (first, second), sessions = _seed(db)
+
+    assert RecordService.get_active_session(db, first)["id"] == sessions[first]
+    assert RecordService.get_active_session(db, second)["id"] == sessions[second]
+    assert RecordService.get_active_session(db, uuid.uuid4()) is None
+
+
+def test_active_session_uses_ix_records_active(db):
+    (first, _), _ = _seed(db)
+    db.execute(text("ANALYZE records"))
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+
+    plan = db.execute(
+        text("""
+            EXPLAIN (FORMAT JSON)
+            SELECT * FROM active_session
+            WHERE task_user_id = :user_id
+            ORDER BY occurred_at DESC
+            LIMIT 1
+        """),
+        {"user_id": first},
+    ).scalar()
+    plan = plan if isinstance(plan, list) else json.loads(plan)
+
+    assert plan_indexes(plan[0]["Plan"]) & index_family(db, "ix_records_active")
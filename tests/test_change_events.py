@@ -0,0 +1,95 @@
+"""changes.events: NOTIFY delivery to subscribers, and ending streams."""
+import asyncio
+import uuid
+
+import pytest
+
+from changes import events
+from database import SessionLocal
+
+# NOTIFY is only sent on a real commit, so these don't use the `db` fixture
+pytestmark = pytest.mark.usefixtures("database")
+
+
+def _send(task_id, *, commit: bool, user_id=None):
+    db = SessionLocal()
+    try:
+        events.notify(db, "task", [task_id], user_id=user_id)
+        if commit:
+            db.commit()
+        else:
+            db.rollback()
+    finally:
+        db.close()
+
+
+async def _receive(subscriber, task_id, *, commit: bool, user_id=None, attempts: int = 20):
+    """The event for task_id, or None. Resends while the listener is still connecting."""
+    for _ in range(attempts):
+        _send(task_id, commit=commit, user_id=user_id)
+        event = await subscriber.next(0.5)
+        while event is not None:
+            if event.get("ids") == [str(task_id)]:
+                return event
+            event = await subscriber.next(0.1)
+    return None
+
+
+def _run(scenario):
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await events.stop()
+
+    return asyncio.run(main())
+
+
+def test_committed_notify_reaches_subscriber():
+    task_id, user_id = uuid.uuid4(), uuid.uuid4()
+
+    async def scenario():
+        subscriber = events.subscribe(str(user_id))
+        try:
+            return await _receive(subscriber, task_id, commit=True, user_id=user_id)
+        finally:
+            events.unsubscribe(subscriber)
+
+    event = _run(scenario)
+    assert event == {"type": "task", "op": "upsert", "ids": [str(task_id)], "user_id": str(user_id)}
+
+
+def test_rolled_back_notify_and_other_users_changes_are_not_sent():
+    own, rolled_back, others = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    user_id = uuid.uuid4()
+
+    async def scenario():
+        subscriber = events.subscribe(str(user_id))
+        try:
+            # once this arrives the listener is up
+            assert await _receive(subscriber, own, commit=True, user_id=user_id)
+            _send(rolled_back, commit=False, user_id=user_id)
+            _send(others, commit=True, user_id=uuid.uuid4())
+            received = []
+            while (event := await subscriber.next(0.5)) is not None:
+                received.extend(event["ids"])
+            return received
+        finally:
+            events.unsubscribe(subscriber)
+
+    received = _run(scenario)
+    assert str(rolled_back) not in received
+    assert str(others) not in received
+
+
+def test_close_streams_ends_open_streams():
+    async def scenario():
+        subscriber = events.subscribe()
+        try:
+            subscriber.offer({"type": "task", "op": "upsert", "ids": ["a"], "user_id": None})
+            events.close_streams()
+            return await subscriber.next(1)
+        finally:
+            events.unsubscribe(subscriber)
+
+    assert _run(scenario) is events.CLOSED
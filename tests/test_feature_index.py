@@ -0,0 +1,115 @@
+"""tasks.feature_index: rebuilds happen off to the side and don't lose hook
+changes, and other workers' writes are caught up with before serving."""
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from models.task import TaskStatus
+from tasks import feature_index
+
+
+def _row(task_id, title="task", status="pending"):
+    return {"id": task_id, "title": title, "status": status, "is_subtask": False, "tags": {}}
+
+
+@pytest.fixture
+def no_db(monkeypatch):
+    monkeypatch.setattr(feature_index, "_db_now", lambda db: datetime.now(timezone.utc))
+
+
+def test_rebuild_serves_the_old_copy_and_replays_hook_changes(monkeypatch, no_db):
+    kept, completed, renamed = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    old = feature_index.TaskFeatureIndex()
+    old.upsert(_row(kept, "before"))
+    old._built_at = 0.0  # built, and long stale
+    monkeypatch.setattr(feature_index, "_index", old)
+    seen_during_build = []
+
+    def load(db):
+        yield _row(kept)
+        yield _row(completed)
+        # another request, while the rows stream in
+        seen_during_build.append(feature_index.get_index(db))
+        feature_index.on_task_status_changed(completed, TaskStatus.completed)
+        feature_index._apply(lambda index: index.upsert(_row(renamed, "after")))
+
+    monkeypatch.setattr(feature_index, "_load_open_task_rows", load)
+    fresh = feature_index.get_index(None)
+
+    assert seen_during_build == [old]
+    assert fresh is not old and feature_index._index is fresh
+    assert {row["id"] for row in fresh.rows()} == {str(kept), str(renamed)}
+    assert feature_index._pending is None
+
+
+def test_failed_rebuild_keeps_the_old_copy(monkeypatch, no_db):
+    old = feature_index.TaskFeatureIndex()
+    old._built_at = 0.0
+    monkeypatch.setattr(feature_index, "_index", old)
+
+    def load(db):
+        raise RuntimeError("connection lost")
+        yield
+
+    monkeypatch.setattr(feature_index, "_load_open_task_rows", load)
+    with pytest.raises(RuntimeError):
+        feature_index.rebuild(None)
+
+    assert feature_index._index is old
+    assert feature_index._pending is None
+
+
+def test_replica_sessions_are_not_used_to_build(monkeypatch, no_db):
+    replica, primary_session, loaded_from = object(), object(), []
+
+    @contextmanager
+    def read_session(primary=False):
+        assert primary
+        yield primary_session
+
+    def load(db):
+        loaded_from.append(db)
+        yield from ()
+
+    monkeypatch.setattr(feature_index, "_index", feature_index.TaskFeatureIndex())
+    monkeypatch.setattr(feature_index, "on_replica", lambda db: db is replica)
+    monkeypatch.setattr(feature_index, "read_session", read_session)
+    monkeypatch.setattr(feature_index, "_load_open_task_rows", load)
+    feature_index.get_index(replica)
+
+    assert loaded_from == [primary_session]
+
+
+def test_catch_up_applies_other_workers_writes(db, monkeypatch):
+    gone, closed = uuid.uuid4(), uuid.uuid4()
+    index = feature_index.TaskFeatureIndex()
+    index.upsert(_row(gone))
+    index.upsert(_row(closed))
+    index._built_at = time.monotonic()
+    index.synced_to = db.execute(text("SELECT clock_timestamp()")).scalar() - timedelta(minutes=1)
+    monkeypatch.setattr(feature_index, "_index", index)
+
+    # written by "another worker": none of it went through this process's hooks
+    added = db.execute(text("""
+        INSERT INTO tasks (id, is_subtask, title, status, created_at, updated_at)
+        VALUES (gen_random_uuid(), false, 'from another worker', 'pending', now(), clock_timestamp())
+        RETURNING id
+    """)).scalar()
+    db.execute(
+        text("""
+            INSERT INTO tasks (id, is_subtask, title, status, created_at, updated_at)
+            VALUES (:id, false, 'closed elsewhere', 'completed', now(), clock_timestamp())
+        """),
+        {"id": closed},
+    )
+    db.execute(text("INSERT INTO task_deletions (task_id, deleted_at) VALUES (:id, clock_timestamp())"), {"id": gone})
+
+    feature_index._catch_up(db, index)
+
+    ids = {row["id"] for row in index.rows()}
+    assert str(added) in ids
+    assert str(gone) not in ids and str(closed) not in ids
@@ -0,0 +1,64 @@
+"""utils.idempotency: in-progress keys are leased, and replays keep the original headers."""
+import time
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from database import engine
+from utils import idempotency
+
+# claims commit on their own connections, so these don't use the `db` fixture
+pytestmark = pytest.mark.usefixtures("database")
+
+
+@pytest.fixture
+def scope():
+    scope = f"test-{uuid.uuid4()}"
+    yield scope
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM idempotency_keys WHERE scope = :scope"), {"scope": scope})
+
+
+def test_running_request_holds_its_key(scope):
+    claimed, claimed_at = idempotency._claim(scope, "k", "hash")
+    assert claimed and claimed_at is not None
+
+    claimed, row = idempotency._claim(scope, "k", "hash")
+    assert not claimed
+    assert row.status == "in_progress"
+
+
+def test_lapsed_lease_is_taken_over(scope, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_LOCK_SECONDS", 0)
+    _, first = idempotency._claim(scope, "k", "hash")
+    time.sleep(0.01)
+
+    claimed, second = idempotency._claim(scope, "k", "hash")
+    assert claimed and second != first
+
+    # the request that lost the key can't overwrite or drop the new claim
+    idempotency._store(scope, "k", first, 201, [], b'{"stale": true}')
+    idempotency._release(scope, "k", first)
+    idempotency._store(scope, "k", second, 201, [], b"{}")
+
+    claimed, row = idempotency._claim(scope, "k", "hash")
+    assert not claimed
+    assert (row.status, bytes(row.response_body)) == ("completed", b"{}")
+
+
+def test_replay_keeps_the_original_headers(scope):
+    _, claimed_at = idempotency._claim(scope, "k", "hash")
+    idempotency._store(
+        scope, "k", claimed_at, 200,
+        [(b"content-type", b"application/json"), (b"x-next-cursor", b"abc"), (b"content-length", b"2")],
+        b"[]",
+    )
+
+    _, row = idempotency._claim(scope, "k", "hash")
+    headers = idempotency._replay(row).raw_headers
+
+    assert (b"x-next-cursor", b"abc") in headers
+    assert (b"content-type", b"application/json") in headers
+    assert (b"idempotent-replayed", b"true") in headers
+    assert [value for name, value in headers if name == b"content-length"] == [b"2"]
@@ -0,0 +1,33 @@
+"""records.partitions: the running app's periodic partition check."""
+from datetime import date
+
+from sqlalchemy import text
+
+from database import SessionLocal
+from records import partitions
+
+
+def test_scheduled_check_creates_the_upcoming_partitions(database):
+    partitions._scheduled_check()
+
+    db = SessionLocal()
+    try:
+        existing = set(partitions.PartitionService.list_partitions(db))
+    finally:
+        db.close()
+    first = date.today().replace(day=1)
+    for offset in range(partitions.MONTHS_AHEAD + 1):
+        month = partitions._add_months(first, offset)
+        assert f"records_y{month:%Y}m{month:%m}" in existing
+
+
+def test_scheduled_check_skips_while_another_worker_runs_it(database, monkeypatch):
+    ran = []
+    monkeypatch.setattr(partitions.PartitionService, "ensure_partitions", lambda db: ran.append(db) or [])
+    with database.connect() as conn:
+        conn.begin()
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('records_partitions'))"))
+        assert partitions._scheduled_check() == []
+        conn.rollback()
+
+    assert ran == []
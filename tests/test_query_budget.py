@@ -0,0 +1,163 @@
+"""
+Query budget: the number of SQL statements an endpoint runs must not grow
+with the amount of data.
+
+Seeds fixture data at two sizes (task families of a top-level task with
+subtasks, tags and records), calls every endpoint below through the app in
+process at both sizes and compares the statements executed by the measured
+call (each endpoint is called once before, to warm caches such as the task
+feature index). The LLM is the fake provider from benchmarks/loadtest.py.
+
+Each size runs inside one transaction that is rolled back (the app's
+commits become savepoint releases, which are not counted). A failure lists
+the statements whose count grew.
+"""
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from loadtest import start_fake_llm  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from database import get_db, get_read_db  # noqa: E402
+from main import app  # noqa: E402
+from tasks import feature_index  # noqa: E402
+from tasks import llm as tasks_llm  # noqa: E402
+from tasks.service import ensure_default_tag_groups  # noqa: E402
+from utils import instrumentation  # noqa: E402
+
+SMALL, LARGE = 5, 50
+SUBTASKS, TAGS, RECORDS = 3, 3, 5
+
+CONTEXT = {"time": 60, "mode": "focus", "place": "home", "tool": "computer"}
+
+# (name, method, path, json body); {task} is a fixture task with subtasks
+ENDPOINTS = [
+    ("tasks.list", "GET", "/api/tasks/", None),
+    ("tasks.list_top_level", "GET", "/api/tasks/?is_subtask=false", None),
+    ("tasks.list_leaves", "GET", "/api/tasks/?is_subtask=true", None),
+    ("tasks.list_by_tag", "GET", "/api/tasks/?tag_ids={tag}", None),
+    ("tasks.get", "GET", "/api/tasks/{task}", None),
+    ("tasks.subtasks", "GET", "/api/tasks/{task}/subtasks", None),
+    ("tasks.changes", "GET", "/api/tasks/changes", None),
+    ("tasks.categories", "GET", "/api/tasks/categories", None),
+    ("tasks.tag_groups", "GET", "/api/tasks/tag-groups", None),
+    ("records.list", "GET", "/api/records/?limit=50", None),
+    ("records.active", "GET", "/api/records/active", None),
+    ("records.stats", "GET", "/api/records/stats?from=2000-01-01&to=2100-01-01&group_by=mode&group_by=category", None),
+    ("users.list", "GET", "/api/users/", None),
+    ("ai.recommend", "POST", "/api/recommend/", CONTEXT),
+    ("ai.regenerate_questions", "POST", "/api/recommend/regenerate-questions", {**CONTEXT, "recommended_tasks": []}),
+    ("ai.regenerate_recommendations", "POST", "/api/recommend/regenerate-recommendations",
+     {**CONTEXT, "questions": ["Q1?"], "answers": ["A"]}),
+    ("tasks.generate_subtasks", "POST", "/api/tasks/{task}/generate-subtasks", None),
+]
+
+# transaction control the savepoint wrapper adds around the app's commits
+_IGNORED = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+def seed(conn, families: int):
+    conn.execute(text("""
+        WITH parents AS (
+            INSERT INTO tasks (id, title, status, is_subtask, estimated_minutes, category, created_at)
+            SELECT gen_random_uuid(), 'budget-' || i, 'pending', false, 30, 'Budget ' || (i % 3), now()
+            FROM generate_series(1, :families) AS i
+            RETURNING id, category
+        )
+        INSERT INTO tasks (id, title, status, is_subtask, parent_id, estimated_minutes, category, created_at)
+        SELECT gen_random_uuid(), 'budget-sub', 'pending', true, p.id, 15, p.category, now()
+        FROM parents p, generate_series(1, :subtasks)
+    """), {"families": families, "subtasks": SUBTASKS})
+    conn.execute(text("""
+        INSERT INTO task_tags (task_id, tag_id)
+        SELECT t.id, tg.id
+        FROM tasks t
+        CROSS JOIN LATERAL (SELECT id FROM tags ORDER BY md5(t.id::text || id::text) LIMIT :tags) tg
+        WHERE t.title LIKE 'budget-%'
+    """), {"tags": TAGS})
+    conn.execute(text("""
+        INSERT INTO records (id, task_id, mode, place, tool, event_type, duration_seconds, occurred_at, created_at, updated_at)
+        SELECT gen_random_uuid(), t.id, 'focus', 'home', ARRAY['computer'], 'COMPLETE', 1200,
+               now() - make_interval(days => i), now(), now()
+        FROM tasks t, generate_series(1, :records) AS i
+        WHERE t.title LIKE 'budget-%' AND NOT t.is_subtask
+    """), {"records": RECORDS})
+    task = conn.execute(text("SELECT id FROM tasks WHERE title = 'budget-1'")).scalar()
+    tag = conn.execute(text("SELECT tag_id FROM task_tags WHERE task_id = :id LIMIT 1"), {"id": task}).scalar()
+    return {"task": task, "tag": tag}
+
+
+def measure(engine, families: int) -> dict:
+    """Statements per endpoint (status, Counter of SQL text) at one fixture size."""
+    statements = []
+    with engine.connect() as conn:
+        conn.begin()
+
+        @event.listens_for(conn, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not statement.lstrip().upper().startswith(_IGNORED):
+                statements.append(statement)
+
+        def session_for_request():
+            db = Session(bind=conn, join_transaction_mode="create_savepoint")
+            try:
+                yield db
+            finally:
+                db.close()
+
+        db = Session(bind=conn, join_transaction_mode="create_savepoint")
+        ensure_default_tag_groups(db)
+        ids = seed(conn, families)
+        # the fixture went in with SQL, bypassing the index hooks
+        feature_index.rebuild(db)
+        db.close()
+
+        app.dependency_overrides[get_db] = session_for_request
+        app.dependency_overrides[get_read_db] = session_for_request
+        client = TestClient(app)
+        out = {}
+        try:
+            for name, method, path, body in ENDPOINTS:
+                url = path.format(**ids)
+                client.request(method, url, json=body)  # warm-up
+                statements.clear()
+                r = client.request(method, url, json=body)
+                out[name] = (r.status_code, Counter(statements))
+        finally:
+            app.dependency_overrides.clear()
+            conn.rollback()
+    return out
+
+
+@pytest.fixture(scope="module")
+def budgets(database):
+    llm = start_fake_llm(latency_ms=0)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(tasks_llm, "OPENROUTER_URL", f"http://127.0.0.1:{llm.server_port}/v1/chat/completions")
+        mp.setenv("OPENROUTER_URL", tasks_llm.OPENROUTER_URL)
+        mp.setenv("OPENROUTER_API_KEY", "query-budget")
+        mp.setattr(instrumentation, "REQUEST_LOG", False)
+        try:
+            yield measure(database, SMALL), measure(database, LARGE)
+        finally:
+            llm.shutdown()
+
+
+@pytest.mark.parametrize("name", [name for name, *_ in ENDPOINTS])
+def test_statements_do_not_grow_with_data(budgets, name):
+    (_, small), (status, large) = budgets[0][name], budgets[1][name]
+    assert status < 500
+
+    grown = [
+        f"{small.get(sql, 0)} -> {count}x  {' '.join(sql.split())[:300]}"
+        for sql, count in large.items()
+        if count > small.get(sql, 0)
+    ]
+    assert sum(large.values()) <= sum(small.values()), "\n".join(grown)
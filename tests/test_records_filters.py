@@ -0,0 +1,74 @@
+"""RecordService._filtered: tool_match any (&&) / all (@>), and the GIN index behind both."""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from plans import index_family, plan_indexes
+from records.service import RecordService
+
+
+def _sql(db, **filters) -> str:
+    return str(RecordService._filtered(db, **filters).statement.compile(dialect=postgresql.dialect()))
+
+
+def test_tool_match_compiles_to_overlap_and_contains(db):
+    any_sql = _sql(db, tool=["pen"], tool_match="any")
+    all_sql = _sql(db, tool=["pen"], tool_match="all")
+
+    assert "records.tool && " in any_sql and "@>" not in any_sql
+    assert "records.tool @> " in all_sql and "&&" not in all_sql
+    # the default is "any"
+    assert "records.tool && " in _sql(db, tool=["pen"])
+
+
+def _seed(db, tools_per_record):
+    """One record per tool list, on a task of its own; returns the task id."""
+    task = uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    for n, tools in enumerate(tools_per_record):
+        db.execute(
+            text("""
+                INSERT INTO records (id, task_id, mode, place, tool, event_type, occurred_at, created_at, updated_at)
+                VALUES (gen_random_uuid(), :task, 'focus', 'home', :tools, 'COMPLETE', :at, now(), now())
+            """),
+            {"task": task, "tools": tools, "at": now - timedelta(minutes=n)},
+        )
+    return task
+
+
+@pytest.mark.parametrize("tool_match, tools, expected", [
+    ("any", ["pen", "phone"], [["pen", "paper"], ["pen"], ["phone"]]),
+    ("any", ["brush"], []),
+    ("all", ["pen", "paper"], [["pen", "paper"]]),
+    ("all", ["pen"], [["pen", "paper"], ["pen"]]),
+])
+def test_tool_match_rows(db, tool_match, tools, expected):
+    task = _seed(db, [["pen", "paper"], ["pen"], ["phone"]])
+
+    rows = RecordService._filtered(db, tool=tools, tool_match=tool_match, task_id=task).all()
+
+    assert sorted(r.tool for r in rows) == sorted(expected)
+
+
+@pytest.mark.parametrize("tool_match, tools", [("any", ["rare-tool"]), ("all", ["rare-tool", "notebook"])])
+def test_tool_filters_use_ix_records_tool(db, tool_match, tools):
+    # a rare tool among many common ones, where the index is the right plan
+    db.execute(text("""
+        INSERT INTO records (id, task_id, mode, place, tool, event_type, occurred_at, created_at, updated_at)
+        SELECT gen_random_uuid(), gen_random_uuid(), 'focus', 'home',
+               CASE WHEN i % 200 = 0 THEN ARRAY['rare-tool', 'notebook'] ELSE ARRAY['computer'] END,
+               'COMPLETE', now() - i * interval '1 minute', now(), now()
+        FROM generate_series(1, 5000) AS i
+    """))
+    db.execute(text("ANALYZE records"))
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+
+    compiled = RecordService._filtered(db, tool=tools, tool_match=tool_match).limit(100).statement.compile(
+        dialect=db.bind.dialect
+    )
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()[0]
+
+    assert plan_indexes(plan["Plan"]) & index_family(db, "ix_records_tool")
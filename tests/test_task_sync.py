@@ -0,0 +1,57 @@
+"""tasks.service delta sync: the deletion log is purged, and older cursors resync."""
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from tasks import service
+
+
+def _user_with_task(db):
+    user, task = uuid.uuid4(), uuid.uuid4()
+    db.execute(
+        text("INSERT INTO users (id, name, email, created_at) VALUES (:id, 'sync', :email, now())"),
+        {"id": user, "email": f"sync-{user}@test.example"},
+    )
+    db.execute(
+        text("""
+            INSERT INTO tasks (id, user_id, is_subtask, title, status, created_at, updated_at)
+            VALUES (:id, :user, false, 'synced', 'pending', now(), clock_timestamp())
+        """),
+        {"id": task, "user": user},
+    )
+    return user, task
+
+
+def _db_now(db):
+    return db.execute(text("SELECT clock_timestamp()")).scalar()
+
+
+def test_purge_keeps_deletions_within_the_retention(db):
+    old, recent = uuid.uuid4(), uuid.uuid4()
+    retention = timedelta(seconds=service.TASK_DELETIONS_RETENTION_SECONDS)
+    for task_id, age in ((old, retention + timedelta(days=1)), (recent, timedelta(minutes=1))):
+        db.execute(
+            text("INSERT INTO task_deletions (task_id, deleted_at) VALUES (:id, clock_timestamp() - :age)"),
+            {"id": task_id, "age": age},
+        )
+
+    assert service.purge_task_deletions(db) >= 1
+
+    left = set(db.execute(
+        text("SELECT task_id FROM task_deletions WHERE task_id IN (:old, :recent)"), {"old": old, "recent": recent}
+    ).scalars())
+    assert left == {recent}
+
+
+def test_cursor_older_than_the_retention_gets_a_full_resync(db):
+    user, task = _user_with_task(db)
+    now = _db_now(db)
+    expired = service.encode_sync_cursor(now - timedelta(seconds=service.TASK_DELETIONS_RETENTION_SECONDS + 60))
+    recent = service.encode_sync_cursor(now - timedelta(minutes=1))
+
+    full = service.list_task_changes(db, expired, user_id=user)
+    delta = service.list_task_changes(db, recent, user_id=user)
+
+    assert full["resync"] is True and [t.id for t in full["changed"]] == [task]
+    assert delta["resync"] is False